@@ -1,29 +1,55 @@
 from django.contrib import admin
+from django.utils.text import capfirst
 
 from .models import Company, Department, Affiliate, SubAffiliate, Employee
 
+
+class ExportEntityAdmin(admin.ModelAdmin):
+    """
+    Refuse deleting an entity that export records are issued to, as PROTECT would.
+
+    The records are listed on the admin's "cannot delete" page, instead of the
+    delete reaching the pre_delete guard in storage.signals and failing.
+    """
+
+    def export_entities(self, obj):
+        """The entities deleted along with obj that export records may name."""
+        return [obj]
+
+    def get_deleted_objects(self, objs, request):
+        to_delete, model_count, perms_needed, protected = super().get_deleted_objects(objs, request)
+        for obj in objs:
+            for entity in self.export_entities(obj):
+                protected += [f"{capfirst(record._meta.verbose_name)}: {record}" for record in entity.selections.all()]
+        return to_delete, model_count, perms_needed, protected
+
+
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
     list_display = ('name', 'address', 'phone')
     search_fields = ('name',)
 
 @admin.register(Department)
-class DepartmentAdmin(admin.ModelAdmin):
+class DepartmentAdmin(ExportEntityAdmin):
     list_display = ('type', 'name')
     search_fields = ('name',)
 
 @admin.register(Affiliate)
-class AffiliateAdmin(admin.ModelAdmin):
+class AffiliateAdmin(ExportEntityAdmin):
     list_display = ('type', 'name', 'address')
     search_fields = ('name',)
 
+    def export_entities(self, obj):
+        # Sub affiliates are deleted with their affiliate
+        return obj.subaffiliates.all()
+
 @admin.register(SubAffiliate)
-class SubAffiliateAdmin(admin.ModelAdmin):
+class SubAffiliateAdmin(ExportEntityAdmin):
     list_display = ('affiliate', 'subname', 'subtype')
     search_fields = ('subname',)
 
 @admin.register(Employee)
-class EmployeeAdmin(admin.ModelAdmin):
+class EmployeeAdmin(ExportEntityAdmin):
     list_display = ('name', 'job_title', 'department', 'email', 'date_employed')
     search_fields = ('name', 'email')
     list_filter = ('job_title', 'department')
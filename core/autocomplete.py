@@ -0,0 +1,76 @@
+#############################################################################
+# Autocomplete Libraries
+#############################################################################
+from django.db.models import Q
+from storage.models import Asset
+from storage.search import search_query
+from .models import Company, Department, SubAffiliate, Employee
+
+#############################################################################
+# Matches returned per page of the autocomplete endpoint
+AUTOCOMPLETE_PAGE_SIZE = 20
+
+# Sources the autocomplete widgets search, each with its queryset, how a term is
+# matched, the order of the matches and the filters a widget may forward from
+# other fields on the page
+AUTOCOMPLETE_SOURCES = {
+    'asset': {
+        'queryset': lambda: Asset.objects.only('id', 'name'),
+        'ordering': ('name',),
+        'search': lambda term: search_query('search_text', term),
+        'forward': {'category': 'category_id'},
+    },
+    'stocked_asset': {
+        'queryset': lambda: Asset.objects.filter(stock__gt=0).only('id', 'name'),
+        'ordering': ('name',),
+        'search': lambda term: search_query('search_text', term),
+        'forward': {'category': 'category_id'},
+    },
+    'company': {
+        'queryset': lambda: Company.objects.only('id', 'name'),
+        'ordering': ('name',),
+        'search': lambda term: search_query('search_text', term),
+    },
+    'department': {
+        'queryset': lambda: Department.objects.only('id', 'name'),
+        'ordering': ('name',),
+        'search': lambda term: search_query('search_text', term),
+    },
+    'employee': {
+        'queryset': lambda: Employee.objects.only('id', 'name'),
+        'ordering': ('name',),
+        'search': lambda term: search_query('search_text', term),
+    },
+    'sub_affiliate': {
+        'queryset': lambda: SubAffiliate.objects.select_related('affiliate'),
+        'ordering': ('affiliate__name', 'subname'),
+        'search': lambda term: Q(subname__icontains=term) | Q(affiliate__name__icontains=term),
+    },
+}
+
+#############################################################################
+
+def autocomplete_results(source, term='', page=1, forwarded=None):
+    """
+    One page of matches of an autocomplete source as {'results': [{'id', 'text'}], 'more'}.
+
+    Forwarded values are applied only for the filters the source declares, and
+    only when they are ids. One extra row is read to tell whether a next page
+    exists, so no count query is run.
+    """
+    spec = AUTOCOMPLETE_SOURCES[source]
+    queryset = spec['queryset']()
+    term = term.strip()
+    if term:
+        queryset = queryset.filter(spec['search'](term))
+    for param, lookup in spec.get('forward', {}).items():
+        value = (forwarded or {}).get(param, '')
+        if value.isdigit():
+            queryset = queryset.filter(**{lookup: value})
+
+    start = (page - 1) * AUTOCOMPLETE_PAGE_SIZE
+    matches = list(queryset.order_by(*spec['ordering'], 'pk')[start:start + AUTOCOMPLETE_PAGE_SIZE + 1])
+    return {
+        'results': [{'id': obj.pk, 'text': str(obj)} for obj in matches[:AUTOCOMPLETE_PAGE_SIZE]],
+        'more': len(matches) > AUTOCOMPLETE_PAGE_SIZE,
+    }
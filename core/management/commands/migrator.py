@@ -2,6 +2,7 @@ import os
 from django.core.management.base import BaseCommand
 from django.core.management import call_command
 from django.contrib.auth import get_user_model
+from django.db import connection
 
 
 class Command(BaseCommand):
@@ -18,10 +19,35 @@ class Command(BaseCommand):
         self.stdout.write("Making migrations...")
         call_command('makemigrations', 'users', 'core', 'storage', 'finance', 'salary', 'treasury')
 
+        # The search indexes use trigram operator classes, which come with pg_trgm
+        self.stdout.write("Enabling the pg_trgm extension...")
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
         # Run migrations
         self.stdout.write("Running migrations...")
         call_command('migrate', '--noinput')
 
+        # Fill the running price statistics of assets created before they existed
+        self.stdout.write("Backfilling asset price statistics...")
+        call_command('backfill_price_stats')
+
+        # Fill the stored entity names of export records created before they existed
+        self.stdout.write("Backfilling export record entity labels...")
+        call_command('backfill_entity_labels')
+
+        # Fill the normalized search columns of rows created before they existed
+        self.stdout.write("Backfilling search columns...")
+        call_command('rebuild_search_text')
+
+        # Write the activity log entries spooled while the database could not be reached
+        self.stdout.write("Replaying spooled activity log entries...")
+        call_command('flush_activity_log')
+
+        # Count the activity log per day and move the entries past the retention to the archive
+        self.stdout.write("Archiving expired activity log entries...")
+        call_command('archive_activity_log')
+
         # Create superuser if it doesn't exist
         User = get_user_model()
         username = 'admin'
@@ -1,5 +1,6 @@
 from django.db import models
 from storage.models import ExportRecord
+from storage.search import normalize_search, trigram_index
 from django.contrib.contenttypes.fields import GenericRelation
 
 
@@ -8,11 +9,19 @@ class Company(models.Model):
     name = models.CharField(max_length=255, verbose_name="اسم الشركة")
     address = models.CharField(max_length=255, verbose_name="العنوان", blank=True)
     phone = models.CharField(max_length=15, verbose_name="رقم الهاتف", blank=True)
+    search_text = models.CharField(max_length=255, blank=True, editable=False)  # Normalized name
 
     class Meta:
         verbose_name = "شركة"
         verbose_name_plural = "الشركات"
         ordering = ['name']
+        indexes = [
+            trigram_index('search_text', 'company_search_trgm'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.search_text = normalize_search(self.name)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -26,12 +35,20 @@ class Department(models.Model):
         ('Unit', 'وحدة'),
     ], verbose_name="التقسيم الاداري")
     name = models.CharField(max_length=255, verbose_name="اسم التقسيم")
-    selections = GenericRelation(ExportRecord)
+    search_text = models.CharField(max_length=255, blank=True, editable=False)  # Normalized name
+    selections = GenericRelation(ExportRecord, content_type_field='entity_type', object_id_field='entity_id')
 
     class Meta:
         verbose_name = "تقسيم اداري"
         verbose_name_plural = "التقسيمات الادارية"
         ordering = ['name']
+        indexes = [
+            trigram_index('search_text', 'department_search_trgm'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.search_text = normalize_search(self.name)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -66,7 +83,7 @@ class SubAffiliate(models.Model):
         ('Office', 'مكتب'),
         ('Section', 'قسم'),
     ], verbose_name="التقسيم الاداري")
-    selections = GenericRelation(ExportRecord)
+    selections = GenericRelation(ExportRecord, content_type_field='entity_type', object_id_field='entity_id')
 
     class Meta:
         verbose_name = "تقسيم فرعي"
@@ -90,12 +107,20 @@ class Employee(models.Model):
     email = models.EmailField(verbose_name="البريد الالكتروني")
     phone = models.CharField(max_length=15, verbose_name="رقم الهاتف")
     date_employed = models.DateField(verbose_name="تاريخ التعيين")
-    selections = GenericRelation(ExportRecord)
+    search_text = models.CharField(max_length=255, blank=True, editable=False)  # Normalized name
+    selections = GenericRelation(ExportRecord, content_type_field='entity_type', object_id_field='entity_id')
 
     class Meta:
         verbose_name = "موظف"
         verbose_name_plural = "الموظفين"
         ordering = ['date_employed']
+        indexes = [
+            trigram_index('search_text', 'employee_search_trgm'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.search_text = normalize_search(self.name)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -0,0 +1,201 @@
+#############################################################################
+# Keyset Pagination Libraries
+#############################################################################
+import base64
+import binascii
+import hashlib
+import json
+import time
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from django_tables2 import RequestConfig
+from django_tables2.paginators import LazyPaginator
+from django_tables2.rows import BoundRows
+
+#############################################################################
+# Query parameter holding the cursor token of the page to show
+CURSOR_FIELD = 'cursor'
+# Seconds a filtered row count is reused before it is counted again
+COUNT_CACHE_TIMEOUT = 300
+# Tables smaller than this are counted exactly, the planner estimate is too rough for them
+ESTIMATE_MIN_ROWS = 10000
+
+#############################################################################
+# Cursor Tokens
+#############################################################################
+
+def encode_cursor(direction, values):
+    """Pack a page direction ('next' or 'prev') and the boundary row keys into a URL-safe token."""
+    payload = json.dumps([direction, values], default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Unpack a cursor token, or return None for a missing or tampered one."""
+    if not token:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        direction, values = json.loads(payload)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+def cursor_values(model, keys, values):
+    """
+    The cursor's key values as the key fields' Python values.
+
+    Returns None unless there is one valid, non-null value per key, so a
+    crafted cursor shows the first page rather than failing the request.
+    """
+    if len(values) != len(keys):
+        return None
+    cleaned = []
+    for key, value in zip(keys, values):
+        if value is None or isinstance(value, (list, dict)):
+            return None
+        try:
+            cleaned.append(model._meta.get_field(key.lstrip('-')).to_python(value))
+        except ValidationError:
+            return None
+    return cleaned
+
+
+def seek_query(keys, values, forward=True):
+    """
+    Rows strictly after (or before) the given key values in the keys ordering.
+
+    keys are order_by() style fields, e.g. ('-date', '-trans_id'). The leading
+    key is also bounded on its own, so the database can range-scan its index.
+    """
+    query = Q()
+    equal = Q()
+    for key, value in zip(keys, values):
+        field = key.lstrip('-')
+        after = key.startswith('-') != forward  # Descending keys continue with smaller values
+        query |= equal & Q(**{f"{field}__{'gt' if after else 'lt'}": value})
+        equal &= Q(**{field: value})
+    leading = keys[0].lstrip('-')
+    after = keys[0].startswith('-') != forward
+    return Q(**{f"{leading}__{'gte' if after else 'lte'}": values[0]}) & query
+
+#############################################################################
+# Row Counts
+#############################################################################
+
+def estimated_count(queryset):
+    """
+    Approximate number of rows in a queryset without scanning it on every page view.
+
+    An unfiltered queryset over a large table uses the planner row estimate,
+    a filtered one is counted once and cached for a few minutes.
+    """
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] >= ESTIMATE_MIN_ROWS:
+            return row[0]
+    return cached_query_value(queryset, 'count', queryset.count)
+
+
+def _query_version_key(model):
+    return f"query_version_{model._meta.label_lower}"
+
+
+def cached_query_value(queryset, name, compute):
+    """
+    Cache a value computed from a queryset, keyed on the SQL the queryset runs.
+
+    Keys also carry the model's version token, so invalidate_query_values
+    drops every cached value of the model at once.
+    """
+    model = queryset.model
+    version = cache.get(_query_version_key(model))
+    if version is None:
+        cache.add(_query_version_key(model), time.time_ns(), None)
+        version = cache.get(_query_version_key(model))
+    sql, params = queryset.order_by().query.sql_with_params()
+    digest = hashlib.md5(f"{sql}{params}".encode()).hexdigest()
+    return cache.get_or_set(f"query_{name}_{model._meta.label_lower}_{version}_{digest}", compute, COUNT_CACHE_TIMEOUT)
+
+
+def invalidate_query_values(model):
+    """Drop the cached counts and aggregates of a model, after its rows are written."""
+    cache.set(_query_version_key(model), time.time_ns(), None)
+
+#############################################################################
+# Tables
+#############################################################################
+
+class KeysetPage:
+    """The current page of a keyset paginated table, in the shape the table templates read."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.count = count
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def paginate_table(request, table, keys, per_page=10):
+    """
+    Paginate a table by seeking past the last shown row instead of using OFFSET.
+
+    keys are the order_by() fields the pages follow and must end in a unique
+    field, e.g. ('-date', '-trans_id'). Deep pages cost the same as the first
+    one and no exact COUNT is run. When a column header sort is requested the
+    table falls back to numbered pages without a total.
+    """
+    if request.GET.get(table.prefixed_order_by_field):
+        RequestConfig(request, paginate={'paginator_class': LazyPaginator, 'per_page': per_page}).configure(table)
+        return table
+
+    RequestConfig(request, paginate=False).configure(table)
+    queryset = table.data.data.order_by(*keys)
+    fields = [key.lstrip('-') for key in keys]
+
+    cursor = decode_cursor(request.GET.get(CURSOR_FIELD))
+    if cursor is not None:
+        values = cursor_values(queryset.model, keys, cursor[1])
+        cursor = (cursor[0], values) if values is not None else None
+    forward = cursor is None or cursor[0] == 'next'
+    page_rows = queryset
+    if cursor is not None:
+        page_rows = page_rows.filter(seek_query(keys, cursor[1], forward))
+    if not forward:
+        # Walk backwards from the cursor, then restore the display order
+        page_rows = page_rows.reverse()
+
+    records = list(page_rows[:per_page + 1])
+    has_more = len(records) > per_page
+    records = records[:per_page]
+    if not forward:
+        records.reverse()
+
+    def boundary(record, direction):
+        return encode_cursor(direction, [getattr(record, field) for field in fields])
+
+    next_cursor = previous_cursor = None
+    if records:
+        if has_more or not forward:
+            next_cursor = boundary(records[-1], 'next')
+        if cursor is not None and (has_more or forward):
+            previous_cursor = boundary(records[0], 'prev')
+
+    table.page = KeysetPage(BoundRows(records, table), next_cursor, previous_cursor, estimated_count(queryset))
+    table.template_name = 'keyset_table.html'
+    return table
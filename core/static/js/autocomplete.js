@@ -0,0 +1,183 @@
+// Autocomplete for the select fields rendered by core.widgets: the select keeps only the
+// chosen options and stays hidden in the form, matches are fetched page by page as the user types
+(function () {
+    const DEBOUNCE_MS = 250;
+
+    function setup(select) {
+        const multiple = select.multiple;
+        const wrapper = document.createElement('div');
+        wrapper.className = 'position-relative';
+        const chips = document.createElement('div');
+        chips.className = 'd-flex flex-wrap gap-1 mb-1';
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control';
+        input.dir = 'rtl';
+        input.autocomplete = 'off';
+        input.placeholder = select.getAttribute('placeholder') || '';
+        const menu = document.createElement('div');
+        menu.className = 'list-group position-absolute w-100 shadow d-none';
+        menu.style.zIndex = 1050;
+        menu.style.maxHeight = '16rem';
+        menu.style.overflowY = 'auto';
+
+        // The hidden select cannot show a validation message, the search box asks instead
+        input.required = select.required;
+        select.required = false;
+        select.classList.add('d-none');
+        select.after(wrapper);
+        if (multiple) wrapper.appendChild(chips);
+        wrapper.append(input, menu);
+
+        // Other fields whose values narrow the search, as "param:field_id" pairs
+        const forwarded = (select.dataset.autocompleteForward || '').split(',').filter(Boolean).map(pair => pair.split(':'));
+
+        let term = '';
+        let page = 1;
+        let more = false;
+        let loading = false;
+        let request = 0;
+        let timer = null;
+
+        function showSelection() {
+            if (multiple) {
+                chips.innerHTML = '';
+                Array.from(select.selectedOptions).forEach(option => {
+                    const chip = document.createElement('span');
+                    chip.className = 'badge text-bg-secondary d-flex align-items-center gap-1';
+                    chip.textContent = option.textContent;
+                    const remove = document.createElement('button');
+                    remove.type = 'button';
+                    remove.className = 'btn-close btn-close-white btn-sm';
+                    remove.addEventListener('click', () => {
+                        option.remove();
+                        showSelection();
+                        select.dispatchEvent(new Event('change', {bubbles: true}));
+                    });
+                    chip.appendChild(remove);
+                    chips.appendChild(chip);
+                });
+            } else {
+                const option = select.selectedOptions[0];
+                input.value = option && option.value ? option.textContent : '';
+            }
+        }
+
+        function choose(id, text) {
+            if (multiple) {
+                if (!Array.from(select.options).some(option => option.value === String(id))) {
+                    select.appendChild(new Option(text, id, true, true));
+                }
+                input.value = '';
+            } else {
+                select.innerHTML = '';
+                select.append(new Option('', ''), new Option(text, id, true, true));
+            }
+            showSelection();
+            hide();
+            select.dispatchEvent(new Event('change', {bubbles: true}));
+        }
+
+        function clear() {
+            if (multiple) return;
+            select.innerHTML = '';
+            select.appendChild(new Option('', ''));
+            input.value = '';
+        }
+
+        function hide() {
+            menu.classList.add('d-none');
+        }
+
+        function addItem(text, onClick) {
+            const item = document.createElement('button');
+            item.type = 'button';
+            item.className = 'list-group-item list-group-item-action text-end';
+            item.textContent = text;
+            if (onClick) {
+                item.addEventListener('mousedown', event => event.preventDefault());  // Keep the focus in the input
+                item.addEventListener('click', onClick);
+            } else {
+                item.disabled = true;
+            }
+            menu.appendChild(item);
+        }
+
+        function load(reset) {
+            if (reset) {
+                page = 1;
+                request += 1;
+            } else if (loading || !more) {
+                return;
+            }
+            const current = request;
+            const params = new URLSearchParams({q: term, page: page});
+            forwarded.forEach(([param, fieldId]) => {
+                const field = document.getElementById(fieldId);
+                if (field && field.value) params.set(param, field.value);
+            });
+            loading = true;
+            fetch(`${select.dataset.autocompleteUrl}?${params}`, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+                .then(response => response.json())
+                .then(data => {
+                    if (current !== request) return;  // A newer search was started meanwhile
+                    if (reset) menu.innerHTML = '';
+                    data.results.forEach(result => addItem(result.text, () => choose(result.id, result.text)));
+                    if (reset && !data.results.length) addItem('لا توجد نتائج');
+                    more = data.more;
+                    page += 1;
+                    menu.classList.remove('d-none');
+                })
+                .catch(error => console.error('Autocomplete search failed:', error))
+                .finally(() => {
+                    if (current === request) loading = false;
+                });
+        }
+
+        input.addEventListener('input', function () {
+            term = input.value.trim();
+            if (!multiple && !input.value) {
+                clear();
+                select.dispatchEvent(new Event('change', {bubbles: true}));
+            }
+            clearTimeout(timer);
+            timer = setTimeout(() => load(true), DEBOUNCE_MS);
+        });
+        input.addEventListener('focus', function () {
+            term = multiple ? input.value.trim() : '';
+            load(true);
+        });
+        input.addEventListener('keydown', function (event) {
+            if (event.key === 'Escape') {
+                hide();
+            } else if (event.key === 'Enter' && !menu.classList.contains('d-none')) {
+                // Enter picks the first match instead of submitting the form
+                event.preventDefault();
+                const first = menu.querySelector('button:not([disabled])');
+                if (first) first.click();
+            }
+        });
+        input.addEventListener('blur', function () {
+            hide();
+            showSelection();
+        });
+        menu.addEventListener('scroll', function () {
+            if (menu.scrollTop + menu.clientHeight >= menu.scrollHeight - 20) load(false);
+        });
+
+        // A choice made under another filter is dropped when that filter changes
+        forwarded.forEach(([, fieldId]) => {
+            const field = document.getElementById(fieldId);
+            if (field) field.addEventListener('change', () => {
+                clear();
+                hide();
+            });
+        });
+
+        showSelection();
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocomplete-url]').forEach(setup);
+    });
+})();
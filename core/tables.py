@@ -3,6 +3,27 @@ from .models import Company, Department, Affiliate, SubAffiliate, Employee
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 from babel.dates import format_date
+from django.db.models import QuerySet
+
+
+class RelatedTable(tables.Table):
+    """
+    Base for tables that render related objects.
+
+    Subclasses list the relations their columns read in select_related and
+    prefetch_related. They are applied to queryset data when the table is
+    built, so a page renders in a fixed number of queries whatever its rows.
+    """
+    select_related = ()
+    prefetch_related = ()
+
+    def __init__(self, data=None, *args, **kwargs):
+        if isinstance(data, QuerySet):
+            if self.select_related:
+                data = data.select_related(*self.select_related)
+            if self.prefetch_related:
+                data = data.prefetch_related(*self.prefetch_related)
+        super().__init__(data, *args, **kwargs)
 
 
 # Entity Models
@@ -79,8 +100,9 @@ class AffiliateTable(tables.Table):
         return mark_safe(f'<a href="{reverse("sub_affiliate_view", args=[value])}" class="btn btn-info">عرض</a>')
 
 
-class EmployeeTable(tables.Table):
+class EmployeeTable(RelatedTable):
     edit = tables.Column(accessor='id', verbose_name='', empty_values=())
+    select_related = ('department',)
 
     def __init__(self, *args, model_name=None, **kwargs):
         super().__init__(*args, **kwargs)
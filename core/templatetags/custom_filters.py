@@ -1,5 +1,6 @@
 from django import template
 from urllib.parse import urlencode
+from users.permissions import user_access
 
 
 
@@ -24,8 +25,8 @@ def set_value(value, new_value):
 
 @register.filter
 def is_in_group(user, group_name):
-    """Check if a user is a member of a given group."""
-    return user.groups.filter(name=group_name).exists()
+    """Check if a user is a member of a given group, from the cached group names."""
+    return group_name in user_access(user).groups
 
 
 @register.filter
@@ -13,5 +13,6 @@ urlpatterns = [
     path('manage/<str:model_name>/', views.manage_sections, name='manage_sections'),
     path('manage/affiliate/subs/<int:affiliate_id>/', views.sub_affiliate_view, name='sub_affiliate_view'),
     path("toggle-sidebar/", views.toggle_sidebar, name="toggle_sidebar"),
+    path('autocomplete/<str:source>/', views.autocomplete, name='autocomplete'),
 
 ]
\ No newline at end of file
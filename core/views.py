@@ -5,7 +5,8 @@ from .forms import CompanyForm, DepartmentForm, AffiliateForm, SubAffiliateForm,
 from .models import Company, Department, Affiliate, SubAffiliate, Employee
 from .tables import CompanyTable, DepartmentTable, AffiliateTable, SubAffiliateTable, EmployeeTable
 from django.contrib.auth.decorators import login_required
-from django.http import FileResponse, JsonResponse
+from django.http import FileResponse, JsonResponse, Http404
+from .autocomplete import AUTOCOMPLETE_SOURCES, autocomplete_results
 from django_tables2 import RequestConfig 
 # from django.http import JsonResponse
 # from django.contrib.auth import authenticate, login
@@ -161,6 +162,16 @@ def sub_affiliate_view(request, affiliate_id, sub_id=None):
     })
 
 
+
+# Paged matches for the autocomplete widgets of the form choice fields
+@login_required
+def autocomplete(request, source):
+    if source not in AUTOCOMPLETE_SOURCES:
+        raise Http404("Unknown autocomplete source.")
+    page = request.GET.get('page', '1')
+    page = int(page) if page.isdigit() and int(page) > 0 else 1
+    return JsonResponse(autocomplete_results(source, request.GET.get('q', ''), page, request.GET))
+
 # def clear_login_modal_flag(request):
 #     """ Clear the session flag to prevent the modal from showing again. """
 #     if request.method == 'POST':  # We expect a POST request to clear the session flag
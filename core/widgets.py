@@ -0,0 +1,55 @@
+#############################################################################
+# Autocomplete Widget Libraries
+#############################################################################
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+#############################################################################
+
+class AutocompleteMixin:
+    """
+    Render a model choice field with only its selected options.
+
+    The other choices are searched page by page through the autocomplete
+    endpoint of `source` by static/js/autocomplete.js, so the field's queryset
+    is only used to validate and to label the selection, never listed in full.
+    `forward` maps an endpoint filter to the id of another field on the page,
+    e.g. {'category': 'id_asset_cat'} to search the chosen category only.
+    """
+
+    def __init__(self, source, forward=None, attrs=None):
+        super().__init__(attrs)
+        self.source = source
+        self.forward = forward or {}
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocomplete-url'] = reverse('autocomplete', args=[self.source])
+        if self.forward:
+            attrs['data-autocomplete-forward'] = ','.join(f'{param}:{field_id}' for param, field_id in self.forward.items())
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        options = []
+        if not self.allow_multiple_selected:
+            options.append(self.create_option(name, '', '', False, 0))
+
+        queryset = getattr(self.choices, 'queryset', None)
+        selected = [str(v) for v in value if str(v) not in ('', 'None')]
+        if selected and queryset is not None:
+            try:
+                objects = list(queryset.filter(pk__in=selected))
+            except (ValueError, ValidationError):
+                objects = []  # A submitted value that is not an id has nothing to show
+            for obj in objects:
+                options.append(self.create_option(name, obj.pk, self.choices.field.label_from_instance(obj), True, len(options)))
+        return [(None, options, 0)]
+
+
+class AutocompleteSelect(AutocompleteMixin, forms.Select):
+    pass
+
+
+class AutocompleteSelectMultiple(AutocompleteMixin, forms.SelectMultiple):
+    pass
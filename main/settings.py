@@ -141,6 +141,9 @@ INSTALLED_APPS = [
     'django_filters',
 ]
 
+# Permission checks read the group names and permissions kept in the session, see users.permissions
+AUTHENTICATION_BACKENDS = ['users.permissions.CachedModelBackend']
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -148,6 +151,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.AuditMiddleware',
+    'users.middleware.PermissionCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # 'csp.middleware.CSPMiddleware',
@@ -260,6 +265,31 @@ MEDIA_URL = '/media/'
 # MEDIA_ROOT is the actual filesystem path where the files are stored
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Directory where rendered voucher PDFs are cached, and its size limit in bytes.
+# The least recently used files are evicted once the limit is exceeded.
+PDF_CACHE_DIR = os.path.join(MEDIA_ROOT, "pdf_cache")
+PDF_CACHE_MAX_SIZE = int(os.getenv('PDF_CACHE_MAX_SIZE', 200 * 1024 * 1024))
+# Reports larger than this are spooled to a temporary file while they stream
+PDF_SPOOL_MAX_SIZE = int(os.getenv('PDF_SPOOL_MAX_SIZE', 5 * 1024 * 1024))
+# Worker processes used to render batch voucher exports in parallel
+PDF_BATCH_WORKERS = int(os.getenv('PDF_BATCH_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Activity log entries are queued and written in batches of ACTIVITY_LOG_BATCH_SIZE, at
+# least every ACTIVITY_LOG_FLUSH_INTERVAL seconds. The 'memory' buffer queues them in each
+# process, the 'redis' buffer in the cache server, where they survive a crashed process.
+ACTIVITY_LOG_BUFFER = os.getenv('ACTIVITY_LOG_BUFFER', 'memory')
+ACTIVITY_LOG_BATCH_SIZE = int(os.getenv('ACTIVITY_LOG_BATCH_SIZE', 100))
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_LOG_FLUSH_INTERVAL', 5))
+# Without the background writer each entry is written as it is logged, with no thread or exit
+# flush. The test runner turns it off, so no entry outlives the test database.
+ACTIVITY_LOG_BACKGROUND = os.getenv('ACTIVITY_LOG_BACKGROUND', 'True') == 'True' and sys.argv[1:2] != ['test']
+# Entries that could not be written are spooled here and replayed by flush_activity_log
+ACTIVITY_LOG_SPOOL_DIR = os.path.join(BASE_DIR, "logs", "activity_spool")
+# Entries older than ACTIVITY_LOG_RETENTION_DAYS are moved, a month at a time, to gzipped
+# files under ACTIVITY_LOG_ARCHIVE_DIR by archive_activity_log; their daily counts are kept
+ACTIVITY_LOG_RETENTION_DAYS = int(os.getenv('ACTIVITY_LOG_RETENTION_DAYS', 365))
+ACTIVITY_LOG_ARCHIVE_DIR = os.path.join(BASE_DIR, "logs", "activity_archive")
+
 # Language and timezone settings.
 # Defines the language code for the application and the timezone used for date and time.
 LANGUAGE_CODE = 'ar'
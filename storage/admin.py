@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Asset, AssetCategory, ImportRecord, ExportRecord, Committee
+from .models import Asset, AssetCategory, ImportRecord, ExportRecord, Committee, StockMovement, PdfJob
 
 @admin.register(AssetCategory)
 class AssetCategoryAdmin(admin.ModelAdmin):
@@ -25,7 +25,7 @@ class ImportRecordAdmin(admin.ModelAdmin):
 # Admin Configuration for ExportRecord
 @admin.register(ExportRecord)
 class ExportRecordAdmin(admin.ModelAdmin):
-    list_display = ('trans_id', 'date', 'export_type', 'entity_type', 'entity_id', 'created_at', 'updated_at')
+    list_display = ('trans_id', 'date', 'export_type', 'entity_kind', 'entity_name', 'created_at', 'updated_at')
     list_filter = ('entity_type', 'date', 'export_type')
     search = ('items', 'trans_id')
     ordering = ('trans_id', 'date', 'export_type')
@@ -36,4 +36,34 @@ class CommitteeAdmin(admin.ModelAdmin):
     list_display = ('year', 'president')
     list_filter = ('year', 'president')
     search = ('members', 'president')
-    ordering = ('year',)
\ No newline at end of file
+    ordering = ('year',)
+
+
+# Admin Configuration for the append-only StockMovement ledger
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'asset', 'kind', 'quantity', 'balance', 'trans_id')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('asset__name', 'trans_id')
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# Admin Configuration for background PDF jobs
+@admin.register(PdfJob)
+class PdfJobAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'kind', 'status', 'created_by', 'attempts', 'finished_at')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('id', 'kind', 'params', 'file', 'filename', 'error', 'attempts', 'created_by', 'started_at', 'finished_at')
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
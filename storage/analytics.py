@@ -0,0 +1,209 @@
+#############################################################################
+# Stock Analytics Libraries
+#############################################################################
+import io
+from datetime import date
+import numpy as np
+import pandas as pd
+from django.db import connection
+from .models import Asset, ImportItem, ExportItem
+from .reports import IMPORT, EXPORT
+
+#############################################################################
+# Days of consumption the stock-out forecast extrapolates from, and the
+# horizon beyond which an asset is not expected to run out at all
+FORECAST_WINDOW_DAYS = 90
+FORECAST_HORIZON_DAYS = 10 * 365
+# Period lengths accepted by consumption_by_period
+PERIODS = {'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+MOVEMENT_COLUMNS = ['asset_id', 'category_id', 'date', 'quantity', 'price']
+
+#############################################################################
+# Movement Frames
+#############################################################################
+
+def _fetch_frame(queryset, columns):
+    """
+    Load the rows of a values_list queryset as a frame with the given column names.
+
+    The query is streamed through COPY as CSV and parsed by pandas column by
+    column, so no Python object is built per row or per value.
+    """
+    sql, params = queryset.query.sql_with_params()
+    buffer = io.StringIO()
+    with connection.cursor() as cursor:
+        query = cursor.mogrify(sql, params).decode()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH CSV", buffer)
+    if not buffer.tell():
+        return pd.DataFrame(columns=columns)
+    buffer.seek(0)
+    return pd.read_csv(buffer, names=columns)
+
+
+def movement_frame(end_date, start_date=None):
+    """
+    Every import and export line up to end_date as one frame, ordered like the report stream.
+
+    Columns are asset_id, category_id, date, kind (IMPORT or EXPORT), quantity,
+    price (imports only, NaN on exports) and signed, the quantity as it moves
+    the stock. Runs one query per movement table.
+    """
+    imports = ImportItem.objects.filter(record__date__lte=end_date)
+    exports = ExportItem.objects.filter(record__date__lte=end_date)
+    if start_date:
+        imports = imports.filter(record__date__gte=start_date)
+        exports = exports.filter(record__date__gte=start_date)
+
+    import_frame = _fetch_frame(imports.order_by().values_list('asset_id', 'asset__category_id', 'record__date', 'quantity', 'price'), MOVEMENT_COLUMNS)
+    export_frame = _fetch_frame(exports.order_by().values_list('asset_id', 'asset__category_id', 'record__date', 'quantity'), MOVEMENT_COLUMNS[:-1])
+    import_frame['kind'] = IMPORT
+    export_frame['kind'] = EXPORT
+    export_frame['price'] = np.nan
+
+    frame = pd.concat([import_frame, export_frame], ignore_index=True)
+    frame = frame.astype({'asset_id': 'int64', 'quantity': 'int64', 'kind': 'int8', 'price': 'float64'})
+    frame['date'] = pd.to_datetime(frame['date'], format='%Y-%m-%d')
+    frame['signed'] = np.where(frame['kind'] == IMPORT, frame['quantity'], -frame['quantity'])
+    # Imports come before exports on the same date, as in the report stream
+    return frame.sort_values(['asset_id', 'date', 'kind'], kind='stable', ignore_index=True)
+
+
+def asset_frame():
+    """Name, category and stock of every asset, indexed by asset id."""
+    frame = _fetch_frame(
+        Asset.objects.order_by().values_list('id', 'name', 'category_id', 'category__name', 'stock'),
+        ['asset_id', 'name', 'category_id', 'category', 'stock'],
+    )
+    return frame.set_index('asset_id')
+
+#############################################################################
+# Vectorized Metrics
+#############################################################################
+
+def stock_balances(frame):
+    """Running balance of each movement and the recorded balance of each asset, the vectorized report walk."""
+    running = frame.groupby('asset_id', sort=False)['signed'].cumsum()
+    return running, running.groupby(frame['asset_id'], sort=False).last()
+
+
+def consumption(frame, keys=('asset_id',)):
+    """Exported quantity grouped by the given columns."""
+    exports = frame[frame['kind'] == EXPORT]
+    return exports.groupby(list(keys))['quantity'].sum()
+
+
+def consumption_by_period(frame, period='month', keys=('category_id',)):
+    """Exported quantity per group and period, one column per period."""
+    exports = frame[frame['kind'] == EXPORT]
+    periods = exports['date'].dt.to_period(PERIODS[period])
+    table = exports.groupby([*[exports[key] for key in keys], periods])['quantity'].sum()
+    return table.unstack(fill_value=0)
+
+
+def turnover(frame, start_date, end_date):
+    """
+    Exported quantity over the average of the opening and closing balances, per asset.
+
+    Assets that held no stock over the period have no turnover (NaN).
+    """
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    by_asset = frame['asset_id']
+    opening = frame['signed'].where(frame['date'] < start, 0).groupby(by_asset).sum()
+    closing = frame['signed'].where(frame['date'] <= end, 0).groupby(by_asset).sum()
+    in_period = (frame['kind'] == EXPORT) & (frame['date'] >= start) & (frame['date'] <= end)
+    consumed = frame['quantity'].where(in_period, 0).groupby(by_asset).sum()
+    average = (opening + closing) / 2
+    return consumed / average.where(average > 0)
+
+
+def price_trends(frame):
+    """
+    First, last and mean import price of each asset and the least-squares slope per 30 days.
+
+    The slope is taken from grouped sums of the dates and prices, so no model is
+    fitted asset by asset. Assets priced on a single date have no slope (NaN).
+    """
+    imports = frame[frame['kind'] == IMPORT]
+    days = (imports['date'] - pd.Timestamp('1970-01-01')).dt.days.astype('float64')
+    prices = imports['price']
+    sums = pd.DataFrame({
+        'asset_id': imports['asset_id'], 'n': 1, 't': days, 'p': prices, 'tp': days * prices, 'tt': days * days,
+    }).groupby('asset_id').sum()
+    variance = sums['tt'] - sums['t'] ** 2 / sums['n']
+    slope = (sums['tp'] - sums['t'] * sums['p'] / sums['n']) / variance.where(variance > 0)
+    grouped = prices.groupby(imports['asset_id'])
+    return pd.DataFrame({
+        'first_price': grouped.first(),
+        'last_price': grouped.last(),
+        'mean_price': sums['p'] / sums['n'],
+        'slope_30d': slope * 30,
+    })
+
+
+def stockout_forecast(frame, stock, end_date, window_days=FORECAST_WINDOW_DAYS):
+    """
+    Daily consumption over the last window and the date each asset runs out at that rate.
+
+    Assets not consumed over the window, or not running out within the
+    horizon, have no forecast (NaT).
+    """
+    end = pd.Timestamp(end_date)
+    recent = (frame['kind'] == EXPORT) & (frame['date'] > end - pd.Timedelta(days=window_days)) & (frame['date'] <= end)
+    rate = frame['quantity'].where(recent, 0).groupby(frame['asset_id']).sum().reindex(stock.index, fill_value=0) / window_days
+    days_left = stock / rate.where(rate > 0)
+    days_left = days_left.where(days_left <= FORECAST_HORIZON_DAYS)
+    return pd.DataFrame({
+        'daily_rate': rate,
+        'days_left': days_left,
+        'stockout_date': end + pd.to_timedelta(np.ceil(days_left), unit='D'),
+    })
+
+#############################################################################
+# Report Rows
+#############################################################################
+
+def _records(frame):
+    """Frame rows as dicts for the templates, None instead of NaN and NaT."""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def stock_analytics(year):
+    """
+    Per-asset and per-category analytics rows of a year for the report page.
+
+    Movements before the year only serve the opening balances, consumption and
+    prices are those of the year, the forecast runs from its last day.
+    """
+    start_date, end_date = date(year, 1, 1), date(year, 12, 31)
+    frame = movement_frame(end_date)
+    assets = asset_frame()
+    year_frame = frame[frame['date'] >= pd.Timestamp(start_date)]
+
+    prices = price_trends(year_frame).reindex(assets.index)
+    forecast = stockout_forecast(frame, assets['stock'], end_date)
+    report = pd.DataFrame({
+        'category': assets['category'],
+        'name': assets['name'],
+        'stock': assets['stock'],
+        'imported': year_frame[year_frame['kind'] == IMPORT].groupby('asset_id')['quantity'].sum().reindex(assets.index, fill_value=0),
+        'consumed': consumption(year_frame).reindex(assets.index, fill_value=0),
+        'turnover': turnover(frame, start_date, end_date).reindex(assets.index).round(2),
+        'mean_price': prices['mean_price'].round(2),
+        'price_change': ((prices['last_price'] / prices['first_price'] - 1) * 100).round(1),
+        'stockout_date': forecast['stockout_date'].dt.date,
+    }).sort_values(['category', 'name'])
+
+    monthly = consumption_by_period(year_frame, 'month').reindex(columns=pd.period_range(start_date, end_date, freq='M'), fill_value=0)
+    categories = assets.drop_duplicates('category_id').set_index('category_id')['category']
+    category_rows = [
+        {'category': categories.get(category_id, ''), 'total': int(row.sum()), 'months': [int(value) for value in row]}
+        for category_id, row in monthly.iterrows()
+    ]
+    category_rows.sort(key=lambda row: row['category'])
+    return {
+        'assets': _records(report),
+        'categories': category_rows,
+        'months': [period.month for period in monthly.columns],
+        'window_days': FORECAST_WINDOW_DAYS,
+    }
@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class StorageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'storage'
-    verbose_name = "المخازن"
\ No newline at end of file
+    verbose_name = "المخازن"
+
+    def ready(self):
+        from . import signals  # Registers the export record entity label handlers
@@ -0,0 +1,80 @@
+#############################################################################
+# Batch Voucher Export Libraries
+#############################################################################
+import io
+import multiprocessing
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from pypdf import PdfReader, PdfWriter
+from .filters import import_records_query, export_records_query
+from .genpdf import import_record_pdf, export_record_pdf
+from .models import ImportRecord, ExportRecord
+from .records import RECORD_HYDRATORS
+
+#############################################################################
+# Listing filters a batch accepts, the same GET parameters as the record tables
+BATCH_FILTERS = ['trans_id', 'search', 'start_date', 'end_date', 'export_type']
+BATCH_FORMATS = ['pdf', 'zip']
+
+VOUCHER_RENDERERS = {
+    'import': import_record_pdf,
+    'export': export_record_pdf,
+}
+
+#############################################################################
+
+def batch_records(model, filters):
+    """Select the records of a batch with the record listing filters, oldest first."""
+    if model == 'import':
+        records = ImportRecord.objects.filter(import_records_query(filters))
+    else:
+        records = ExportRecord.objects.filter(export_records_query(filters, filters.get('export_type')))
+    return records.order_by('date', 'trans_id')
+
+
+def batch_record_infos(model, filters):
+    """Hydrate every record of a batch with a fixed number of queries."""
+    prefetch, record_info = RECORD_HYDRATORS[model]
+    return [record_info(record) for record in prefetch(batch_records(model, filters))]
+
+
+def _render_voucher(task):
+    model, record_info = task
+    trans_id = record_info['trans_id']
+    return trans_id, VOUCHER_RENDERERS[model](trans_id, record_info)
+
+
+def render_vouchers(model, record_infos, workers=None):
+    """
+    Render one voucher PDF per record, yielding (trans_id, pdf bytes) in record order.
+
+    Rendering is CPU bound, so the vouchers are spread over a pool of worker
+    processes. The records are hydrated beforehand, the workers never query.
+    """
+    workers = settings.PDF_BATCH_WORKERS if workers is None else workers
+    tasks = [(model, record_info) for record_info in record_infos]
+    if workers <= 1 or len(tasks) < 2:
+        yield from map(_render_voucher, tasks)
+        return
+
+    # Forked workers inherit the loaded Django apps and fonts, and never touch the database
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        yield from pool.map(_render_voucher, tasks, chunksize=chunksize)
+
+
+def write_batch_pdf(model, record_infos, output, workers=None):
+    """Write all vouchers into output as one PDF, one record after another."""
+    writer = PdfWriter()
+    for _, pdf_data in render_vouchers(model, record_infos, workers):
+        writer.append(PdfReader(io.BytesIO(pdf_data)))
+    writer.write(output)
+
+
+def write_batch_zip(model, record_infos, output, workers=None):
+    """Write all vouchers into output as a ZIP of per-record PDFs."""
+    # PDFs are already compressed, storing them saves time for no loss in size
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_STORED) as archive:
+        for trans_id, pdf_data in render_vouchers(model, record_infos, workers):
+            archive.writestr(f"{model}_record_{trans_id}.pdf", pdf_data)
@@ -0,0 +1,44 @@
+#############################################################################
+# Benchmark Libraries
+#############################################################################
+import time
+from contextlib import contextmanager
+from django.db import connection, transaction
+from .models import Asset, AssetCategory
+
+#############################################################################
+# Synthetic Data
+#############################################################################
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is rolled back afterwards, so no synthetic row is kept."""
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def synthetic_assets(prefix, count, categories=1, **fields):
+    """Create `count` assets spread over new categories, named after the prefix and the time."""
+    tag = f"{prefix}-{time.time_ns()}"
+    created = AssetCategory.objects.bulk_create(AssetCategory(name=f"{tag}-{i}") for i in range(categories))
+    return Asset.objects.bulk_create(
+        Asset(category=created[i % categories], name=f"{tag}-{i}", **fields)
+        for i in range(count)
+    )
+
+
+def analyze(*models):
+    """Refresh the planner statistics, or new synthetic rows are joined as if the tables were empty."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"ANALYZE {', '.join(model._meta.db_table for model in models)}")
+
+#############################################################################
+# Timing
+#############################################################################
+
+def timed(function, *args):
+    """The result of a call and the seconds it took."""
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
@@ -0,0 +1,83 @@
+#############################################################################
+# Draft Voucher Libraries
+#############################################################################
+from decimal import Decimal, InvalidOperation
+from django.db.models import Count, F, Sum
+from django.urls import reverse
+from .models import Asset, DraftVoucher, DraftLine
+
+#############################################################################
+# Drafts whose lines are edited through the JSON cart endpoints
+CART_KINDS = ['import', 'export']
+
+#############################################################################
+
+class DraftLineError(ValueError):
+    """Raised when a line cannot be added to a draft, with a message for the user."""
+
+
+def draft_line_info(line, kind):
+    """The row data shown for a draft line, expects the line to have its asset loaded."""
+    return {
+        'id': line.id,
+        'asset_id': line.asset_id,
+        'name': line.asset.name,
+        'quantity': line.quantity,
+        'unit': line.asset.get_unit_display(),
+        'price': line.price,
+        'total': line.price * line.quantity,
+        'delete_url': reverse('draft_line_delete', args=[kind, line.id]),
+    }
+
+
+def draft_totals(user, kind):
+    """Line count, quantity and value of the user's draft in one aggregate."""
+    totals = DraftLine.objects.filter(draft__user=user, draft__kind=kind).aggregate(
+        line_count=Count('id'),
+        total_quantity=Sum('quantity'),
+        total_value=Sum(F('price') * F('quantity')),
+    )
+    return {
+        'lines': totals['line_count'],
+        'quantity': totals['total_quantity'] or 0,
+        'total': totals['total_value'] or Decimal('0'),
+    }
+
+
+def add_draft_line(user, kind, asset_id, quantity, price=None):
+    """
+    Add a line to the user's import or export draft and return it with whether it replaced one.
+
+    An asset appears once on a receipt, so adding it to an import draft again
+    replaces its line. Export lines take the asset's average price, and every
+    add is a new line. Raises DraftLineError for input that cannot be added.
+    """
+    try:
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        raise DraftLineError("يرجى ادخال الكمية.")
+    if quantity < 1:
+        raise DraftLineError("يرجى ادخال الكمية.")
+    asset = Asset.objects.filter(id=asset_id).first() if str(asset_id or '').isdigit() else None
+    if asset is None:
+        raise DraftLineError("يرجى اختيار الصنف.")
+
+    if kind == 'import':
+        try:
+            price = Decimal(str(price))
+        except (InvalidOperation, ValueError):
+            raise DraftLineError("يرجى ادخال السعر.")
+        if not price.is_finite() or price <= 0:
+            raise DraftLineError("يرجى ادخال السعر.")
+    else:
+        price = asset.average_price()
+        if price is None:
+            raise DraftLineError(f"لا يوجد سعر مسجل للصنف {asset.name}.")
+
+    price = Decimal(str(price)).quantize(Decimal('0.01'))  # As stored, so the returned line matches a reload
+
+    draft = DraftVoucher.for_user(user, kind)
+    if kind == 'import':
+        line, created = DraftLine.objects.update_or_create(draft=draft, asset=asset, defaults={'quantity': quantity, 'price': price})
+        return line, not created
+    return DraftLine.objects.create(draft=draft, asset=asset, quantity=quantity, price=price), False
@@ -1,6 +1,7 @@
 import django_filters
-from .models import Asset, AssetCategory
-from django.db.models import Q
+from .models import Asset, AssetCategory, ImportItem, ExportItem
+from django.db.models import Q, Exists, OuterRef
+from .search import search_query
 
 class AssetFilter(django_filters.FilterSet):
     search = django_filters.CharFilter(method='filter_search', label='Search')
@@ -10,11 +11,75 @@ class AssetFilter(django_filters.FilterSet):
         fields = []  # We don't need to list the individual fields here anymore
 
     def filter_search(self, queryset, name, value):
-        # Combine filtering for name, brand, and brand_en
+        # Search the normalized name, brand and brand_en
         if value:
-            return queryset.filter(
-                Q(name__icontains=value) |
-                Q(brand__icontains=value) |
-                Q(brand_en__icontains=value)
-            )
-        return queryset
\ No newline at end of file
+            return queryset.filter(search_query('search_text', value))
+        return queryset
+
+
+def item_name_exists(item_model, search_term):
+    """
+    Match records having at least one line whose asset name or brand contains search_term.
+
+    A correlated EXISTS keeps one row per record, unlike joining the items,
+    so the listings need no distinct.
+    """
+    return Exists(item_model.objects.filter(search_query('asset__search_text', search_term), record=OuterRef('pk')))
+
+
+def date_range_query(params):
+    """Build the date range filter shared by the record listings."""
+    start_date = params.get('start_date', '')
+    end_date = params.get('end_date', '')
+    if start_date and end_date:
+        return Q(date__range=[start_date, end_date])
+    elif start_date:
+        return Q(date__gte=start_date)
+    elif end_date:
+        return Q(date__lte=end_date)
+    return Q()
+
+
+def import_records_query(params):
+    """
+    Build the import records filter from the listing's GET parameters.
+
+    Shared by the import records table and the batch voucher export, so both
+    always select the same records.
+    """
+    query = Q()
+    trans_id = params.get('trans_id', '')
+    items_or_company = params.get('search', '')
+
+    # Apply filters based on user input
+    if trans_id:
+        query &= Q(trans_id__icontains=trans_id) | Q(assign_number__icontains=trans_id)
+    if items_or_company:
+        # Adjusting the filters to reference the related fields correctly
+        query &= (
+            item_name_exists(ImportItem, items_or_company) |
+            search_query('company__search_text', items_or_company) |
+            Q(assign_number__icontains=items_or_company)
+        )
+
+    return query & date_range_query(params)
+
+
+def export_records_query(params, export_type=None):
+    """
+    Build the export records filter from the listing's GET parameters.
+
+    Limited to one export type when given, otherwise covers every type.
+    Shared by the export records tables and the batch voucher export.
+    """
+    query = Q(export_type=export_type) if export_type else Q()
+
+    if params.get('trans_id'):
+        query &= Q(trans_id__icontains=params['trans_id'])
+
+    # Check if there is a search term, matched against the stored entity name and the item names
+    if params.get('search'):
+        search_term = params.get('search', '')
+        query &= (search_query('entity_search', search_term) | item_name_exists(ExportItem, search_term))
+
+    return query & date_range_query(params)
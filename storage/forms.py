@@ -1,11 +1,11 @@
 from django import forms
-from django.contrib.contenttypes.models import ContentType
 from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Submit, Layout, Field, Div, HTML, Fieldset, ButtonHolder
 from crispy_forms.bootstrap import FormActions
 from .models import AssetCategory, Asset, ImportRecord, ImportItem, ExportRecord, ExportItem, Committee
 from core.models import Company, Department, Affiliate, SubAffiliate, Employee
 from core.forms import set_first_choice
+from core.widgets import AutocompleteSelect, AutocompleteSelectMultiple
 from django.urls import reverse
 from datetime import datetime
 
@@ -109,9 +109,12 @@ class ImportRecordForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # Companies are searched as the user types, only the chosen one is rendered,
+        # the queryset is set after the widget so that the widget gets its choices
+        self.fields['company'].widget = AutocompleteSelect('company')
         self.fields['company'].queryset = Company.objects.all()
+        self.fields['company'].label = 'الشركة'
         self.fields['notes'].required = False
-        set_first_choice(self.fields['company'], 'الشركة')
 
         self.helper = FormHelper()
         self.helper.layout = Layout(
@@ -148,7 +151,10 @@ class ImportItemForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        # Assets are searched within the chosen category, only the chosen asset is rendered
+        self.fields['asset'].widget = AutocompleteSelect('asset', forward={'category': 'id_asset_cat'})
         self.fields['asset'].queryset = Asset.objects.all()
+        self.fields['asset'].label = 'الصنف'
         self.fields['quantity'].widget.attrs.update({
             'min': '1.00',
         })
@@ -157,7 +163,6 @@ class ImportItemForm(forms.ModelForm):
             'step': '0.25',
         })
         set_first_choice(self.fields['asset_cat'], 'التصنيف')
-        set_first_choice(self.fields['asset'], 'الصنف')
 
         self.helper = FormHelper()
         self.helper.layout = Layout(
@@ -217,21 +222,21 @@ class ExportRecordForm(forms.ModelForm):
         set_field_attrs(self)
 
     def _set_entity_queryset(self, export_type):
-        """Set the queryset for the `entity` field based on the export type."""
+        """Set the queryset and autocomplete source of the `entity` field based on the export type."""
         if export_type == 'Consume':
-            self.fields['entity'].queryset = Department.objects.all()
-            set_first_choice(self.fields['entity'], 'الادارة او المكتب')
+            self._set_entity_source(Department.objects.all(), 'department', 'الادارة او المكتب')
         elif export_type == 'Personal':
-            self.fields['entity'].queryset = Employee.objects.all()
-            set_first_choice(self.fields['entity'], 'اسم الموظف')
+            self._set_entity_source(Employee.objects.all(), 'employee', 'اسم الموظف')
         elif export_type == 'Department':
-            self.fields['entity'].queryset = Department.objects.all()
-            set_first_choice(self.fields['entity'], 'الادارة او المكتب')
+            self._set_entity_source(Department.objects.all(), 'department', 'الادارة او المكتب')
         elif export_type == 'Loan':
-            self.fields['entity'].queryset = SubAffiliate.objects.all()
-            set_first_choice(self.fields['entity'], 'الجهة المستفيدة')
+            self._set_entity_source(SubAffiliate.objects.all(), 'sub_affiliate', 'الجهة المستفيدة')
 
-        print(f"Set queryset for export_type '{export_type}': {self.fields['entity'].queryset}")
+    def _set_entity_source(self, queryset, source, placeholder):
+        # The queryset only validates and labels the choice, the options are searched as the user types
+        self.fields['entity'].widget = AutocompleteSelect(source, attrs={'class': 'form-select'})
+        self.fields['entity'].queryset = queryset
+        self.fields['entity'].label = placeholder
 
     def clean(self):
         cleaned_data = super().clean()
@@ -245,10 +250,9 @@ class ExportRecordForm(forms.ModelForm):
     def save(self, commit=True):
         instance = super().save(commit=False)
 
-        # Set the `entity_content_type` and `entity_object_id`
-        entity = self.cleaned_data['entity']
-        instance.entity_type = ContentType.objects.get_for_model(entity)
-        instance.entity_id = self.cleaned_data['entity'].id
+        # Set the `entity_type` and `entity_id` through the generic foreign key,
+        # which also keeps the entity at hand for the record's entity label
+        instance.entity_selection = self.cleaned_data['entity']
 
         if commit:
             instance.save()
@@ -268,12 +272,13 @@ class ExportItemForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.fields['asset'].widget = AutocompleteSelect('stocked_asset', forward={'category': 'id_asset_cat'})
         self.fields['asset'].queryset = Asset.objects.filter(stock__gt=0)
+        self.fields['asset'].label = 'الصنف'
         self.fields['quantity'].widget.attrs.update({
             'min': '1.00',
         })
         set_first_choice(self.fields['asset_cat'], 'التصنيف')
-        set_first_choice(self.fields['asset'], 'الصنف')
         self.helper = FormHelper()
         self.helper.layout = Layout(
             Div(Field('asset_cat', css_class='form-control', id='id_asset_cat'), css_class='col'),
@@ -320,13 +325,13 @@ class ReportForm(forms.ModelForm):
 
     president = forms.ModelChoiceField(
         queryset=Employee.objects.all(),
-        widget=forms.Select(attrs={'class': 'form-select'}),
+        widget=AutocompleteSelect('employee', attrs={'class': 'form-select', 'placeholder': 'اسم الموظف'}),
         required=False,
         label="",
     )
     members = forms.ModelMultipleChoiceField(
         queryset=Employee.objects.all(),
-        widget=forms.CheckboxSelectMultiple(attrs={'class': 'p-2 lh-lg option-separator'}),
+        widget=AutocompleteSelectMultiple('employee', attrs={'class': 'form-select', 'placeholder': 'اضافة عضو'}),
         required=False,
         label="",
     )
@@ -334,3 +339,12 @@ class ReportForm(forms.ModelForm):
     class Meta:
         model = Committee
         fields = ['year', 'president', 'members']
+
+    def clean(self):
+        cleaned_data = super().clean()
+        president = cleaned_data.get('president')
+        members = cleaned_data.get('members')
+        # The president is not counted again among the members
+        if president and members is not None:
+            cleaned_data['members'] = members.exclude(pk=president.pk)
+        return cleaned_data
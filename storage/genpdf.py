@@ -7,12 +7,13 @@ import io
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
 from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
+from reportlab.platypus import BaseDocTemplate, PageTemplate, Frame, Flowable, Table, TableStyle
 import arabic_reshaper
 from bidi.algorithm import get_display
 from decimal import Decimal
+from functools import lru_cache
+from .models import Asset
 
 #############################################################################
 # PDF Generation Fonts
@@ -25,341 +26,487 @@ font_path = finders.find('fonts/Amiri-Italic.ttf')
 pdfmetrics.registerFont(TTFont('Amiri-italic', font_path))
 
 #############################################################################
+# Bump whenever a layout below changes, so cached PDFs are rendered again
+PDF_LAYOUT_VERSION = 2
 
-def process_arabic_text(text):
-    reshaped_text = arabic_reshaper.reshape(text)
+#############################################################################
+
+# Arabic Shaping
+#############################################################################
+# Upper bound of dynamic strings (asset names, dates, numbers) kept shaped in memory
+SHAPING_CACHE_SIZE = 4096
+
+# Fixed headers, titles, column labels and signature lines used by every layout
+STATIC_TEXTS = [
+    "دولـة لـيـبـيـا", "وزارة الاقتصاد والتجارة", "مركز المعلومات والتوثيق الاقتصادي",
+    "نموذج رقم م خ / 4", "نموذج رقم م خ / 7", "نموذج رقم م خ / 9",
+    "اذن استلام اصناف بالمخزن", "اذن صرف اصناف من المخزن للاغراض المصلحية",
+    "جهة التوريد: ", "بيان الاصناف المصروفة لحساب: ",
+    "ملاحظات", "السعر الإجمالي", "متوسط السعر", "الوحدة", "الكمية", "اسم الصنف", "ر.ت",
+    "الإجمالي", "دينار", "الفرق", "المدون بالسجل", "التوقيعات", "الكمية بالمخزن",
+    "نقصان", "زياده", "المراجع", "العداد", "",
+    "قطعة", "عبوة", "طقم",
+    "توقيع المستلم", "توقيع كاتب استاذ المخزن", "توقيع امين المخزن",
+    ".................", "......................",
+    "(يعد وفقا للمادة 243 من اللائحة)", "(يعد وفقا للمادة 263 من اللائحة)",
+]
+
+
+# arabic_reshaper up to 3.0.0 means to compile its ligature pattern once, but its cache
+# check looks up an unmangled name that is never set, so the pattern is rebuilt on every
+# call, about twenty times the cost of the shaping itself. On those versions the pattern
+# is compiled once on our own reshaper and the check satisfied; later versions are left
+# to their own caching, as the attribute names may change.
+RESHAPER_UNCACHED_UP_TO = (3, 0, 0)
+
+_reshaper = arabic_reshaper.ArabicReshaper()
+_reshaper_version = tuple(int(part) for part in arabic_reshaper.__version__.split('.')[:3] if part.isdigit())
+if _reshaper_version <= RESHAPER_UNCACHED_UP_TO:
+    _reshaper._ligatures_re
+    setattr(_reshaper, '__ligatures_re', True)
+
+
+def _shape(text):
+    reshaped_text = _reshaper.reshape(text)
     bidi_text = get_display(reshaped_text)
     return bidi_text
 
-def import_record_pdf(trans_id, record_info):
-    pdf_buffer = io.BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
-    width, height = A4
-
-    # Paper header
-    c.setFont("Amiri-italic", 12)
-    c.setFillColor(colors.darkslategray)
-    c.drawString(30, height - 50, process_arabic_text("نموذج رقم م خ / 4"))
-
-    # Date and trans_id
-    c.setFont("Amiri", 14)
-    c.drawRightString(570, height - 50, process_arabic_text(f"اذن استلام رقم: {record_info['trans_id']}"))
-    c.drawRightString(570, height - 80, process_arabic_text(f"التاريخ: {record_info['date']}"))
-
-    # Centered Header
-    c.setFont("Amiri", 16)
-    c.setFillColor(colors.black)
-    c.drawCentredString(width / 2, height - 120, process_arabic_text("دولـة لـيـبـيـا"))
-    c.drawCentredString(width / 2, height - 150, process_arabic_text("وزارة الاقتصاد والتجارة"))
-    c.drawCentredString(width / 2, height - 180, process_arabic_text("مركز المعلومات والتوثيق الاقتصادي"))
-
-    # Title
-    c.setFont("Amiri-bold", 16)
-    c.drawCentredString(width / 2, height - 220, process_arabic_text("اذن استلام اصناف بالمخزن"))
-
-    # Company and assignment info
-    c.setFont("Amiri", 14)
-    c.drawRightString(550, height - 280, process_arabic_text(f"جهة التوريد: "))
-    c.setFont("Amiri-bold", 14)
-    c.drawRightString(488, height - 280, process_arabic_text(record_info['company']))
-    c.setFont("Amiri", 14)    
-    c.drawRightString(550, height - 305, process_arabic_text(f"بيان الاصناف الواردة بموجب امر تكليف رقم: {record_info['assign_id']} بتاريخ: {record_info['assign_date']}"))
-
-    # Initialize total_price accumulator
-    grand_total = Decimal('0.00')
-
-    # Prepare table data
-    table_data = [[
-        process_arabic_text('ملاحظات'),
-        process_arabic_text('السعر الإجمالي'),
-        process_arabic_text('الوحدة'), 
-        process_arabic_text('الكمية'), 
-        process_arabic_text('اسم الصنف')
-    ]]
-    for item in record_info['items']:
-        total_price = item['total_price']
-        grand_total += Decimal(str(total_price))
-
-        table_data.append([
-            '',
-            f"{item['total_price']:.2f}",
-            process_arabic_text(item['unit']),
-            str(item['quantity']),
-            process_arabic_text(item['name'])
-        ])
-    
-    cur = process_arabic_text('دينار')
-    table_data.append([
-        f"{cur} {grand_total:.2f}",
-        '',
-        process_arabic_text('الإجمالي'),
-        '',
-        ''
-    ])
-
-    col_widths = [80, 80, 45, 45, 250]  # Width of each column (in points)
-
-    # Create and style the table
-    table = Table(table_data, colWidths=col_widths)
-    table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Amiri'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.whitesmoke),
-        ('FONTNAME', (0, 0), (-1, 0), 'Amiri-bold'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 10),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('SPAN', (0, len(table_data) - 1), (1, len(table_data) - 1)),
-        ('SPAN', (2, len(table_data) - 1), (4, len(table_data) - 1)),
-        ('ALIGN', (2, -1), (-1, -1), 'LEFT')
-    ]))
 
-    # Draw the table on the canvas
-    table_width, table_height = table.wrapOn(c, width, height)
-    y_position = height - 320 - table_height
-    table.drawOn(c, (width - table_width) / 2, y_position)
+# Static texts are shaped once at module load, everything else goes through a bounded LRU cache
+STATIC_SHAPES = {text: _shape(text) for text in STATIC_TEXTS}
+_shape_cached = lru_cache(maxsize=SHAPING_CACHE_SIZE)(_shape)
 
-    # Signature line
-    c.setFont("Amiri", 12)
-    c.drawCentredString(width / 2 - 150, y_position - 50, process_arabic_text("توقيع كاتب استاذ المخزن"))
-    c.drawCentredString(width / 2 - 150, y_position - 75, process_arabic_text("......................"))
-    c.drawCentredString(width / 2 + 160, y_position - 50, process_arabic_text("توقيع امين المخزن"))
-    c.drawCentredString(width / 2 + 160, y_position - 75, process_arabic_text("................."))
 
-    # Footer
-    c.setFillColor(colors.darkslategray)
-    c.drawRightString(width - 50, 50, process_arabic_text("(يعد وفقا للمادة 243 من اللائحة)"))
+def process_arabic_text(text):
+    shaped = STATIC_SHAPES.get(text)
+    if shaped is None:
+        shaped = _shape_cached(text)
+    return shaped
 
-    # Save PDF to the BytesIO buffer
-    c.save()
-    pdf_data = pdf_buffer.getvalue()  # Get PDF data from the buffer
-    pdf_buffer.close()  # Close the buffer
 
-    return pdf_data  # Return the PDF data
+def shaping_cache_info():
+    """Return the hit/miss counters of the dynamic shaping cache."""
+    return _shape_cached.cache_info()
 
-def export_record_pdf(trans_id, record_info):
-    pdf_buffer = io.BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
+#############################################################################
+# Paginated Layout
+#############################################################################
+# Body rows are laid out in tables of this many rows, about a page each, since
+# ReportLab re-measures the rest of a table every time it splits one across pages
+ROWS_PER_TABLE = 20
+# Flowables built ahead of the one being laid out, the rest are built as pages fill
+STORY_LOOKAHEAD = 2
+
+BASE_TABLE_STYLE = [
+    ('FONTNAME', (0, 0), (-1, -1), 'Amiri'),
+    ('FONTSIZE', (0, 0), (-1, -1), 12),
+    ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 10),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+]
+
+HEADER_TABLE_STYLE = BASE_TABLE_STYLE + [
+    ('BACKGROUND', (0, 0), (-1, -1), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, -1), 'Amiri-bold'),
+]
+
+
+class SignatureBlock(Flowable):
+    """Signature captions and dotted lines, positioned relative to the page centre."""
+
+    def __init__(self, signatures):
+        super().__init__()
+        # signatures is a list of (x offset from centre, y offset from top, text)
+        self.signatures = signatures
+        self.block_height = max(dy for _, dy, _ in signatures) + 10
+
+    def wrap(self, availWidth, availHeight):
+        self.block_width = availWidth
+        return availWidth, self.block_height
+
+    def draw(self):
+        self.canv.setFont("Amiri", 12)
+        self.canv.setFillColor(colors.black)
+        for dx, dy, text in self.signatures:
+            self.canv.drawCentredString(self.block_width / 2 + dx, self.block_height - dy, process_arabic_text(text))
+
+
+class StreamingDocTemplate(BaseDocTemplate):
+    """
+    A document that builds its story from an iterator while laying it out.
+
+    Only STORY_LOOKAHEAD flowables are held ahead of the page being filled, so
+    the rows of a long report are read and turned into tables as they are
+    needed and dropped once drawn, instead of every table being built first.
+    """
+
+    def build_from(self, flowables):
+        self._pending = iter(flowables)
+        self._story = []
+        self._fill_story()
+        self.build(self._story)
+
+    def _fill_story(self):
+        while len(self._story) < STORY_LOOKAHEAD:
+            flowable = next(self._pending, None)
+            if flowable is None:
+                break
+            self._story.append(flowable)
+
+    def handle_flowable(self, flowables):
+        super().handle_flowable(flowables)
+        # Also called for ReportLab's own lists of page actions, those are left alone
+        if flowables is self._story:
+            self._fill_story()
+
+
+def build_paginated_pdf(output, draw_heading, heading_height, header_rows, header_style, rows, col_widths, closing, footer_text, body_style=None):
+    """
+    Lay a table out over as many A4 pages as it needs and write the PDF to output.
+
+    The heading is drawn on the first page only, the column header rows and the
+    footer are drawn on every page, and the body rows flow between them in
+    tables of ROWS_PER_TABLE rows, so very long reports never build one huge table.
+    The tables are built while the pages fill, see StreamingDocTemplate.
+
+    Args:
+        output: A writable binary file object the PDF is written to.
+        draw_heading (callable): Draws the first page heading, called with (canvas, width, height).
+        heading_height (int): Points from the top of the first page where the table starts.
+        header_rows (list): Column header rows, already shaped.
+        header_style (list): Extra TableStyle commands for the header rows.
+        rows (iterable): Body rows, already shaped.
+        col_widths (list): Width of each column in points.
+        closing (list): Flowables placed after the body, such as totals and signatures.
+        footer_text (str): The regulation note printed at the bottom of every page.
+        body_style (list): Extra TableStyle commands for every body table.
+    """
     width, height = A4
-
-    # Paper header
-    c.setFont("Amiri-italic", 12)
-    c.setFillColor(colors.darkslategray)
-    c.drawString(30, height - 50, process_arabic_text("نموذج رقم م خ / 7"))
-
-    # Date and trans_id
-    c.setFont("Amiri", 14)
-    c.drawRightString(570, height - 50, process_arabic_text(f"اذن صرف رقم: {record_info['trans_id']}"))
-    c.drawRightString(570, height - 80, process_arabic_text(f"التاريخ: {record_info['date']}"))
-
-    # Centered Header
-    c.setFont("Amiri", 16)
-    c.setFillColor(colors.black)
-    c.drawCentredString(width / 2, height - 120, process_arabic_text("دولـة لـيـبـيـا"))
-    c.drawCentredString(width / 2, height - 150, process_arabic_text("وزارة الاقتصاد والتجارة"))
-    c.drawCentredString(width / 2, height - 180, process_arabic_text("مركز المعلومات والتوثيق الاقتصادي"))
-
-    # Title
-    c.setFont("Amiri-bold", 16)
-    c.drawCentredString(width / 2, height - 220, process_arabic_text("اذن صرف اصناف من المخزن للاغراض المصلحية"))
-
-    # Company and assignment info
-
-    c.setFont("Amiri", 14)
-    c.drawRightString(550, height - 305, process_arabic_text(f"بيان الاصناف المصروفة لحساب: "))
-    c.setFont("Amiri-bold", 14)    
-    c.drawRightString(392, height - 305, process_arabic_text(record_info['entity']))
-    c.setFont("Amiri", 14)
-    c.drawString(40, height - 305, process_arabic_text(f"الغرض: {record_info['export_type']}"))
-
-    # Initialize total_price accumulator
-    grand_total = Decimal('0.00')
-
-    # Prepare table data
-    table_data = [[
-        process_arabic_text('ملاحظات'),
-        process_arabic_text('متوسط السعر'),
-        process_arabic_text('الوحدة'), 
-        process_arabic_text('الكمية'), 
-        process_arabic_text('اسم الصنف'),
-        process_arabic_text('ر.ت'),
-    ]]
-    row_number = 1
-
-    for item in record_info['items']:
-        price = item['price']
-        grand_total += Decimal(str(price))
-
-        table_data.append([
-            '',
-            f"{item['price']:.2f}",
-            process_arabic_text(item['unit']),
-            str(item['quantity']),
-            process_arabic_text(item['name']),
-            str(row_number),  # Auto-numbering column
-        ])
-    row_number += 1  # Increment the row number
-    cur = process_arabic_text('دينار')
-    table_data.append([
-        f"{cur} {grand_total:.2f}",
-        '',
-        process_arabic_text('الإجمالي'),
-        '',
-        ''
+    margin = (width - sum(col_widths)) / 2
+    bottom = 75
+
+    header = Table(header_rows, colWidths=col_widths)
+    header.setStyle(TableStyle(HEADER_TABLE_STYLE + header_style))
+    _, header_height = header.wrap(width, height)
+
+    def draw_page(c, doc, table_top):
+        header.drawOn(c, margin, table_top - header_height)
+        c.setFont("Amiri", 12)
+        c.setFillColor(colors.darkslategray)
+        c.drawRightString(width - 50, 50, process_arabic_text(footer_text))
+        c.drawString(50, 50, process_arabic_text(f"صفحة {doc.page}"))
+
+    def first_page(c, doc):
+        c.saveState()
+        draw_heading(c, width, height)
+        draw_page(c, doc, height - heading_height)
+        c.restoreState()
+
+    def later_page(c, doc):
+        c.saveState()
+        draw_page(c, doc, height - 50)
+        c.restoreState()
+
+    def frame(table_top):
+        top = table_top - header_height
+        return Frame(margin, bottom, width - 2 * margin, top - bottom, leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0)
+
+    doc = StreamingDocTemplate(output, pagesize=A4)
+    doc.addPageTemplates([
+        PageTemplate(id='first', frames=[frame(height - heading_height)], onPage=first_page, autoNextPageTemplate='later'),
+        PageTemplate(id='later', frames=[frame(height - 50)], onPage=later_page),
     ])
 
-    col_widths = [70, 70, 45, 45, 250, 35]  # Width of each column (in points)
-
-    # Create and style the table
-    table = Table(table_data, colWidths=col_widths)
-    table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Amiri'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.whitesmoke),
-        ('FONTNAME', (0, 0), (-1, 0), 'Amiri-bold'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 10),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('SPAN', (0, len(table_data) - 1), (1, len(table_data) - 1)),
-        ('SPAN', (2, len(table_data) - 1), (4, len(table_data) - 1)),
-        ('ALIGN', (2, -1), (-1, -1), 'LEFT')
+    def story():
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == ROWS_PER_TABLE:
+                yield _body_table(chunk, col_widths, body_style)
+                chunk = []
+        if chunk:
+            yield _body_table(chunk, col_widths, body_style)
+        yield from closing
+
+    doc.build_from(story())
+    return output
+
+
+def _body_table(rows, col_widths, body_style=None):
+    table = Table(rows, colWidths=col_widths)
+    table.setStyle(TableStyle(BASE_TABLE_STYLE + (body_style or [])))
+    return table
+
+
+def _totals_table(row, col_widths, label_span):
+    """A one row totals table, with the amount spanning the first two columns."""
+    table = Table([row], colWidths=col_widths)
+    table.setStyle(TableStyle(BASE_TABLE_STYLE + [
+        ('SPAN', (0, 0), (1, 0)),
+        ('SPAN', (2, 0), (label_span, 0)),
+        ('ALIGN', (2, 0), (-1, 0), 'LEFT'),
     ]))
-
-    # Draw the table on the canvas
-    table_width, table_height = table.wrapOn(c, width, height)
-    y_position = height - 320 - table_height
-    table.drawOn(c, (width - table_width) / 2, y_position)
-
-    # Signature line
-    c.setFont("Amiri", 12)
-    c.drawCentredString(width / 2 - 150, y_position - 50, process_arabic_text("توقيع المستلم"))
-    c.drawCentredString(width / 2 - 150, y_position - 75, process_arabic_text("................."))
-    c.drawCentredString(width / 2 , y_position - 100, process_arabic_text("توقيع كاتب استاذ المخزن"))
-    c.drawCentredString(width / 2 , y_position - 125, process_arabic_text("......................"))
-    c.drawCentredString(width / 2 + 160, y_position - 50, process_arabic_text("توقيع امين المخزن"))
-    c.drawCentredString(width / 2 + 160, y_position - 75, process_arabic_text("................."))
-    # Footer
-    c.setFillColor(colors.darkslategray)
-    c.drawRightString(width - 50, 50, process_arabic_text("(يعد وفقا للمادة 263 من اللائحة)"))
-
-    # Save PDF to the BytesIO buffer
-    c.save()
-    pdf_data = pdf_buffer.getvalue()  # Get PDF data from the buffer
-    pdf_buffer.close()  # Close the buffer
-
-    return pdf_data  # Return the PDF data
+    return table
 
 
-def inventory_pdf(report_data):
+def _render(output, build):
+    """Build into output when given, otherwise return the PDF bytes."""
+    if output is not None:
+        return build(output)
     pdf_buffer = io.BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
-    width, height = A4
+    build(pdf_buffer)
+    pdf_data = pdf_buffer.getvalue()  # Get PDF data from the buffer
+    pdf_buffer.close()  # Close the buffer
+    return pdf_data
 
-    # Paper header
-    c.setFont("Amiri-italic", 12)
-    c.setFillColor(colors.darkslategray)
-    c.drawString(30, height - 50, process_arabic_text("نموذج رقم م خ / 9"))
+#############################################################################
+# Vouchers and Reports
+#############################################################################
+# Receiver, ledger clerk and storekeeper signatures shared by exports and the inventory
+EXPORT_SIGNATURES = [
+    (-150, 50, "توقيع المستلم"),
+    (-150, 75, "................."),
+    (0, 100, "توقيع كاتب استاذ المخزن"),
+    (0, 125, "......................"),
+    (160, 50, "توقيع امين المخزن"),
+    (160, 75, "................."),
+]
+
+UNIT_NAMES = dict(Asset._meta.get_field('unit').choices)
+
+
+def import_record_pdf(trans_id, record_info, output=None):
+
+    def draw_heading(c, width, height):
+        # Paper header
+        c.setFont("Amiri-italic", 12)
+        c.setFillColor(colors.darkslategray)
+        c.drawString(30, height - 50, process_arabic_text("نموذج رقم م خ / 4"))
+
+        # Date and trans_id
+        c.setFont("Amiri", 14)
+        c.drawRightString(570, height - 50, process_arabic_text(f"اذن استلام رقم: {record_info['trans_id']}"))
+        c.drawRightString(570, height - 80, process_arabic_text(f"التاريخ: {record_info['date']}"))
+
+        # Centered Header
+        c.setFont("Amiri", 16)
+        c.setFillColor(colors.black)
+        c.drawCentredString(width / 2, height - 120, process_arabic_text("دولـة لـيـبـيـا"))
+        c.drawCentredString(width / 2, height - 150, process_arabic_text("وزارة الاقتصاد والتجارة"))
+        c.drawCentredString(width / 2, height - 180, process_arabic_text("مركز المعلومات والتوثيق الاقتصادي"))
+
+        # Title
+        c.setFont("Amiri-bold", 16)
+        c.drawCentredString(width / 2, height - 220, process_arabic_text("اذن استلام اصناف بالمخزن"))
+
+        # Company and assignment info
+        c.setFont("Amiri", 14)
+        c.drawRightString(550, height - 280, process_arabic_text("جهة التوريد: "))
+        c.setFont("Amiri-bold", 14)
+        c.drawRightString(488, height - 280, process_arabic_text(record_info['company']))
+        c.setFont("Amiri", 14)
+        c.drawRightString(550, height - 305, process_arabic_text(f"بيان الاصناف الواردة بموجب امر تكليف رقم: {record_info['assign_id']} بتاريخ: {record_info['assign_date']}"))
+
+    header_rows = [[
+        process_arabic_text('ملاحظات'),
+        process_arabic_text('السعر الإجمالي'),
+        process_arabic_text('الوحدة'),
+        process_arabic_text('الكمية'),
+        process_arabic_text('اسم الصنف')
+    ]]
 
-    # Centered Header
-    c.setFont("Amiri", 16)
-    c.setFillColor(colors.black)
-    c.drawCentredString(width / 2, height - 120, process_arabic_text("دولـة لـيـبـيـا"))
-    c.drawCentredString(width / 2, height - 150, process_arabic_text("وزارة الاقتصاد والتجارة"))
-    c.drawCentredString(width / 2, height - 180, process_arabic_text("مركز المعلومات والتوثيق الاقتصادي"))
+    grand_total = sum((Decimal(str(item['total_price'])) for item in record_info['items']), Decimal('0.00'))
 
-    # Title
-    c.setFont("Amiri-bold", 16)
-    c.drawCentredString(width / 2, height - 220, process_arabic_text(f"نموذج الجرد العام لسنة: {report_data['year']}"))
+    def rows():
+        for item in record_info['items']:
+            yield [
+                '',
+                f"{item['total_price']:.2f}",
+                process_arabic_text(item['unit']),
+                str(item['quantity']),
+                process_arabic_text(item['name'])
+            ]
 
+    col_widths = [80, 80, 45, 45, 250]  # Width of each column (in points)
 
-    # Prepare table data
-    table_data = [
-        [
+    def build(output):
+        cur = process_arabic_text('دينار')
+        closing = [
+            _totals_table([f"{cur} {grand_total:.2f}", '', process_arabic_text('الإجمالي'), '', ''], col_widths, 4),
+            SignatureBlock([
+                (-150, 50, "توقيع كاتب استاذ المخزن"),
+                (-150, 75, "......................"),
+                (160, 50, "توقيع امين المخزن"),
+                (160, 75, "................."),
+            ]),
+        ]
+        return build_paginated_pdf(
+            output, draw_heading, 320, header_rows, [], rows(), col_widths, closing,
+            "(يعد وفقا للمادة 243 من اللائحة)",
+        )
+
+    return _render(output, build)
+
+
+def export_record_pdf(trans_id, record_info, output=None):
+
+    def draw_heading(c, width, height):
+        # Paper header
+        c.setFont("Amiri-italic", 12)
+        c.setFillColor(colors.darkslategray)
+        c.drawString(30, height - 50, process_arabic_text("نموذج رقم م خ / 7"))
+
+        # Date and trans_id
+        c.setFont("Amiri", 14)
+        c.drawRightString(570, height - 50, process_arabic_text(f"اذن صرف رقم: {record_info['trans_id']}"))
+        c.drawRightString(570, height - 80, process_arabic_text(f"التاريخ: {record_info['date']}"))
+
+        # Centered Header
+        c.setFont("Amiri", 16)
+        c.setFillColor(colors.black)
+        c.drawCentredString(width / 2, height - 120, process_arabic_text("دولـة لـيـبـيـا"))
+        c.drawCentredString(width / 2, height - 150, process_arabic_text("وزارة الاقتصاد والتجارة"))
+        c.drawCentredString(width / 2, height - 180, process_arabic_text("مركز المعلومات والتوثيق الاقتصادي"))
+
+        # Title
+        c.setFont("Amiri-bold", 16)
+        c.drawCentredString(width / 2, height - 220, process_arabic_text("اذن صرف اصناف من المخزن للاغراض المصلحية"))
+
+        # Entity and export type info
+        c.setFont("Amiri", 14)
+        c.drawRightString(550, height - 305, process_arabic_text("بيان الاصناف المصروفة لحساب: "))
+        c.setFont("Amiri-bold", 14)
+        c.drawRightString(392, height - 305, process_arabic_text(record_info['entity']))
+        c.setFont("Amiri", 14)
+        c.drawString(40, height - 305, process_arabic_text(f"الغرض: {record_info['export_type']}"))
+
+    header_rows = [[
         process_arabic_text('ملاحظات'),
-        process_arabic_text(''),
-        process_arabic_text('الفرق'),
-        process_arabic_text('المدون بالسجل'),
-        process_arabic_text(''),
-        process_arabic_text('التوقيعات'),
-        process_arabic_text('الوحدة'), 
-        process_arabic_text('الكمية بالمخزن'), 
+        process_arabic_text('متوسط السعر'),
+        process_arabic_text('الوحدة'),
+        process_arabic_text('الكمية'),
         process_arabic_text('اسم الصنف'),
         process_arabic_text('ر.ت'),
-    ],
-    [
-        process_arabic_text(''),
-        process_arabic_text('نقصان'),
-        process_arabic_text('زياده'),
-        process_arabic_text(''),
-        process_arabic_text('المراجع'),
-        process_arabic_text('العداد'),
-        process_arabic_text(''), 
-        process_arabic_text(''), 
-        process_arabic_text(''),
-        process_arabic_text(''),
-    ],
-    
-    ]
+    ]]
 
-    row_number = 1
+    grand_total = sum((Decimal(str(item['price'])) for item in record_info['items']), Decimal('0.00'))
 
-    for item in report_data['items']:
-        table_data.append([
-            '',
-            f"{item['stock']:.2f}",
-            process_arabic_text(item['unit']),
-            str(item['net_quantity']),
-            process_arabic_text(item['name']),
-            str(row_number),  # Auto-numbering column
-        ])
-    row_number += 1  # Increment the row number
+    def rows():
+        for row_number, item in enumerate(record_info['items'], start=1):
+            yield [
+                '',
+                f"{item['price']:.2f}",
+                process_arabic_text(item['unit']),
+                str(item['quantity']),
+                process_arabic_text(item['name']),
+                str(row_number),  # Auto-numbering column
+            ]
 
     col_widths = [70, 70, 45, 45, 250, 35]  # Width of each column (in points)
 
-    # Create and style the table
-    table = Table(table_data, colWidths=col_widths)
-    table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), 'Amiri'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.whitesmoke),
-        ('FONTNAME', (0, 0), (-1, 0), 'Amiri-bold'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 10),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('SPAN', (0, len(table_data) - 1), (1, len(table_data) - 1)),
-        ('SPAN', (2, len(table_data) - 1), (4, len(table_data) - 1)),
-        ('ALIGN', (2, -1), (-1, -1), 'LEFT')
-    ]))
-
-    # Draw the table on the canvas
-    table_width, table_height = table.wrapOn(c, width, height)
-    y_position = height - 320 - table_height
-    table.drawOn(c, (width - table_width) / 2, y_position)
-
-    # Signature line
-    c.setFont("Amiri", 12)
-    c.drawCentredString(width / 2 - 150, y_position - 50, process_arabic_text("توقيع المستلم"))
-    c.drawCentredString(width / 2 - 150, y_position - 75, process_arabic_text("................."))
-    c.drawCentredString(width / 2 , y_position - 100, process_arabic_text("توقيع كاتب استاذ المخزن"))
-    c.drawCentredString(width / 2 , y_position - 125, process_arabic_text("......................"))
-    c.drawCentredString(width / 2 + 160, y_position - 50, process_arabic_text("توقيع امين المخزن"))
-    c.drawCentredString(width / 2 + 160, y_position - 75, process_arabic_text("................."))
-    # Footer
-    c.setFillColor(colors.darkslategray)
-    c.drawRightString(width - 50, 50, process_arabic_text("(يعد وفقا للمادة 263 من اللائحة)"))
-
-    # Save PDF to the BytesIO buffer
-    c.save()
-    pdf_data = pdf_buffer.getvalue()  # Get PDF data from the buffer
-    pdf_buffer.close()  # Close the buffer
+    def build(output):
+        cur = process_arabic_text('دينار')
+        closing = [
+            _totals_table([f"{cur} {grand_total:.2f}", '', process_arabic_text('الإجمالي'), '', '', ''], col_widths, 5),
+            SignatureBlock(EXPORT_SIGNATURES),
+        ]
+        return build_paginated_pdf(
+            output, draw_heading, 320, header_rows, [], rows(), col_widths, closing,
+            "(يعد وفقا للمادة 263 من اللائحة)",
+        )
+
+    return _render(output, build)
+
+
+def inventory_pdf(report_data, output=None):
+
+    def draw_heading(c, width, height):
+        # Paper header
+        c.setFont("Amiri-italic", 12)
+        c.setFillColor(colors.darkslategray)
+        c.drawString(30, height - 50, process_arabic_text("نموذج رقم م خ / 9"))
+
+        # Centered Header
+        c.setFont("Amiri", 16)
+        c.setFillColor(colors.black)
+        c.drawCentredString(width / 2, height - 120, process_arabic_text("دولـة لـيـبـيـا"))
+        c.drawCentredString(width / 2, height - 150, process_arabic_text("وزارة الاقتصاد والتجارة"))
+        c.drawCentredString(width / 2, height - 180, process_arabic_text("مركز المعلومات والتوثيق الاقتصادي"))
+
+        # Title
+        c.setFont("Amiri-bold", 16)
+        c.drawCentredString(width / 2, height - 220, process_arabic_text(f"نموذج الجرد العام لسنة: {report_data['year']}"))
+
+    # Two header rows, the difference and signature groups each span two sub-columns
+    header_rows = [
+        [
+            process_arabic_text('ملاحظات'),
+            process_arabic_text('الفرق'),
+            '',
+            process_arabic_text('المدون بالسجل'),
+            process_arabic_text('التوقيعات'),
+            '',
+            process_arabic_text('الوحدة'),
+            process_arabic_text('الكمية بالمخزن'),
+            process_arabic_text('اسم الصنف'),
+            process_arabic_text('ر.ت'),
+        ],
+        [
+            '',
+            process_arabic_text('نقصان'),
+            process_arabic_text('زياده'),
+            '',
+            process_arabic_text('المراجع'),
+            process_arabic_text('العداد'),
+            '', '', '', '',
+        ],
+    ]
+    header_style = [
+        ('SPAN', (1, 0), (2, 0)),
+        ('SPAN', (4, 0), (5, 0)),
+        ('SPAN', (0, 0), (0, 1)),
+        ('SPAN', (3, 0), (3, 1)),
+        ('SPAN', (6, 0), (6, 1)),
+        ('SPAN', (7, 0), (7, 1)),
+        ('SPAN', (8, 0), (8, 1)),
+        ('SPAN', (9, 0), (9, 1)),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]
+    small_font = [
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('LEFTPADDING', (0, 0), (-1, -1), 4),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 4),
+    ]
 
-    return pdf_data  # Return the PDF data
\ No newline at end of file
+    def rows():
+        for row_number, item in enumerate(report_data['items'], start=1):
+            # Positive differences are surpluses in stock, negative ones are shortages
+            difference = item['stock'] - item['net_quantity']
+            yield [
+                '',
+                str(-difference) if difference < 0 else '',
+                str(difference) if difference > 0 else '',
+                str(item['net_quantity']),
+                '',
+                '',
+                process_arabic_text(UNIT_NAMES.get(item['unit'], item['unit'])),
+                str(item['stock']),
+                process_arabic_text(item['name']),
+                str(row_number),  # Auto-numbering column
+            ]
+
+    col_widths = [55, 40, 40, 55, 45, 45, 40, 55, 135, 30]  # Width of each column (in points)
+
+    def build(output):
+        return build_paginated_pdf(
+            output, draw_heading, 250, header_rows, header_style + small_font, rows(), col_widths,
+            [SignatureBlock(EXPORT_SIGNATURES)],
+            "(يعد وفقا للمادة 263 من اللائحة)",
+            body_style=small_font,
+        )
+
+    return _render(output, build)
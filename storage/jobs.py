@@ -0,0 +1,153 @@
+#############################################################################
+# Background PDF Jobs Libraries
+#############################################################################
+import logging
+import os
+import tempfile
+from datetime import date
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from .models import PdfJob
+from .genpdf import inventory_pdf
+from .reports import report_inventory
+from .batch import batch_record_infos, write_batch_pdf, write_batch_zip
+
+#############################################################################
+logger = logging.getLogger('storage')
+#############################################################################
+# A job whose worker died is retried until it has been started this many times
+MAX_ATTEMPTS = 3
+
+#############################################################################
+# Job Renderers
+#############################################################################
+
+def render_inventory(params, output):
+    """Rebuild the inventory as of the end of the report year and write its PDF."""
+    report_data = dict(params, items=report_inventory(date(int(params['year']), 12, 31)))
+    inventory_pdf(report_data, output=output)
+    return f"inventory_report_{params['year']}.pdf"
+
+
+def render_voucher_batch(params, output):
+    """Render every voucher matching the listing filters as one PDF or a ZIP of PDFs."""
+    model = params['model']
+    record_infos = batch_record_infos(model, params['filters'])
+    if params['format'] == 'zip':
+        write_batch_zip(model, record_infos, output)
+    else:
+        write_batch_pdf(model, record_infos, output)
+    return f"{model}_records_{date.today():%Y-%m-%d}.{params['format']}"
+
+
+# Job kinds and their renderers. A renderer is called with the job params and a
+# writable binary file, writes the PDF into it and returns the download filename.
+JOB_RENDERERS = {
+    'inventory': render_inventory,
+    'vouchers': render_voucher_batch,
+}
+
+#############################################################################
+# Queue
+#############################################################################
+
+def enqueue_pdf_job(kind, params, user=None):
+    """Queue a PDF of the given kind for the worker and return the job."""
+    if kind not in JOB_RENDERERS:
+        raise ValueError(f"Unknown PDF job kind: {kind}")
+    if user is not None and not user.is_authenticated:
+        user = None
+    return PdfJob.objects.create(kind=kind, params=params, created_by=user)
+
+
+def claim_next_job():
+    """
+    Take the oldest pending job and mark it running, or return None if the queue is empty.
+
+    Pending rows are locked with SKIP LOCKED, so several workers can poll the
+    same table without ever picking up the same job.
+    """
+    with transaction.atomic():
+        job = (
+            PdfJob.objects.select_for_update(skip_locked=True)
+            .filter(status='Pending')
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'Running'
+        job.started_at = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=['status', 'started_at', 'attempts'])
+    return job
+
+
+def run_job(job):
+    """Render a claimed job into its file and record the outcome."""
+    render = JOB_RENDERERS.get(job.kind)
+    try:
+        if render is None:
+            raise ValueError(f"Unknown PDF job kind: {job.kind}")
+        # Small PDFs stay in memory, large ones are spooled to disk before being stored
+        with tempfile.SpooledTemporaryFile(max_size=settings.PDF_SPOOL_MAX_SIZE) as output:
+            filename = render(job.params, output)
+            output.seek(0)
+            # Stored under the renderer's extension, a batch may be a ZIP rather than a PDF
+            job.file.save(f"{job.id}{os.path.splitext(filename)[1]}", File(output), save=False)
+        job.filename = filename
+        job.status = 'Done'
+    except Exception as e:
+        logger.exception(f"PDF job {job.id} ({job.kind}) failed")
+        job.status = 'Failed'
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'filename', 'status', 'error', 'finished_at'])
+    return job
+
+
+def requeue_stale_jobs(timeout):
+    """
+    Put jobs left running by a dead worker back in the queue.
+
+    Jobs that have already been started MAX_ATTEMPTS times are failed instead,
+    so a PDF that crashes its worker cannot be retried forever.
+    """
+    now = timezone.now()
+    stale = PdfJob.objects.filter(status='Running', started_at__lt=now - timeout)
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status='Failed', error="Worker stopped while rendering.", finished_at=now,
+    )
+    requeued = stale.update(status='Pending', started_at=None)
+    return requeued, failed
+
+
+def purge_finished_jobs(max_age):
+    """Delete finished jobs older than max_age together with their files."""
+    purged = 0
+    old_jobs = PdfJob.objects.filter(status__in=['Done', 'Failed'], finished_at__lt=timezone.now() - max_age)
+    for job in old_jobs.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        purged += 1
+    return purged
+
+
+def job_payload(job):
+    """The JSON shape the poll endpoint returns for a job."""
+    payload = {
+        'id': str(job.id),
+        'kind': job.kind,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'status_url': reverse('pdf_job_status', args=[job.id]),
+    }
+    if job.status == 'Done':
+        payload['download_url'] = reverse('pdf_job_download', args=[job.id])
+    elif job.status == 'Failed':
+        payload['error'] = job.error
+    return payload
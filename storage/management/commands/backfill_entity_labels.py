@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from storage.models import ExportRecord
+from storage.signals import sync_entity_label
+
+
+class Command(BaseCommand):
+    help = "Backfills the stored entity name and kind of export records from their entities."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Resync every entity instead of only records without a label.")
+
+    def handle(self, *args, **options):
+        records = ExportRecord.objects.all()
+        if not options['all']:
+            records = records.filter(entity_name='')
+
+        # One update per entity, however many records were issued to it
+        updated = 0
+        pairs = records.values_list('entity_type', 'entity_id').distinct()
+        for entity_type, entity_id in pairs.order_by():
+            entity = ExportRecord(entity_type_id=entity_type, entity_id=entity_id).entity_selection
+            if entity is None:
+                self.stdout.write(self.style.WARNING(f"Entity {entity_id} of type {entity_type} no longer exists."))
+                continue
+            updated += sync_entity_label(entity)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled entity labels on {updated} export records."))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import CharField, F, Func, Q
+from storage.models import Asset
+
+
+class Command(BaseCommand):
+    help = "Backfills the running price statistics of assets from their price history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rebuild every asset instead of only the missing ones.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Assets written per bulk update.")
+
+    def handle(self, *args, **options):
+        assets = Asset.objects.only('id', 'price_history')
+        if not options['all']:
+            # Only assets that have prices but no statistics yet, or a histogram still kept as an object
+            histogram = Func(F('price_counts'), function='jsonb_typeof', output_field=CharField())
+            assets = assets.annotate(histogram=histogram).filter(
+                (Q(price_count=0) & ~Q(price_history=[])) | Q(histogram='object')
+            )
+
+        fields = ['price_count', 'price_sum', 'price_counts', 'price_median']
+        batch = []
+        updated = 0
+        for asset in assets.iterator(chunk_size=options['batch_size']):
+            asset.refresh_price_stats()
+            batch.append(asset)
+            if len(batch) >= options['batch_size']:
+                updated += self.flush(batch, fields)
+        updated += self.flush(batch, fields)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled price statistics for {updated} assets."))
+
+    def flush(self, batch, fields):
+        """Write the pending assets in one bulk update and empty the batch."""
+        if not batch:
+            return 0
+        with transaction.atomic():
+            Asset.objects.bulk_update(batch, fields)
+        count = len(batch)
+        batch.clear()
+        return count
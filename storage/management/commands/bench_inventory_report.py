@@ -0,0 +1,52 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from storage.benchmark import rolled_back, synthetic_assets, timed
+from storage.models import ImportRecord, ImportItem, ExportRecord, ExportItem
+from storage.reports import report_inventory
+from core.models import Department
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the inventory report engine on synthetic data and shows its query count per asset count."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 1000], help="Asset counts to benchmark.")
+        parser.add_argument('--moves', type=int, default=4, help="Import and export lines per asset.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'assets':>8} {'movements':>10} {'queries':>8} {'seconds':>8}")
+
+        for size in options['sizes']:
+            with rolled_back():
+                self.populate(size, options['moves'])
+                with CaptureQueriesContext(connection) as queries:
+                    report_data, elapsed = timed(report_inventory, date(date.today().year, 12, 31))
+                movements = sum(len(item['differences']) for item in report_data)
+
+            self.stdout.write(f"{size:>8} {movements:>10} {len(queries):>8} {elapsed:>8.3f}")
+
+        self.stdout.write(self.style.SUCCESS("Benchmark complete."))
+
+    def populate(self, size, moves):
+        """Create `size` assets with `moves` import and export lines each."""
+        today = date.today()
+        assets = synthetic_assets('bench', size, price_history=['10.00'], stock=moves)
+
+        import_record = ImportRecord.objects.create(date=today, assign_date=today)
+        export_record = ExportRecord.objects.create(
+            date=today,
+            export_type='Consume',
+            entity_type=ContentType.objects.get_for_model(Department),
+            entity_id=0,
+        )
+        ImportItem.objects.bulk_create(
+            ImportItem(record=import_record, asset=asset, quantity=2, price='10.00')
+            for asset in assets for _ in range(moves)
+        )
+        ExportItem.objects.bulk_create(
+            ExportItem(record=export_record, asset=asset, quantity=1)
+            for asset in assets for _ in range(moves)
+        )
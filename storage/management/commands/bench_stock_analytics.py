@@ -0,0 +1,101 @@
+import random
+from collections import defaultdict
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.contenttypes.models import ContentType
+from storage.analytics import movement_frame, stock_balances, consumption, consumption_by_period, stock_analytics
+from storage.benchmark import analyze, rolled_back, synthetic_assets, timed
+from storage.models import Asset, ImportRecord, ImportItem, ExportRecord, ExportItem
+from storage.reports import EXPORT, inventory_movements, report_inventory
+from core.models import Department
+
+# Movements per asset and categories of the synthetic stock
+MOVES_PER_ASSET = 50
+CATEGORIES = 10
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the vectorized stock analytics against the Python loops on synthetic movements."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10000, 100000], help="Movement counts to benchmark.")
+        parser.add_argument('--seed', type=int, default=1, help="Seed of the synthetic movements.")
+
+    def handle(self, *args, **options):
+        year = date.today().year
+        end_date = date(year, 12, 31)
+        self.stdout.write(f"{'movements':>10} {'step':<22} {'loop':>8} {'frames':>8} {'speedup':>8}")
+
+        for size in options['sizes']:
+            with rolled_back():
+                self.populate(size, year, random.Random(options['seed']))
+
+                loop_report, loop_seconds = timed(report_inventory, end_date)
+                (_, balances), frame_seconds = timed(lambda: stock_balances(movement_frame(end_date)))
+                self.compare('balances', {row['id']: row['net_quantity'] for row in loop_report if row['differences']}, balances.to_dict())
+                self.row(size, 'report balances', loop_seconds, frame_seconds)
+
+                loop_totals, loop_seconds = timed(self.loop_consumption, end_date)
+                frame_totals, frame_seconds = timed(self.frame_consumption, end_date)
+                self.compare('consumption', loop_totals, frame_totals)
+                self.row(size, 'consumption', loop_seconds, frame_seconds)
+
+                _, seconds = timed(movement_frame, end_date)
+                self.stdout.write(f"{size:>10} {'movement frame load':<22} {'':>8} {seconds:>8.3f}")
+                _, seconds = timed(stock_analytics, year)
+                self.stdout.write(f"{size:>10} {'full analytics page':<22} {'':>8} {seconds:>8.3f}")
+
+        self.stdout.write(self.style.SUCCESS("Benchmark complete."))
+
+    def row(self, size, step, loop_seconds, frame_seconds):
+        self.stdout.write(f"{size:>10} {step:<22} {loop_seconds:>8.3f} {frame_seconds:>8.3f} {loop_seconds / frame_seconds:>7.1f}x")
+
+    def compare(self, step, expected, found):
+        if expected != found:
+            raise CommandError(f"The vectorized {step} differ from the loop results.")
+
+    def loop_consumption(self, end_date):
+        """Exported quantities per asset and per category and month, walked one movement at a time."""
+        categories = dict(Asset.objects.values_list('id', 'category_id'))
+        by_asset = defaultdict(int)
+        by_month = defaultdict(int)
+        for asset_id, record_date, kind, quantity in inventory_movements(end_date):
+            if kind == EXPORT:
+                by_asset[asset_id] += quantity
+                by_month[(categories[asset_id], record_date.month)] += quantity
+        return {'assets': dict(by_asset), 'months': dict(by_month)}
+
+    def frame_consumption(self, end_date):
+        """The same totals from one movement frame."""
+        frame = movement_frame(end_date)
+        monthly = consumption_by_period(frame, 'month').stack()
+        return {
+            'assets': consumption(frame).to_dict(),
+            'months': {(category_id, period.month): quantity for (category_id, period), quantity in monthly.items() if quantity},
+        }
+
+    def populate(self, size, year, rng):
+        """Create `size` import and export lines spread over the year, an import first for every asset."""
+        assets = synthetic_assets('bench', max(size // MOVES_PER_ASSET, 1), categories=CATEGORIES, stock=0)
+
+        days = [date(year, 1, 1) + timedelta(days=day) for day in range(365)]
+        import_records = {day: record for day, record in zip(days, ImportRecord.objects.bulk_create(
+            ImportRecord(date=day, assign_date=day) for day in days
+        ))}
+        export_records = {day: record for day, record in zip(days, ExportRecord.objects.bulk_create(
+            ExportRecord(date=day, export_type='Consume', entity_type=ContentType.objects.get_for_model(Department), entity_id=0)
+            for day in days
+        ))}
+
+        imports, exports = [], []
+        for index in range(size):
+            asset = assets[index % len(assets)]
+            day = days[0] if index < len(assets) else rng.choice(days)
+            if index < len(assets) or rng.random() < 0.4:
+                price = f"{rng.uniform(5, 50):.2f}"
+                imports.append(ImportItem(record=import_records[day], asset=asset, quantity=rng.randint(5, 50), price=price))
+            else:
+                exports.append(ExportItem(record=export_records[day], asset=asset, quantity=rng.randint(1, 10)))
+        ImportItem.objects.bulk_create(imports, batch_size=5000)
+        ExportItem.objects.bulk_create(exports, batch_size=5000)
+        analyze(Asset, ImportRecord, ImportItem, ExportRecord, ExportItem)
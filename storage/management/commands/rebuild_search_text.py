@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from storage.models import Asset, ExportRecord
+from storage.search import normalize_search
+from core.models import Company, Department, Employee
+from users.models import UserActivityLog
+
+
+class Command(BaseCommand):
+    help = "Fills the normalized search columns of assets, companies, departments, employees, export records and the activity log."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rebuild every row, after changing the normalization rules.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows written per bulk update.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        assets = Asset.objects.only('id', 'name', 'brand', 'brand_en')
+        if not options['all']:
+            assets = assets.filter(search_text='')
+
+        updated = self.rebuild(Asset, assets, lambda asset: normalize_search(asset.name, asset.brand, asset.brand_en), batch_size)
+        self.stdout.write(f"Assets: {updated}")
+        # Companies, departments and employees are all searched by name
+        for model, label in ((Company, "Companies"), (Department, "Departments"), (Employee, "Employees")):
+            rows = model.objects.only('id', 'name')
+            if not options['all']:
+                rows = rows.filter(search_text='')
+            updated = self.rebuild(model, rows, lambda row: normalize_search(row.name), batch_size)
+            self.stdout.write(f"{label}: {updated}")
+
+        # Export records share few distinct entity names, so update them per name
+        records = ExportRecord.objects.exclude(entity_name='')
+        if not options['all']:
+            records = records.filter(entity_search='')
+        updated = 0
+        for entity_name in records.values_list('entity_name', flat=True).distinct().order_by():
+            updated += records.filter(entity_name=entity_name).update(entity_search=normalize_search(entity_name))
+        self.stdout.write(f"Export records: {updated}")
+
+        entries = UserActivityLog.objects.only('id', 'number', 'user_agent').exclude(number__isnull=True, user_agent__isnull=True)
+        if not options['all']:
+            entries = entries.filter(search_text='')
+        updated = self.rebuild(UserActivityLog, entries, lambda entry: normalize_search(entry.number, entry.user_agent), batch_size)
+        self.stdout.write(f"Activity log: {updated}")
+
+        self.stdout.write(self.style.SUCCESS("Search columns are up to date."))
+
+    def rebuild(self, model, rows, normalize, batch_size):
+        """Normalize every row and write them back in bulk updates."""
+        batch = []
+        updated = 0
+        for row in rows.iterator(chunk_size=batch_size):
+            row.search_text = normalize(row)
+            batch.append(row)
+            if len(batch) >= batch_size:
+                updated += self.flush(model, batch)
+        updated += self.flush(model, batch)
+        return updated
+
+    def flush(self, model, batch):
+        if not batch:
+            return 0
+        with transaction.atomic():
+            model.objects.bulk_update(batch, ['search_text'])
+        count = len(batch)
+        batch.clear()
+        return count
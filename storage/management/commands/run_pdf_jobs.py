@@ -0,0 +1,57 @@
+import signal
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from storage.jobs import claim_next_job, run_job, requeue_stale_jobs, purge_finished_jobs
+
+
+class Command(BaseCommand):
+    help = "Runs queued background PDF jobs. Keep one or more running next to the web server."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Run the jobs already queued and exit.")
+        parser.add_argument('--sleep', type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument('--stale-after', type=int, default=30, help="Minutes after which a running job is considered abandoned.")
+        parser.add_argument('--keep-days', type=int, default=7, help="Days finished jobs and their files are kept.")
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        # Finish the current job before stopping on docker stop or Ctrl+C
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        stale_after = timedelta(minutes=options['stale_after'])
+        keep = timedelta(days=options['keep_days'])
+        next_housekeeping = 0
+
+        self.stdout.write("PDF worker started.")
+        while not self.stopping:
+            close_old_connections()
+
+            if time.monotonic() >= next_housekeeping:
+                requeued, failed = requeue_stale_jobs(stale_after)
+                purged = purge_finished_jobs(keep)
+                if requeued or failed or purged:
+                    self.stdout.write(f"Requeued {requeued}, failed {failed} stale jobs, purged {purged} old jobs.")
+                next_housekeeping = time.monotonic() + 60
+
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            started = time.perf_counter()
+            job = run_job(job)
+            elapsed = time.perf_counter() - started
+            if job.status == 'Done':
+                self.stdout.write(self.style.SUCCESS(f"{job.kind} job {job.id} done in {elapsed:.2f}s."))
+            else:
+                self.stdout.write(self.style.ERROR(f"{job.kind} job {job.id} failed: {job.error}"))
+
+        self.stdout.write("PDF worker stopped.")
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,93 @@
+import random
+import threading
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, close_old_connections
+from django.db.models import Sum
+from storage.benchmark import synthetic_assets, timed
+from storage.models import Asset, AssetCategory, StockMovement
+from storage.services import apply_stock_changes, InsufficientStock
+
+
+class Command(BaseCommand):
+    help = "Stress tests the stock ledger with concurrent postings against the configured database and verifies the totals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help="Concurrent storekeepers posting at once.")
+        parser.add_argument('--postings', type=int, default=200, help="Postings made by each thread.")
+        parser.add_argument('--assets', type=int, default=5, help="Assets shared by all threads.")
+        parser.add_argument('--stock', type=int, default=20, help="Starting stock of each asset.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("The stock ledger stress test needs PostgreSQL row locking.")
+
+        # Few assets and low stock so threads contend for the same rows and hit overdraws
+        # The postings commit from their own threads, so the rows are deleted afterwards rather than rolled back
+        assets = synthetic_assets('stress', options['assets'], stock=options['stock'])
+        asset_ids = [asset.id for asset in assets]
+
+        counters = {'applied': 0, 'rejected': 0, 'errors': []}
+        lock = threading.Lock()
+
+        def storekeeper(seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(options['postings']):
+                    # Each posting touches a random subset of assets, mostly exports
+                    lines = rng.sample(asset_ids, rng.randint(1, len(asset_ids)))
+                    quantities = {asset_id: rng.choice([-3, -2, -1, -1, 1, 2]) for asset_id in lines}
+                    try:
+                        apply_stock_changes(quantities, 'Adjust')
+                        outcome = 'applied'
+                    except InsufficientStock:
+                        outcome = 'rejected'
+                    with lock:
+                        counters[outcome] += 1
+            except Exception as error:
+                with lock:
+                    counters['errors'].append(repr(error))
+            finally:
+                close_old_connections()
+                connection.close()
+
+        def run_threads():
+            threads = [threading.Thread(target=storekeeper, args=(seed,)) for seed in range(options['threads'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        _, elapsed = timed(run_threads)
+
+        try:
+            self.verify(asset_ids, options['stock'], counters['errors'])
+        finally:
+            # Remove the synthetic ledger rows and assets again
+            StockMovement.objects.filter(asset_id__in=asset_ids).delete()
+            Asset.objects.filter(id__in=asset_ids).delete()
+            AssetCategory.objects.filter(id=assets[0].category_id).delete()
+
+        total = counters['applied'] + counters['rejected']
+        self.stdout.write(
+            f"{total} postings in {elapsed:.2f}s ({total / elapsed:.0f}/s): "
+            f"{counters['applied']} applied, {counters['rejected']} rejected as overdraws."
+        )
+        self.stdout.write(self.style.SUCCESS("Stock ledger is consistent."))
+
+    def verify(self, asset_ids, starting_stock, errors):
+        """Check every asset's stock against its ledger and raise on any drift."""
+        if errors:
+            raise CommandError(f"Postings failed unexpectedly: {errors[:3]}")
+
+        totals = dict(
+            StockMovement.objects.filter(asset_id__in=asset_ids)
+            .values_list('asset_id')
+            .annotate(total=Sum('quantity'))
+        )
+        for asset in Asset.objects.filter(id__in=asset_ids):
+            expected = starting_stock + totals.get(asset.id, 0)
+            last = asset.movements.order_by('-id').first()
+            if asset.stock != expected:
+                raise CommandError(f"{asset.name}: stock {asset.stock} does not match the ledger total {expected}.")
+            if last and last.balance != asset.stock:
+                raise CommandError(f"{asset.name}: last ledger balance {last.balance} does not match stock {asset.stock}.")
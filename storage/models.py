@@ -1,9 +1,12 @@
 from django.db import models
 import uuid
+from bisect import bisect_left
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 from decimal import Decimal, ROUND_HALF_UP
 from django.apps import apps
+from django.conf import settings
+from .search import normalize_search, trigram_index
 
 
 # PDF and IMG Files Naming Functions:
@@ -67,24 +70,93 @@ class Asset(models.Model):
     price_history = models.JSONField(default=list, verbose_name="تاريخ الأسعار")  # To store price history
     stock = models.PositiveIntegerField(default=0, verbose_name="الكمية بالمخزن")  # Current quantity in stock
 
+    # Running price statistics, kept current by add_price so reads never walk price_history
+    price_count = models.PositiveIntegerField(default=0, verbose_name="عدد الأسعار")
+    price_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="مجموع الأسعار")
+    price_counts = models.JSONField(default=list, verbose_name="توزيع الأسعار")  # [[price, occurrences], ...] by ascending price
+    price_median = models.DecimalField(max_digits=11, decimal_places=3, blank=True, null=True, verbose_name="وسيط الأسعار")
+
+    # Normalized name and brands, searched through a trigram index
+    search_text = models.TextField(blank=True, editable=False)
+
+    # Fields written back when prices are appended in bulk
+    PRICE_FIELDS = ['price_history', 'price_count', 'price_sum', 'price_counts', 'price_median']
+
     class Meta:
         verbose_name = "صنف"
         verbose_name_plural = "اصناف"
         ordering = ['category']
+        indexes = [
+            trigram_index('search_text', 'asset_search_trgm'),
+        ]
 
-    def update_stock(self, quantity_change):
+    def save(self, *args, **kwargs):
+        self.search_text = normalize_search(self.name, self.brand, self.brand_en)
+        super().save(*args, **kwargs)
+
+    def update_stock(self, quantity_change, kind='Adjust'):
         """
-        Update the quantity of this asset.
+        Update the quantity of this asset through the stock ledger.
         If quantity_change is positive, it's an import; if negative, it's an export.
+        Raises InsufficientStock instead of taking the stock below zero.
         """
-        self.stock += quantity_change
-        self.save()
+        from .services import apply_stock_changes
+        balances = apply_stock_changes({self.id: quantity_change}, kind)
+        self.stock = balances[self.id]
 
     def add_price(self, price):
-        # Convert the price to Decimal before appending
-        self.price_history.append(price)
+        """Append a price to the history and fold it into the running statistics."""
+        self.append_prices([price])
         self.save()
 
+    def append_prices(self, prices):
+        """Append prices to the history and statistics without saving, for batched writes."""
+        if self.price_count != len(self.price_history) or not isinstance(self.price_counts, list):
+            self.refresh_price_stats()  # History predates the statistics or their format, rebuild them first
+        for price in prices:
+            self.price_history.append(price)
+            self._count_price(price)
+        self.price_median = self._histogram_median()
+
+    def refresh_price_stats(self):
+        """Rebuild the running statistics from the full price history."""
+        self.price_count = 0
+        self.price_sum = Decimal('0.00')
+        self.price_counts = []
+        for price in self.price_history:
+            self._count_price(price)
+        self.price_median = self._histogram_median()
+
+    def _count_price(self, price):
+        """Add a single price to the count, sum and histogram, which stays sorted by price."""
+        value = Decimal(str(price)).quantize(Decimal('0.01'))
+        key = str(value)
+        index = bisect_left(self.price_counts, value, key=lambda entry: Decimal(entry[0]))
+        if index < len(self.price_counts) and self.price_counts[index][0] == key:
+            self.price_counts[index][1] += 1
+        else:
+            self.price_counts.insert(index, [key, 1])
+        self.price_count += 1
+        self.price_sum += value
+
+    def _histogram_median(self):
+        """Find the median by walking the cumulative counts of the sorted price histogram."""
+        if not self.price_count:
+            return None
+        mid = self.price_count // 2
+        # Zero-based positions of the middle value(s) in the sorted price list
+        positions = [mid - 1, mid] if self.price_count % 2 == 0 else [mid]
+        values = []
+        seen = 0
+        for key, count in self.price_counts:
+            seen += count
+            while positions and positions[0] < seen:
+                values.append(Decimal(key))
+                positions.pop(0)
+            if not positions:
+                break
+        return sum(values) / len(values)
+
     def round_to_nearest_quarter(self, value):
         """Round a Decimal to the nearest .00, .25, .50, .75, or 1.00."""
         if value is None:
@@ -93,28 +165,56 @@ class Asset(models.Model):
         return round(value * 4) / 4
 
     def average_price(self):
-        if not self.price_history:
+        if not self.price_count:
             return None
-        # Convert all prices to Decimal to ensure precision
-        avg_price = sum(map(Decimal, self.price_history)) / len(self.price_history)
+        avg_price = Decimal(self.price_sum) / self.price_count
         return self.round_to_nearest_quarter(avg_price)
 
     def median_price(self):
-        if not self.price_history:
+        if self.price_median is None:
             return None
-        sorted_prices = sorted(map(Decimal, self.price_history))
-        mid = len(sorted_prices) // 2
-        if len(sorted_prices) % 2 == 0:
-            median_value = (sorted_prices[mid - 1] + sorted_prices[mid]) / 2
-        else:
-            median_value = sorted_prices[mid]
-        
-        return self.round_to_nearest_quarter(median_value)
+        return self.round_to_nearest_quarter(Decimal(self.price_median))
     
     def __str__(self):
         return self.name
 
 
+# Stock Ledger Model:
+class StockMovement(models.Model):
+    KINDS = [
+        ('Import', 'استلام'),
+        ('Export', 'صرف'),
+        ('Adjust', 'تسوية'),
+    ]
+
+    asset = models.ForeignKey('Asset', related_name='movements', on_delete=models.PROTECT, verbose_name="الصنف")
+    kind = models.CharField(max_length=10, choices=KINDS, verbose_name="نوع الحركة")
+    quantity = models.IntegerField(verbose_name="الكمية")  # Signed, negative for exports
+    balance = models.PositiveIntegerField(verbose_name="الرصيد بعد الحركة")
+    trans_id = models.IntegerField(blank=True, null=True, verbose_name="رقم الاذن")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="الوقت")
+
+    class Meta:
+        verbose_name = "حركة مخزنية"
+        verbose_name_plural = "الحركات المخزنية"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['asset', 'created_at']),
+        ]
+
+    def save(self, *args, **kwargs):
+        # The ledger is append-only, existing movements are never rewritten
+        if self.pk:
+            raise ValueError("Stock movements cannot be modified.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Stock movements cannot be deleted.")
+
+    def __str__(self):
+        return f"{self.asset} {self.quantity:+} -> {self.balance}"
+
+
 # Import Transaction Model:
 class ImportRecord(models.Model):
     trans_id = models.AutoField(primary_key=True, verbose_name="رقم الاذن")
@@ -133,6 +233,9 @@ class ImportRecord(models.Model):
         verbose_name = "اضن استلام"
         verbose_name_plural = "اذونات الاستلام"
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'trans_id']),  # Keyset pages of the listing
+        ]
 
     def __str__(self):
         return f"Import {self.trans_id} - {self.date}"
@@ -168,6 +271,10 @@ class ExportRecord(models.Model):
     entity_type = models.ForeignKey(ContentType, on_delete=models.PROTECT)
     entity_id = models.PositiveIntegerField()
     entity_selection = GenericForeignKey('entity_type', 'entity_id')
+    # Display name and kind of the entity, kept in sync by storage.signals so listings need no GFK lookups
+    entity_name = models.CharField(max_length=255, blank=True, db_index=True, verbose_name="الجهة")
+    entity_kind = models.CharField(max_length=100, blank=True, verbose_name="نوع الجهة")
+    entity_search = models.CharField(max_length=255, blank=True, editable=False)  # Normalized entity_name
     items = models.ManyToManyField(Asset, through='ExportItem', verbose_name="الاصناف") 
     notes = models.TextField(blank=True, null=True, verbose_name="ملاحظات")
     created_at = models.DateTimeField(auto_now_add=True)
@@ -177,6 +284,23 @@ class ExportRecord(models.Model):
         verbose_name = "اذن صرف"
         verbose_name_plural = "اذونات الصرف"
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['entity_type', 'entity_id']),
+            models.Index(fields=['date', 'trans_id']),  # Keyset pages of the listing
+            trigram_index('entity_search', 'export_entity_search_trgm'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.entity_type_id and self.entity_id:
+            self.refresh_entity_label()
+        super().save(*args, **kwargs)
+
+    def refresh_entity_label(self):
+        """Copy the display name and kind of the current entity onto the record."""
+        entity = self.entity_selection
+        self.entity_name = str(entity) if entity else ''
+        self.entity_kind = str(entity._meta.verbose_name) if entity else ''
+        self.entity_search = normalize_search(self.entity_name)
 
     def __str__(self):
         return f"Export {self.trans_id} - {self.date}"
@@ -205,6 +329,106 @@ class ExportItem(models.Model):
     return_pdf = models.FileField(upload_to=get_pdf_upload_path, blank=True)
     return_notes = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['return_at', 'id']),  # Keyset pages of the returns listing
+        ]
+
+
+# Background PDF Job Model
+class PdfJob(models.Model):
+    STATUSES = [
+        ('Pending', 'في الانتظار'),
+        ('Running', 'قيد التنفيذ'),
+        ('Done', 'جاهز'),
+        ('Failed', 'فشل'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=50, verbose_name="نوع الملف")
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default='Pending', verbose_name="الحالة")
+    file = models.FileField(upload_to='pdf_jobs/', blank=True, verbose_name="الملف")
+    filename = models.CharField(max_length=255, blank=True, verbose_name="اسم الملف")
+    error = models.TextField(blank=True, verbose_name="الخطأ")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="بواسطة")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="وقت الطلب")
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = "ملف PDF"
+        verbose_name_plural = "ملفات PDF"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.id} - {self.status}"
+
+
+# Draft Voucher Models
+class DraftVoucher(models.Model):
+    """The import, export or return voucher a user is filling in, kept until it is saved."""
+    KINDS = [
+        ('import', 'اذن استلام'),
+        ('export', 'اذن صرف'),
+        ('return', 'اذن ارجاع'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='draft_vouchers', verbose_name="المستخدم")
+    kind = models.CharField(max_length=10, choices=KINDS, verbose_name="نوع الاذن")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "مسودة اذن"
+        verbose_name_plural = "مسودات الاذونات"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'kind'], name='unique_user_draft_voucher'),
+        ]
+
+    @classmethod
+    def for_user(cls, user, kind):
+        """The draft of this kind for the user, created on first use."""
+        return cls.objects.get_or_create(user=user, kind=kind)[0]
+
+    @staticmethod
+    def lines_of(user, kind):
+        """Lines of the user's draft with their assets, in the order they were added, in one query."""
+        return DraftLine.objects.filter(draft__user=user, draft__kind=kind).select_related('asset').order_by('id')
+
+    def __str__(self):
+        return f"{self.user} {self.kind} draft"
+
+
+class DraftLine(models.Model):
+    draft = models.ForeignKey('DraftVoucher', related_name='lines', on_delete=models.CASCADE, verbose_name="المسودة")
+    kind = models.CharField(max_length=10, choices=DraftVoucher.KINDS, default='', editable=False)  # Copied from the draft for the constraints
+    asset = models.ForeignKey('Asset', on_delete=models.CASCADE, blank=True, null=True, verbose_name="الصنف")
+    item_id = models.PositiveIntegerField(blank=True, null=True)  # Import or export line being returned, on return drafts
+    quantity = models.PositiveIntegerField(default=0, verbose_name="الكمية")
+    price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, verbose_name="السعر")
+    purpose = models.CharField(max_length=50, blank=True, verbose_name="سبب الاعادة")
+    condition = models.CharField(max_length=50, blank=True, verbose_name="الحالة")
+
+    class Meta:
+        constraints = [
+            # An asset appears once on a receipt and a line is returned once, concurrent adds update the same line
+            models.UniqueConstraint(fields=['draft', 'asset'], condition=models.Q(kind='import'), name='unique_import_draft_asset'),
+            models.UniqueConstraint(fields=['draft', 'item_id'], condition=models.Q(kind='return'), name='unique_return_draft_item'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.kind:
+            self.kind = self.draft.kind
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.draft} line {self.pk}"
+
 
 # Report Committee Model
 class Committee(models.Model):
@@ -0,0 +1,96 @@
+#############################################################################
+# PDF Render Cache Libraries
+#############################################################################
+import hashlib
+import json
+import logging
+import os
+import uuid
+from django.conf import settings
+from .genpdf import PDF_LAYOUT_VERSION
+
+#############################################################################
+logger = logging.getLogger('storage')
+#############################################################################
+
+def record_fingerprint(model, trans_id, record_info):
+    """
+    Hash everything a voucher PDF is drawn from.
+
+    The record data already holds the record fields and every item row as they
+    appear on paper, so any edit to the record, its lines or their assets changes
+    the fingerprint. The layout version invalidates all entries when genpdf changes.
+    """
+    payload = json.dumps([PDF_LAYOUT_VERSION, model, trans_id, record_info], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def _cache_path(model, trans_id, fingerprint):
+    return os.path.join(settings.PDF_CACHE_DIR, f"{model}_{trans_id}_{fingerprint}.pdf")
+
+
+def get_or_render(model, trans_id, fingerprint, render):
+    """
+    Return the cached PDF bytes for this record version, rendering them on a miss.
+
+    Args:
+        model (str): 'import' or 'export'.
+        trans_id (int): The record number.
+        fingerprint (str): The record_fingerprint of the data being rendered.
+        render (callable): Builds the PDF bytes when they are not cached.
+    """
+    path = _cache_path(model, trans_id, fingerprint)
+    try:
+        with open(path, 'rb') as f:
+            pdf_data = f.read()
+        os.utime(path)  # Mark as recently used for eviction
+        return pdf_data
+    except OSError:
+        pass
+
+    pdf_data = render()
+    try:
+        _store(model, trans_id, path, pdf_data)
+        _evict(settings.PDF_CACHE_MAX_SIZE)
+    except OSError as e:
+        # The cache is an optimization only, a failed write must not fail the request
+        logger.warning(f"Could not cache PDF for {model} record {trans_id}: {e}")
+    return pdf_data
+
+
+def _store(model, trans_id, path, pdf_data):
+    """Write the PDF atomically and drop older versions of the same record."""
+    os.makedirs(settings.PDF_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(pdf_data)
+    os.replace(tmp_path, path)
+
+    prefix = f"{model}_{trans_id}_"
+    for entry in os.scandir(settings.PDF_CACHE_DIR):
+        if entry.name.startswith(prefix) and entry.path != path:
+            _remove(entry.path)
+
+
+def _evict(max_size):
+    """Delete the least recently used PDFs until the cache fits in max_size bytes."""
+    entries = []
+    total = 0
+    for entry in os.scandir(settings.PDF_CACHE_DIR):
+        if entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        _remove(path)
+        total -= size
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # Already removed by a concurrent request
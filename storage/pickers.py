@@ -0,0 +1,62 @@
+#############################################################################
+# Asset Picker Cache Libraries
+#############################################################################
+import hashlib
+import json
+import time
+from django.core.cache import cache
+from .models import Asset
+
+#############################################################################
+# Entries are dropped whenever their assets change, the timeout only bounds
+# how long a list built while a change was being committed can survive.
+PICKER_CACHE_TIMEOUT = 60 * 60
+ALL_CATEGORIES = 'all'
+
+#############################################################################
+
+def _picker_key(category_id):
+    return f"asset_picker_{category_id}"
+
+
+def picker_entry(category_id=ALL_CATEGORIES):
+    """
+    The cached asset list of a category, or of every category.
+
+    An entry holds the id, name, category and stock of each asset, enough for
+    both the import picker and the in-stock export picker, and the time it was
+    built, which is sent as Last-Modified.
+    """
+    key = _picker_key(category_id)
+    entry = cache.get(key)
+    if entry is None:
+        assets = Asset.objects.all()
+        if category_id != ALL_CATEGORIES:
+            assets = assets.filter(category_id=category_id)
+        entry = {
+            'assets': list(assets.values_list('id', 'name', 'category_id', 'stock')),
+            'modified': int(time.time()),
+        }
+        cache.set(key, entry, PICKER_CACHE_TIMEOUT)
+    return entry
+
+
+def picker_payload(entry, in_stock=False, grouped=False):
+    """Build the picker JSON from an entry, optionally only assets in stock, optionally grouped by category."""
+    assets = [(asset_id, name, category_id) for asset_id, name, category_id, stock in entry['assets'] if stock > 0 or not in_stock]
+    if not grouped:
+        return {'assets': [{'id': asset_id, 'name': name} for asset_id, name, _ in assets]}
+    categories = {}
+    for asset_id, name, category_id in assets:
+        categories.setdefault(str(category_id), []).append({'id': asset_id, 'name': name})
+    return {'categories': categories}
+
+
+def payload_etag(payload):
+    """A strong validator for a picker payload."""
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def invalidate_asset_pickers(category_ids):
+    """Drop the cached lists of the given categories and the list of all categories."""
+    cache.delete_many([_picker_key(category_id) for category_id in set(category_ids)] + [_picker_key(ALL_CATEGORIES)])
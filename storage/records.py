@@ -0,0 +1,101 @@
+#############################################################################
+# Record Hydration Libraries
+#############################################################################
+from django.db.models import Prefetch
+from .models import ImportRecord, ImportItem, ExportRecord, ExportItem
+
+#############################################################################
+# Import Records
+#############################################################################
+
+def import_record_info(import_record):
+    """
+    Build the record data shown on an import voucher.
+
+    Expects the record to come from prefetched_import_records, so no
+    query is run per record or per item.
+    """
+    company = import_record.company
+    record_info = {
+        'trans_id': import_record.trans_id,
+        'date': import_record.date.strftime("%d-%m-%Y") if import_record.date else "N/A",
+        'company': company.name if company else "N/A",
+        'phone': company.phone if company else "N/A",
+        'address': company.address if company else "N/A",
+        'assign_id': import_record.assign_number or "N/A",
+        'assign_date': import_record.assign_date.strftime("%d-%m-%Y") if import_record.assign_date else "N/A",
+        'notes': import_record.notes or "N/A",
+    }
+
+    item_details = []
+    for item in import_record.Importeditems.all():
+        item_details.append({
+            'name': str(item.asset.name),
+            'brand': str(item.asset.brand+' '+item.asset.brand_en),
+            'quantity': item.quantity,
+            'unit': str(item.asset.get_unit_display()),  # Fetch unit display from asset
+            'price': item.price,
+            'total_price': item.price * item.quantity,
+        })
+
+    record_info['items'] = item_details
+    return record_info
+
+
+def prefetched_import_records(records=None):
+    """Import records with their company, items and assets loaded in two queries."""
+    records = ImportRecord.objects.all() if records is None else records
+    return records.select_related('company').prefetch_related(
+        Prefetch('Importeditems', queryset=ImportItem.objects.select_related('asset').order_by('id'))
+    )
+
+#############################################################################
+# Export Records
+#############################################################################
+
+def export_record_info(export_record):
+    """
+    Build the record data shown on an export voucher.
+
+    Expects the record to come from prefetched_export_records, so no
+    query is run per record or per item.
+    """
+    record_info = {
+        'trans_id': export_record.trans_id,
+        'date': export_record.date.strftime("%d-%m-%Y") if export_record.date else "N/A",
+        'entity': export_record.entity_name or "N/A",
+        'notes': export_record.notes or "N/A",
+        'export_type': export_record.get_export_type_display(),
+        'xp_type': export_record.export_type
+    }
+
+    item_details = []
+    for item in export_record.Exporteditems.all():
+        average_price = item.asset.average_price()
+        item_details.append({
+            'id': item.id,
+            'name': str(item.asset.name),
+            'brand': str(item.asset.brand+' '+item.asset.brand_en),
+            'quantity': item.quantity,
+            'unit': str(item.asset.get_unit_display()),  # Fetch unit display from asset
+            'price': average_price,
+            'total_price': average_price * item.quantity,
+        })
+
+    record_info['items'] = item_details
+    return record_info
+
+
+def prefetched_export_records(records=None):
+    """Export records with their items and assets loaded in two queries."""
+    records = ExportRecord.objects.all() if records is None else records
+    return records.prefetch_related(
+        Prefetch('Exporteditems', queryset=ExportItem.objects.select_related('asset').order_by('id')),
+    )
+
+#############################################################################
+# Hydrators by voucher model, used by the PDF views and batch exports
+RECORD_HYDRATORS = {
+    'import': (prefetched_import_records, import_record_info),
+    'export': (prefetched_export_records, export_record_info),
+}
@@ -0,0 +1,80 @@
+#############################################################################
+# Report Engine Libraries
+#############################################################################
+from django.db.models import Value, IntegerField
+from .models import Asset, ImportItem, ExportItem
+
+#############################################################################
+# Movement kinds, ordered so imports come before exports on the same date
+#############################################################################
+IMPORT, EXPORT = 0, 1
+MOVEMENT_TYPES = {IMPORT: 'import', EXPORT: 'export'}
+
+#############################################################################
+
+def inventory_movements(end_date):
+    """
+    Return every import and export line up to end_date as a single ordered stream.
+
+    Rows are (asset_id, date, kind, quantity) tuples ordered by asset, date,
+    kind and line id, so the running total of each asset can be built in one pass.
+    """
+    fields = ('asset_id', 'record__date', 'kind', 'quantity', 'id')
+    imports = ImportItem.objects.filter(record__date__lte=end_date).annotate(
+        kind=Value(IMPORT, output_field=IntegerField())
+    ).values_list(*fields)
+    exports = ExportItem.objects.filter(record__date__lte=end_date).annotate(
+        kind=Value(EXPORT, output_field=IntegerField())
+    ).values_list(*fields)
+
+    movements = imports.union(exports, all=True).order_by('asset_id', 'record__date', 'kind', 'id')
+    for asset_id, record_date, kind, quantity, _ in movements.iterator(chunk_size=2000):
+        yield asset_id, record_date, kind, quantity
+
+
+def report_inventory(end_date):
+    """
+    Build the inventory report rows for every asset as of end_date.
+
+    Runs two queries regardless of the number of assets: one for the assets
+    (with their categories) and one for the combined import/export movements.
+    """
+    # Initialize the asset rows in report order
+    assets_data = []
+    assets_index = {}
+    assets = Asset.objects.select_related('category').order_by('category__name', 'id')
+
+    for asset in assets:
+        asset_data = {
+            'id': asset.id,
+            'category': asset.category.name,
+            'name': asset.name,
+            'brand': f"{asset.brand} {asset.brand_en}",  # Combine brand and brand_en
+            'unit': asset.unit,
+            'stock': asset.stock,
+            'average_price': asset.average_price(),
+            'net_quantity': 0,  # Will be calculated
+            'differences': [],  # To store differences over time
+        }
+        assets_data.append(asset_data)
+        assets_index[asset.id] = asset_data
+
+    # Walk the ordered movements once, keeping a running total per asset
+    current_id = None
+    running_total = 0
+    for asset_id, record_date, kind, quantity in inventory_movements(end_date):
+        if asset_id != current_id:
+            current_id = asset_id
+            running_total = 0
+
+        running_total += quantity if kind == IMPORT else -quantity
+        asset_data = assets_index[asset_id]
+        asset_data['net_quantity'] = running_total
+        asset_data['differences'].append({
+            'date': record_date.strftime('%Y-%m-%d'),
+            'type': MOVEMENT_TYPES[kind],
+            'quantity': quantity,
+            'running_total': running_total,
+        })
+
+    return assets_data
@@ -0,0 +1,55 @@
+#############################################################################
+# Search Libraries
+#############################################################################
+import re
+from django.contrib.postgres.indexes import GinIndex
+from django.db.models import Q
+
+#############################################################################
+# Arabic Normalization
+#############################################################################
+# Harakat, Quranic annotation marks and the superscript alef
+ARABIC_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06dc\u06df-\u06e8\u06ea-\u06ed]')
+TATWEEL = '\u0640'
+# Hamza and madda forms of alef fold to a bare alef, alef maqsura to yaa
+ARABIC_LETTER_FORMS = str.maketrans({
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ٱ': 'ا',
+    'ى': 'ي',
+})
+WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_search(*parts):
+    """
+    Fold text into the form kept in search columns and used for search terms.
+
+    Drops tatweel and diacritics, unifies alef and yaa forms, lowercases Latin
+    text and collapses whitespace, so "الأقلام" finds "الاقلام" and "Hp" finds "HP".
+    """
+    text = ' '.join(str(part) for part in parts if part)
+    text = ARABIC_DIACRITICS.sub('', text.replace(TATWEEL, ''))
+    text = text.translate(ARABIC_LETTER_FORMS).casefold()
+    return WHITESPACE.sub(' ', text).strip()
+
+
+def search_query(field, term):
+    """
+    Match a normalized search column against a search term.
+
+    Uses a case-sensitive LIKE on the already folded column, which the trigram
+    index can answer, unlike icontains that wraps the column in UPPER().
+    A blank term matches every row, a term made only of diacritics or tatweel
+    matches none.
+    """
+    normalized = normalize_search(term)
+    if not normalized:
+        return Q() if not str(term or '').strip() else Q(pk__in=[])
+    return Q(**{f'{field}__contains': normalized})
+
+
+def trigram_index(field, name):
+    """A GIN trigram index on a search column, needs the pg_trgm extension."""
+    return GinIndex(fields=[field], name=name, opclasses=['gin_trgm_ops'])
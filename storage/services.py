@@ -0,0 +1,151 @@
+#############################################################################
+# Storage Services Libraries
+#############################################################################
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Case, When, Value, F, IntegerField
+from .models import Asset, ImportItem, ExportItem, StockMovement
+from .pickers import invalidate_asset_pickers
+
+#############################################################################
+# Stock Ledger
+#############################################################################
+
+class InsufficientStock(Exception):
+    """Raised when a stock change would take one or more assets below zero."""
+
+    def __init__(self, shortages):
+        # shortages maps asset names to the quantity currently available
+        self.shortages = shortages
+        details = '، '.join(f"{name} (المتوفر: {available})" for name, available in shortages.items())
+        super().__init__(f"الكمية المطلوبة غير متوفرة بالمخزن للأصناف: {details}")
+
+
+def apply_stock_changes(quantities, kind, trans_id=None):
+    """
+    Apply signed stock changes to many assets and append a ledger row per asset.
+
+    The assets are locked with select_for_update in id order, so concurrent
+    postings queue on the rows they share instead of overwriting each other,
+    and no two postings can deadlock. The stock itself is changed through a
+    single F() update.
+
+    Args:
+        quantities (dict): Maps asset ids to the signed quantity to add to their stock.
+        kind (str): One of StockMovement.KINDS.
+        trans_id (int): The import or export record behind the change, if any.
+
+    Returns:
+        dict: The new stock of every changed asset, keyed by asset id.
+
+    Raises:
+        InsufficientStock: If any asset would end below zero. Nothing is changed.
+    """
+    quantities = {int(asset_id): quantity for asset_id, quantity in quantities.items() if quantity}
+    if not quantities:
+        return {}
+
+    with transaction.atomic():
+        locked = Asset.objects.select_for_update().filter(id__in=quantities).order_by('id')
+        rows = list(locked.values_list('id', 'name', 'stock', 'category_id'))
+        current = {asset_id: (name, stock) for asset_id, name, stock, _ in rows}
+        categories = {asset_id: category_id for asset_id, _, _, category_id in rows}
+
+        # Reject the whole posting if any line overdraws, or its asset no longer exists
+        shortages = {}
+        for asset_id, quantity in quantities.items():
+            name, stock = current.get(asset_id, (asset_id, 0))
+            if asset_id not in current or stock + quantity < 0:
+                shortages[name] = stock
+        if shortages:
+            raise InsufficientStock(shortages)
+
+        change = Case(
+            *[When(id=asset_id, then=Value(quantity)) for asset_id, quantity in quantities.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        Asset.objects.filter(id__in=quantities).update(stock=F('stock') + change)
+
+        # The rows are locked until commit, so the new balances are known exactly
+        balances = {asset_id: current[asset_id][1] + quantity for asset_id, quantity in quantities.items()}
+        StockMovement.objects.bulk_create(
+            StockMovement(asset_id=asset_id, kind=kind, quantity=quantity, balance=balances[asset_id], trans_id=trans_id)
+            for asset_id, quantity in quantities.items()
+        )
+
+        # The export pickers only list assets in stock, refresh the categories whose assets ran out or came back
+        crossed = {categories[asset_id] for asset_id in quantities if (current[asset_id][1] > 0) != (balances[asset_id] > 0)}
+        if crossed:
+            transaction.on_commit(lambda: invalidate_asset_pickers(crossed))
+
+    return balances
+
+#############################################################################
+# Record Commit Services
+#############################################################################
+
+def commit_import_record(import_record_form, draft):
+    """
+    Save an import record from the lines of a draft in one transaction, then drop the draft.
+
+    The assets are locked once, their price histories are appended in a single
+    bulk update, stock is raised through the ledger and the lines are bulk inserted.
+    """
+    with transaction.atomic():
+        import_record = import_record_form.save()
+        draft_lines = list(draft.lines.order_by('id'))
+
+        # Lock the assets in id order so concurrent receipts cannot deadlock
+        asset_ids = sorted(line.asset_id for line in draft_lines)
+        assets = {asset.id: asset for asset in Asset.objects.select_for_update().filter(id__in=asset_ids).order_by('id')}
+
+        quantities = defaultdict(int)
+        lines = []
+        for line in draft_lines:
+            asset = assets[line.asset_id]
+            asset.append_prices([str(line.price)])  # The history keeps prices as strings
+            quantities[asset.id] += line.quantity
+            lines.append(ImportItem(
+                record=import_record,
+                asset=asset,
+                quantity=line.quantity,
+                price=line.price,
+            ))
+
+        Asset.objects.bulk_update(assets.values(), Asset.PRICE_FIELDS)
+        apply_stock_changes(quantities, 'Import', import_record.trans_id)
+        ImportItem.objects.bulk_create(lines)
+        draft.delete()
+
+    return import_record
+
+
+def commit_export_record(export_record_form, export_type, draft):
+    """
+    Save an export record from the lines of a draft in one transaction, then drop the draft.
+
+    Quantities of repeated assets are summed so stock is lowered with one F() update,
+    and the lines are bulk inserted. Raises InsufficientStock if the draft overdraws,
+    the draft is then kept as it was.
+    """
+    with transaction.atomic():
+        export_record = export_record_form.save(commit=False)
+        export_record.export_type = export_type  # Associate the export type with the record
+        export_record.save()
+
+        quantities = defaultdict(int)
+        lines = []
+        for line in draft.lines.order_by('id'):
+            quantities[line.asset_id] -= line.quantity
+            lines.append(ExportItem(
+                record=export_record,
+                asset_id=line.asset_id,
+                quantity=line.quantity,
+            ))
+
+        apply_stock_changes(quantities, 'Export', export_record.trans_id)
+        ExportItem.objects.bulk_create(lines)
+        draft.delete()
+
+    return export_record
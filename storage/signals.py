@@ -0,0 +1,96 @@
+#############################################################################
+# Storage Signals Libraries
+#############################################################################
+from django.db.models import ProtectedError
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from core.models import Affiliate, Department, Employee, SubAffiliate
+from core.pagination import invalidate_query_values
+from .models import Asset, ExportRecord
+from .pickers import invalidate_asset_pickers
+from .search import normalize_search
+
+#############################################################################
+# Export Record Entity Labels
+#############################################################################
+
+def sync_entity_label(entity):
+    """Rewrite the stored entity name on every export record issued to entity."""
+    entity_name = str(entity)
+    updated = entity.selections.exclude(entity_name=entity_name).update(
+        entity_name=entity_name,
+        entity_kind=str(entity._meta.verbose_name),
+        entity_search=normalize_search(entity_name),
+    )
+    if updated:
+        # Searches by entity name now match other records
+        transaction.on_commit(lambda: invalidate_query_values(ExportRecord))
+    return updated
+
+
+@receiver(post_save, sender=Department)
+@receiver(post_save, sender=Employee)
+@receiver(post_save, sender=SubAffiliate)
+def entity_saved(sender, instance, created, **kwargs):
+    if not created:
+        sync_entity_label(instance)
+
+
+@receiver(post_save, sender=Affiliate)
+def affiliate_saved(sender, instance, created, **kwargs):
+    # Sub affiliates are displayed with the name of their affiliate
+    if not created:
+        for subaffiliate in instance.subaffiliates.select_related('affiliate'):
+            sync_entity_label(subaffiliate)
+
+
+@receiver(pre_delete, sender=Department)
+@receiver(pre_delete, sender=Employee)
+@receiver(pre_delete, sender=SubAffiliate)
+def entity_deleting(sender, instance, **kwargs):
+    # The generic relation would cascade to the export records, keep the stock history instead.
+    # The admin lists the records as protected before a delete gets here, see core.admin
+    records = instance.selections.all()
+    if records.exists():
+        raise ProtectedError(f"لا يمكن حذف {instance} لوجود اذونات صرف باسمه.", set(records))
+
+#############################################################################
+# Export Record Counts
+#############################################################################
+
+@receiver(post_save, sender=ExportRecord)
+@receiver(post_delete, sender=ExportRecord)
+def export_record_changed(sender, instance, **kwargs):
+    # The tab counts and row counts of the export listing are cached per filter
+    transaction.on_commit(lambda: invalidate_query_values(ExportRecord))
+
+#############################################################################
+# Asset Picker Cache
+#############################################################################
+
+@receiver(post_init, sender=Asset)
+def asset_loaded(sender, instance, **kwargs):
+    # The category the asset was loaded with, so a save can tell a move without reading the row again
+    instance._loaded_category_id = instance.__dict__.get('category_id')
+
+
+@receiver(pre_save, sender=Asset)
+def asset_saving(sender, instance, update_fields=None, **kwargs):
+    # Remember the category the asset is leaving, its picker list changes too
+    instance._previous_category_id = None
+    if not instance.pk or (update_fields is not None and not {'category', 'category_id'} & set(update_fields)):
+        return
+    loaded = getattr(instance, '_loaded_category_id', None)
+    if instance._state.adding or loaded is None:
+        # Not loaded from the database, or loaded without its category
+        loaded = Asset.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+    instance._previous_category_id = loaded
+
+
+@receiver(post_save, sender=Asset)
+@receiver(post_delete, sender=Asset)
+def asset_changed(sender, instance, **kwargs):
+    category_ids = {instance.category_id, getattr(instance, '_previous_category_id', None)} - {None}
+    instance._loaded_category_id = instance.category_id
+    transaction.on_commit(lambda: invalidate_asset_pickers(category_ids))
@@ -2,6 +2,7 @@ import django_tables2 as tables
 from .models import AssetCategory, Asset, ImportRecord, ExportRecord, ExportItem
 from django.utils.safestring import mark_safe
 from django.urls import reverse
+from core.tables import RelatedTable
 
 
 class AssetCategoryTable(tables.Table):
@@ -17,8 +18,9 @@ class AssetCategoryTable(tables.Table):
         return mark_safe(f'<a href="{reverse("edit_category", args=[value])}" class="btn btn-secondary btn-sm">تعديل</a>')
 
 
-class AssetTable(tables.Table):
+class AssetTable(RelatedTable):
     edit = tables.Column(accessor='id', verbose_name='', empty_values=())
+    select_related = ('category',)
 
     class Meta:
         model = Asset
@@ -27,11 +29,13 @@ class AssetTable(tables.Table):
         attrs = {'class': 'table table-striped table-sm table align-middle'}
 
     def render_edit(self, value, record):
-        return mark_safe(f'<a href="{reverse("manage_assets")}?category={record.category.id}&id={value}" class="btn btn-secondary btn-sm">تعديل</a>')
+        return mark_safe(f'<a href="{reverse("manage_assets")}?category={record.category_id}&id={value}" class="btn btn-secondary btn-sm">تعديل</a>')
 
 
-class ImportRecordTable(tables.Table):
+class ImportRecordTable(RelatedTable):
     details_pdf = tables.Column(accessor='trans_id', verbose_name='', empty_values=())
+    select_related = ('company',)
+    prefetch_related = ('items',)
 
     # Define table columns
     trans_id = tables.Column()
@@ -51,14 +55,15 @@ class ImportRecordTable(tables.Table):
         return mark_safe(f'{detail_button} {pdf_button}')  # Combine both buttons
 
 
-class ExportRecordTable(tables.Table):
+class ExportRecordTable(RelatedTable):
     details_pdf = tables.Column(accessor='trans_id', verbose_name='', empty_values=())
+    prefetch_related = ('items',)
 
     # Define table columns
     trans_id = tables.Column(verbose_name="رقم الإذن")
     date = tables.DateColumn(verbose_name="تاريخ الإذن")
     export_type = tables.Column(verbose_name="نوع الإذن")
-    entity = tables.Column(accessor='entity_selection', verbose_name="الجهة")
+    entity = tables.Column(accessor='entity_name', verbose_name="الجهة")
 
     class Meta:
         model = ExportRecord
@@ -89,8 +94,27 @@ class InventoryReportTable(tables.Table):
         fields = ("category", "name", "brand", "stock", "net_quantity", "average_price")
 
 
-class ExportReturnTable(tables.Table):
+class StockAnalyticsTable(tables.Table):
+    category = tables.Column(verbose_name="التصنيف")
+    name = tables.Column(verbose_name="اسم الصنف")
+    stock = tables.Column(verbose_name="الكمية بالمخزن")
+    imported = tables.Column(verbose_name="المستلم")
+    consumed = tables.Column(verbose_name="المصروف")
+    turnover = tables.Column(verbose_name="معدل الدوران")
+    mean_price = tables.Column(verbose_name="متوسط السعر")
+    price_change = tables.Column(verbose_name="تغير السعر %")
+    stockout_date = tables.DateColumn(verbose_name="النفاد المتوقع", format="Y-m-d")
+
+    class Meta:
+        attrs = {"class": "table table-striped table-sm table align-middle"}
+        template_name = "django_tables2/bootstrap5.html"
+        fields = ("category", "name", "stock", "imported", "consumed", "turnover", "mean_price", "price_change", "stockout_date")
+
+
+class ExportReturnTable(RelatedTable):
+    select_related = ('asset', 'record')
+
     class Meta:
         model = ExportItem
-        fields = ['return_id', 'return_at', 'return_purpose', 'asset', 'return_condition', 'record', 'record.date', 'record.entity_selection']
+        fields = ['return_id', 'return_at', 'return_purpose', 'asset', 'return_condition', 'record', 'record.date', 'record.entity_name']
         attrs = {'class': 'table table-striped table-bordered'}
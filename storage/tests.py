@@ -0,0 +1,429 @@
+import contextlib
+import io
+import statistics
+import tempfile
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import ProtectedError
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django_tables2 import RequestConfig
+from core.autocomplete import autocomplete_results
+from core.models import Company, Department, Employee
+from core.pagination import CURSOR_FIELD, encode_cursor, paginate_table
+from core.tables import EmployeeTable
+from users.models import UserActivityLog
+from users.tables import UserActivityLogTable
+from .batch import batch_record_infos
+from .drafts import add_draft_line
+from .forms import ImportRecordForm
+from .genpdf import STORY_LOOKAHEAD, StreamingDocTemplate, import_record_pdf
+from .jobs import enqueue_pdf_job, run_job
+from .pickers import ALL_CATEGORIES, _picker_key, picker_entry
+from .models import Asset, AssetCategory, DraftLine, DraftVoucher, ImportRecord, ImportItem, ExportRecord, ExportItem
+from .search import search_query
+from .services import commit_import_record
+from .tables import AssetTable, ImportRecordTable, ExportRecordTable, ExportReturnTable
+from .views import fetch_import_record_data, fetch_export_record_data
+
+# Queries a listing table renders a page in: the rows with their relations, and the count
+QUERIES = {
+    'assets': 2,
+    'employees': 2,
+    'import records': 3,  # The page, the company names, the count
+    'export records': 3,
+    'export returns': 2,
+    'activity log': 2,
+}
+
+
+class StorageTestData(TestCase):
+    """Fixture rows shared by the storage tests."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='storekeeper', password='x', is_staff=True)
+        cls.category = AssetCategory.objects.create(name='قرطاسية')
+        cls.company = Company.objects.create(name='شركة التوريد')
+        cls.assets = [cls.priced_asset(f'صنف {i}') for i in range(3)]
+
+    @classmethod
+    def priced_asset(cls, name):
+        asset = Asset(category=cls.category, name=name, stock=0, price_history=['10.00'])
+        asset.refresh_price_stats()
+        asset.save()
+        return asset
+
+    def import_form(self):
+        form = ImportRecordForm(data={'company': self.company.pk, 'date': date(2025, 1, 5), 'assign_date': date(2025, 1, 5)})
+        self.assertTrue(form.is_valid(), form.errors)
+        return form
+
+
+class ImportDraftTests(StorageTestData):
+
+    def test_adding_an_asset_again_replaces_its_line(self):
+        asset = self.assets[0]
+        add_draft_line(self.user, 'import', asset.id, 4, '2.50')
+        line, replaced = add_draft_line(self.user, 'import', asset.id, 6, '3.00')
+        self.assertTrue(replaced)
+        self.assertEqual(list(DraftVoucher.lines_of(self.user, 'import').values_list('quantity', flat=True)), [6])
+        self.assertEqual(line.kind, 'import')
+
+    def test_an_import_draft_holds_an_asset_once(self):
+        draft = DraftVoucher.for_user(self.user, 'import')
+        DraftLine.objects.create(draft=draft, asset=self.assets[0], quantity=1, price=Decimal('1.00'))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DraftLine.objects.create(draft=draft, asset=self.assets[0], quantity=2, price=Decimal('1.00'))
+
+    def test_repeated_lines_all_reach_the_stock(self):
+        # Lines written before the constraint existed carry no kind and may repeat an asset
+        draft = DraftVoucher.for_user(self.user, 'import')
+        asset = self.assets[0]
+        DraftLine.objects.bulk_create([
+            DraftLine(draft=draft, asset=asset, quantity=4, price=Decimal('2.00')),
+            DraftLine(draft=draft, asset=asset, quantity=6, price=Decimal('3.00')),
+        ])
+        record = commit_import_record(self.import_form(), draft)
+        asset.refresh_from_db()
+        self.assertEqual(asset.stock, 10)
+        self.assertEqual(sum(ImportItem.objects.filter(record=record).values_list('quantity', flat=True)), 10)
+
+
+class RecordQueryTests(StorageTestData):
+    """The voucher loaders run a fixed number of queries whatever the number of lines."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        today = date(2025, 1, 5)
+        department = Department.objects.create(name='قسم المخازن', type=Department._meta.get_field('type').choices[0][0])
+        entity_type = ContentType.objects.get_for_model(Department)
+        assets = cls.assets + [cls.priced_asset(f'صنف اضافي {i}') for i in range(7)]
+        # One record with a single line and one with ten, per voucher kind
+        cls.import_ids, cls.export_ids = [], []
+        for lines in (assets[:1], assets):
+            import_record = ImportRecord.objects.create(company=cls.company, date=today, assign_date=today)
+            export_record = ExportRecord.objects.create(date=today, export_type='Consume', entity_type=entity_type, entity_id=department.id)
+            ImportItem.objects.bulk_create(ImportItem(record=import_record, asset=asset, quantity=1, price='10.00') for asset in lines)
+            ExportItem.objects.bulk_create(ExportItem(record=export_record, asset=asset, quantity=1) for asset in lines)
+            cls.import_ids.append(import_record.trans_id)
+            cls.export_ids.append(export_record.trans_id)
+
+    def load(self, loader, *args):
+        # The loaders print progress notes
+        with contextlib.redirect_stdout(io.StringIO()):
+            return loader(*args)
+
+    def test_import_record(self):
+        for trans_id in self.import_ids:
+            with self.assertNumQueries(2):  # Record with company, items with assets
+                self.load(fetch_import_record_data, trans_id)
+
+    def test_export_record(self):
+        for trans_id in self.export_ids:
+            with self.assertNumQueries(2):  # Record, items with assets
+                self.load(fetch_export_record_data, trans_id)
+
+    def test_batches(self):
+        for model in ('import', 'export'):
+            with self.assertNumQueries(2):
+                infos = self.load(batch_record_infos, model, {'trans_id': '', 'start_date': '1900-01-01'})
+            self.assertEqual(len(infos), 2)
+
+
+class TableQueryTests(TestCase):
+    """The listing tables render a page of one row and of ten rows in the same number of queries."""
+
+    ROWS = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date(2025, 1, 5)
+        user_model = get_user_model()
+        # Every row has its own related objects, so an unprefetched relation shows as a query per row
+        categories = AssetCategory.objects.bulk_create(AssetCategory(name=f'تصنيف {i}') for i in range(cls.ROWS))
+        cls.assets = [Asset.objects.create(category=category, name=f'صنف {category.name}') for category in categories]
+        companies = [Company.objects.create(name=f'شركة {i}') for i in range(cls.ROWS)]
+        departments = Department.objects.bulk_create(
+            Department(name=f'قسم {i}', type=Department._meta.get_field('type').choices[0][0]) for i in range(cls.ROWS)
+        )
+        cls.employees = Employee.objects.bulk_create(
+            Employee(
+                name=f'موظف {i}', job_title=Employee._meta.get_field('job_title').choices[0][0],
+                department=department, email=f'{i}@example.com', phone='0', date_employed=today,
+            )
+            for i, department in enumerate(departments)
+        )
+        users = user_model.objects.bulk_create(user_model(username=f'user{i}') for i in range(cls.ROWS))
+        cls.logs = UserActivityLog.objects.bulk_create(UserActivityLog(user=user, action='VIEW') for user in users)
+
+        entity_type = ContentType.objects.get_for_model(Department)
+        cls.import_records = [
+            ImportRecord.objects.create(date=today - timedelta(days=i), assign_date=today, company=company)
+            for i, company in enumerate(companies)
+        ]
+        cls.export_records = [
+            ExportRecord.objects.create(date=today - timedelta(days=i), export_type='Consume', entity_type=entity_type, entity_id=department.id)
+            for i, department in enumerate(departments)
+        ]
+        lines = cls.assets[:5]
+        ImportItem.objects.bulk_create(
+            ImportItem(record=record, asset=asset, quantity=1, price='10.00') for record in cls.import_records for asset in lines
+        )
+        cls.returns = ExportItem.objects.bulk_create(
+            ExportItem(record=record, asset=asset, quantity=1, return_at=today) for record in cls.export_records for asset in lines
+        )
+
+    def setUp(self):
+        cache.clear()  # Filtered row counts are cached
+
+    def assertPageQueries(self, queries, build, rows):
+        """Render the page of the first row and of every row, each in the given number of queries."""
+        request = RequestFactory().get('/')
+        for count in (1, self.ROWS):
+            pks = [row.pk for row in rows[:count]]
+            with self.subTest(rows=count), self.assertNumQueries(queries):
+                build(request, pks).as_html(request)
+
+    def numbered(self, request, table):
+        RequestConfig(request, paginate={'per_page': 10}).configure(table)
+        return table
+
+    def test_assets(self):
+        self.assertPageQueries(QUERIES['assets'], lambda request, pks: self.numbered(request, AssetTable(Asset.objects.filter(pk__in=pks))), self.assets)
+
+    def test_employees(self):
+        self.assertPageQueries(QUERIES['employees'], lambda request, pks: self.numbered(request, EmployeeTable(Employee.objects.filter(pk__in=pks))), self.employees)
+
+    def test_import_records(self):
+        self.assertPageQueries(QUERIES['import records'], lambda request, pks: paginate_table(
+            request, ImportRecordTable(ImportRecord.objects.filter(pk__in=pks)), ('-date', '-trans_id')), self.import_records)
+
+    def test_export_records(self):
+        self.assertPageQueries(QUERIES['export records'], lambda request, pks: paginate_table(
+            request, ExportRecordTable(ExportRecord.objects.filter(pk__in=pks)), ('-date', '-trans_id')), self.export_records)
+
+    def test_export_returns(self):
+        self.assertPageQueries(QUERIES['export returns'], lambda request, pks: paginate_table(
+            request, ExportReturnTable(ExportItem.objects.filter(pk__in=pks)), ('-return_at', '-id')), self.returns)
+
+    def test_bad_cursor_shows_the_first_page(self):
+        first = [record.pk for record in self.import_records]
+        for values in ([], ['2025-01-05'], ['x', 1], [None, 1], [['2025-01-05'], 1], ['2025-01-05', 1, 2]):
+            request = RequestFactory().get('/', {CURSOR_FIELD: encode_cursor('next', values)})
+            with self.subTest(values=values):
+                table = paginate_table(request, ImportRecordTable(ImportRecord.objects.all()), ('-date', '-trans_id'))
+                self.assertEqual([row.record.pk for row in table.page.object_list], first)
+
+    def test_activity_log(self):
+        self.assertPageQueries(QUERIES['activity log'], lambda request, pks: paginate_table(
+            request, UserActivityLogTable(UserActivityLog.objects.filter(pk__in=pks)), ('-timestamp', '-id')), self.logs)
+
+
+class EntityDeleteTests(StorageTestData):
+    """Entities named on export records are kept, and the admin says why instead of failing."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = get_user_model().objects.create_superuser(username='admin', password='x')
+        cls.department = Department.objects.create(name='قسم الصيانة', type=Department._meta.get_field('type').choices[0][0])
+        ExportRecord.objects.create(
+            date=date(2025, 1, 5), export_type='Consume',
+            entity_type=ContentType.objects.get_for_model(Department), entity_id=cls.department.id,
+        )
+
+    def test_delete_is_refused(self):
+        with self.assertRaises(ProtectedError):
+            self.department.delete()
+
+    def test_admin_lists_the_records(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:core_department_delete', args=[self.department.pk])
+        response = self.client.post(url, {'post': 'yes'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'اذن صرف')
+        self.assertTrue(Department.objects.filter(pk=self.department.pk).exists())
+
+    def test_admin_deletes_unused_entities(self):
+        unused = Department.objects.create(name='قسم جديد', type=self.department.type)
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('admin:core_department_delete', args=[unused.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Department.objects.filter(pk=unused.pk).exists())
+
+
+class ExportCountTests(StorageTestData):
+    """The cached tab counts of the export listing follow the records written."""
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.department = Department.objects.create(name='قسم المخازن', type=Department._meta.get_field('type').choices[0][0])
+
+    def export_counts(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.client.get(reverse('export_records')).context['export_counts']
+
+    def test_counts_follow_written_records(self):
+        self.assertEqual(self.export_counts()['all'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            record = ExportRecord.objects.create(
+                date=date(2025, 1, 5), export_type='Consume',
+                entity_type=ContentType.objects.get_for_model(Department), entity_id=self.department.id,
+            )
+        self.assertEqual(self.export_counts()['all'], 1)
+        self.assertEqual(self.export_counts()['Consume'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            record.delete()
+        self.assertEqual(self.export_counts()['all'], 0)
+
+
+class AssetPickerCacheTests(StorageTestData):
+    """Saving an asset drops the picker lists it appears in, without reading its row again."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_save_reads_no_row(self):
+        asset = Asset.objects.get(pk=self.assets[0].pk)
+        asset.stock = 5
+        with self.assertNumQueries(1):
+            asset.save()
+        with self.assertNumQueries(1):
+            asset.save(update_fields=['stock'])
+
+    def test_moving_an_asset_drops_both_categories(self):
+        other = AssetCategory.objects.create(name='أدوات')
+        for category_id in (self.category.id, other.id, ALL_CATEGORIES):
+            picker_entry(category_id)
+        asset = Asset.objects.get(pk=self.assets[0].pk)
+        asset.category = other
+        with self.captureOnCommitCallbacks(execute=True):
+            asset.save()
+        for category_id in (self.category.id, other.id, ALL_CATEGORIES):
+            self.assertIsNone(cache.get(_picker_key(category_id)))
+
+
+class PriceStatsTests(StorageTestData):
+    """The histogram stays sorted by price as prices arrive, so the median is read without sorting."""
+
+    def test_median_of_prices_added_out_of_order(self):
+        asset = self.assets[0]
+        prices = ['30.00', '5.50', '10.00', '120.00', '5.50', '7.25', '99.99']
+        asset.append_prices(prices)
+        asset.save()
+        asset.refresh_from_db()
+        self.assertEqual([key for key, _ in asset.price_counts], ['5.50', '7.25', '10.00', '30.00', '99.99', '120.00'])
+        self.assertEqual(asset.price_count, 8)
+        self.assertEqual(asset.price_median, statistics.median(map(Decimal, asset.price_history)))
+        asset.append_prices(['1.00', '40.00', '40.00'])
+        self.assertEqual(asset.price_median, statistics.median(map(Decimal, asset.price_history)))
+
+    def test_histogram_of_the_former_format_is_rebuilt(self):
+        asset = self.assets[0]
+        asset.price_counts = {'10.00': 1}
+        asset.append_prices(['2.00'])
+        self.assertEqual(asset.price_counts, [['2.00', 1], ['10.00', 1]])
+        self.assertEqual(asset.price_median, Decimal('6.00'))
+
+
+class SearchQueryTests(StorageTestData):
+
+    def search(self, term):
+        return Asset.objects.filter(search_query('search_text', term)).count()
+
+    def test_diacritics_are_ignored(self):
+        self.assertEqual(self.search('صِنـف'), 3)
+
+    def test_term_of_only_diacritics_matches_nothing(self):
+        for term in ('\u064e\u0651', '\u0640\u0640', ' \u0640 '):
+            with self.subTest(term=term):
+                self.assertEqual(self.search(term), 0)
+
+    def test_blank_term_matches_everything(self):
+        for term in ('', '   ', None):
+            with self.subTest(term=term):
+                self.assertEqual(self.search(term), 3)
+
+
+class AutocompleteSearchTests(TestCase):
+    """Every autocomplete source matches the normalized search column, so spelling variants find the same rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        department = Department.objects.create(name='إدارة الشؤون المالية', type=Department._meta.get_field('type').choices[0][0])
+        Employee.objects.create(
+            name='أحمد مصطفى', job_title=Employee._meta.get_field('job_title').choices[0][0],
+            department=department, email='ahmed@example.com', phone='0', date_employed=date(2025, 1, 5),
+        )
+
+    def matches(self, source, term):
+        return [result['text'] for result in autocomplete_results(source, term)['results']]
+
+    def test_department_and_employee_match_spelling_variants(self):
+        for source, term, name in (
+            ('department', 'ادارة الشؤون', 'إدارة الشؤون المالية'),
+            ('department', 'المـالـية', 'إدارة الشؤون المالية'),
+            ('employee', 'احمد', 'أحمد مصطفى'),
+            ('employee', 'مُصطفى', 'أحمد مصطفى'),
+        ):
+            with self.subTest(source=source, term=term):
+                self.assertEqual(self.matches(source, term), [name])
+
+    def test_term_of_only_diacritics_matches_nothing(self):
+        for source in ('department', 'employee'):
+            with self.subTest(source=source):
+                self.assertEqual(self.matches(source, 'َّ'), [])
+
+
+class PaginatedPdfTests(TestCase):
+
+    def test_long_report_holds_few_flowables(self):
+        record_info = {
+            'trans_id': 1, 'date': '2025-01-05', 'company': 'شركة', 'assign_id': 1, 'assign_date': '2025-01-05',
+            'items': [{'name': f'صنف {i}', 'unit': 'قطعة', 'quantity': 1, 'total_price': Decimal('10.00')} for i in range(2000)],
+        }
+        held = []
+        handle_flowable = StreamingDocTemplate.handle_flowable
+
+        def counting(doc, flowables):
+            if flowables is doc._story:
+                held.append(len(flowables))
+            return handle_flowable(doc, flowables)
+
+        with mock.patch.object(StreamingDocTemplate, 'handle_flowable', counting):
+            pdf = import_record_pdf(1, record_info)
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        # A hundred body tables, never more than the lookahead and the two halves of a split table
+        self.assertGreater(len(held), 100)
+        self.assertLessEqual(max(held), STORY_LOOKAHEAD + 1)
+
+
+class PdfJobTests(StorageTestData):
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def run_batch(self, file_format):
+        job = enqueue_pdf_job('vouchers', {'model': 'import', 'format': file_format, 'filters': {'trans_id': '', 'start_date': '1900-01-01'}}, self.user)
+        with contextlib.redirect_stdout(io.StringIO()):
+            return run_job(job)
+
+    def test_files_keep_the_extension_of_their_format(self):
+        for file_format in ('pdf', 'zip'):
+            with self.subTest(file_format=file_format):
+                job = self.run_batch(file_format)
+                self.assertEqual(job.status, 'Done', job.error)
+                self.assertTrue(job.file.name.endswith(f'.{file_format}'))
+                self.assertTrue(job.filename.endswith(f'.{file_format}'))
@@ -15,20 +15,27 @@ urlpatterns = [
     path('storage/import/new/<int:asset_id>/', views.import_item_delete, name='import_item_delete'),
     path('storage/import/<int:trans_id>/', views.import_details, name='import_details'),
     path('storage/<str:model>/pdf/<int:trans_id>/', views.gen_pdf, name='gen_pdf'),
+    path('storage/<str:model>/pdf/batch/', views.batch_vouchers, name='batch_vouchers'),
     path('storage/export/', views.export_records, name='export_records'),
     path('storage/export/new/<str:export_type>', views.export_create, name='export_create'),
     path("storage/export/new/<str:export_type>/add/", views.export_item_add, name="export_item_add"),
     path('storage/export/new/<str:export_type>/<int:item_id>/', views.export_item_delete, name='export_item_delete'),
     path('storage/export/<int:trans_id>/', views.export_details, name='export_details'),
+    path('storage/drafts/<str:kind>/lines/', views.draft_line_add, name='draft_line_add'),
+    path('storage/drafts/<str:kind>/lines/<int:line_id>/delete/', views.draft_line_delete, name='draft_line_delete'),
     
     path('storage/returns/', views.return_records, name='return_records'),
     path('storage/returns/new/<str:return_type>', views.return_create, name='return_create'),
 
     path('storage/report/', views.report_view, name='storage_report'),
     path('storage/report/pdf/', views.report_pdf, name='report_pdf'),
+    path('storage/jobs/<uuid:job_id>/', views.pdf_job_status, name='pdf_job_status'),
+    path('storage/jobs/<uuid:job_id>/download/', views.pdf_job_download, name='pdf_job_download'),
     # path('storage/report/inventory', views.report_inventory, name='storage_report_inventory'),
 
+    path('get_assets/', views.get_assets, name='get_all_assets'),
     path('get_assets/<int:category_id>/', views.get_assets, name='get_assets'),
+    path('get_ex_assets/', views.get_ex_assets, name='get_all_ex_assets'),
     path('get_ex_assets/<int:category_id>/', views.get_ex_assets, name='get_ex_assets'),
     # path('storage/import/edit/<int:trans_id>/', views.import_record_edit, name='import_item_edit'),
     # path('storage/import/record/delete/<int:trans_id>/', views.import_record_delete, name='import_record_delete'),
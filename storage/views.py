@@ -5,13 +5,27 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
 from django_tables2 import RequestConfig 
 from django.contrib.auth.decorators import login_required
-from .models import Asset, AssetCategory, ImportRecord, ImportItem, ExportRecord, ExportItem, Committee
-from .tables import AssetTable, AssetCategoryTable, ImportRecordTable, ExportRecordTable, InventoryReportTable, ExportReturnTable
+from .models import Asset, AssetCategory, ImportRecord, ImportItem, ExportRecord, ExportItem, Committee, PdfJob, DraftVoucher, DraftLine
+from .tables import AssetTable, AssetCategoryTable, ImportRecordTable, ExportRecordTable, InventoryReportTable, StockAnalyticsTable, ExportReturnTable
 from .forms import AssetForm, AssetCategoryForm, ImportRecordForm, ImportItemForm, ExportRecordForm, ExportItemForm, ReportForm, ReturnRecordForm
 from core.models import Employee
-from .filters import AssetFilter
+from core.pagination import paginate_table, cached_query_value
+from .search import search_query
+from .filters import AssetFilter, import_records_query, export_records_query
 from .genpdf import import_record_pdf, export_record_pdf, inventory_pdf
-from django.http import JsonResponse, HttpResponse
+from .reports import report_inventory
+from .analytics import stock_analytics
+from .services import commit_import_record, commit_export_record, InsufficientStock
+from .pdfcache import record_fingerprint, get_or_render
+from .jobs import enqueue_pdf_job, job_payload
+from .records import prefetched_import_records, import_record_info, prefetched_export_records, export_record_info
+from .batch import BATCH_FILTERS, BATCH_FORMATS, VOUCHER_RENDERERS
+from .pickers import ALL_CATEGORIES, picker_entry, picker_payload, payload_etag
+from .drafts import CART_KINDS, DraftLineError, add_draft_line, draft_line_info, draft_totals
+from django.http import JsonResponse, HttpResponse, FileResponse
+from django.views.decorators.http import require_POST
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag, http_date
 from django.template.loader import render_to_string
 from django.contrib import messages
 from django.utils.safestring import mark_safe
@@ -21,7 +35,7 @@ from datetime import date
 import os
 import uuid
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Sum, F
+from django.db.models import Sum, F, Count
 from datetime import timedelta
 from django.utils import timezone
 #############################################################################
@@ -130,38 +144,11 @@ def manage_assets(request):
 
 @login_required
 def import_records(request):
-    # Clear any residual session data
-    if 'import_items' in request.session:
-        del request.session['import_items']
-
-    query = Q()
-    trans_id = request.GET.get('trans_id', '')
-    items_or_company = request.GET.get('search', '')
-    start_date = request.GET.get('start_date', '')
-    end_date = request.GET.get('end_date', '')
-
-    # Apply filters based on user input
-    if trans_id:
-        query &= Q(trans_id__icontains=trans_id) | Q(assign_number__icontains=trans_id)
-    if items_or_company:
-        # Adjusting the filters to reference the related fields correctly
-        query &= (
-            Q(items__name__icontains=items_or_company) |  # Assuming items has a name field
-            Q(company__name__icontains=items_or_company) |  # Assuming company is also a ForeignKey with a name field
-            Q(assign_number__icontains=items_or_company)
-        )
-
-    if start_date and end_date:
-        query &= Q(date__range=[start_date, end_date])
-    elif start_date:
-        query &= Q(date__gte=start_date)
-    elif end_date:
-        query &= Q(date__lte=end_date)
+    query = import_records_query(request.GET)
 
     # Fetch all ImportRecord entries
-    records = ImportRecord.objects.filter(query).distinct().order_by('-date')
-    table = ImportRecordTable(records)
-    RequestConfig(request, paginate={'per_page': 10}).configure(table)
+    records = ImportRecord.objects.filter(query)
+    table = paginate_table(request, ImportRecordTable(records), ('-date', '-trans_id'))
 
     return render(request, 'import.html', {'table': table})
 
@@ -177,32 +164,15 @@ def import_create(request):
         # Finalize the import record submission
         if 'submit_record' in request.POST:
             print("Submitting import record form...")
-            import_items = request.session.get('import_items', {})
+            has_lines = DraftVoucher.lines_of(request.user, 'import').exists()
 
-            if not import_items:
+            if not has_lines:
                 import_record_form.add_error(None, "يرجى اضافة صنف واحد على الاقل قبل محاولة حفظ الاذن.")
 
-            if import_record_form.is_valid() and import_items:
-                import_record = import_record_form.save()
-                print("ImportRecord created successfully.")
-
-                # Save all items from the session to the ImportItem Table in DB
-                for asset_id, item_data in import_items.items():
-                    print(f"Creating ImportItem with asset_id: {asset_id}, price and quantity: {item_data}")
-                    asset = Asset.objects.get(id=asset_id)
-                    asset.add_price(item_data['price'])
-                    asset.stock += int(item_data['quantity'])
-                    asset.save()
-                    ImportItem.objects.create(
-                        record=import_record,
-                        asset_id=asset_id,
-                        quantity=item_data['quantity'],
-                        price=item_data['price']
-                    )
-                # Clear session data after submission
-                if 'import_items' in request.session:
-                    del request.session['import_items']
-                print("Cleared import items from session data after record creation.")
+            if import_record_form.is_valid() and has_lines:
+                # Save the record and all draft lines in one transaction, the draft is dropped with it
+                import_record = commit_import_record(import_record_form, DraftVoucher.for_user(request.user, 'import'))
+                logger.debug(f"ImportRecord created successfully with trans_id: {import_record.trans_id}")
 
                 # Redirect to success or summary page
                 messages.success(
@@ -215,24 +185,15 @@ def import_create(request):
                 print("Import record form is invalid.")
                 print(f"Form errors: {import_record_form.errors}")
 
-    # Prepare items with asset names for display
-    import_items = []
-    for asset_id, item_data  in request.session.get('import_items', {}).items():
-        asset = Asset.objects.get(id=asset_id)
-        import_items.append({
-            'id': asset_id,
-            'name': asset.name,
-            'quantity': item_data['quantity'],
-            'unit': asset.get_unit_display(),
-            'price': item_data['price'],
-            'total': float(item_data['price']) * int(item_data['quantity']),
-        })
+    # Prepare the draft lines with their asset names for display
+    import_items = [draft_line_info(line, 'import') for line in DraftVoucher.lines_of(request.user, 'import')]
 
     print(f"Rendering template with import_items: {import_items}")
     return render(request, 'invoice.html', {
         'import_record_form': import_record_form,
         'import_item_form': import_item_form,
         'import_items': import_items,
+        'draft_total': sum(item['total'] for item in import_items),
     })
 
 @login_required
@@ -243,16 +204,11 @@ def import_item_add(request):
     quantity = request.GET.get('quantity')
     price = request.GET.get('price')
 
-    if asset_id and price and quantity:
-        items = request.session.get('import_items', {})
-        items[asset_id] = {
-            'quantity': quantity,
-            'price': price,
-        }
-        request.session['import_items'] = items
-        print(f"Added item to session: {asset_id} -> {quantity} -> {price}")
-    else:
-        print("Asset ID or price or quantity missing.")
+    try:
+        add_draft_line(request.user, 'import', asset_id, quantity, price)
+        logger.debug(f"Added item to draft: {asset_id} -> {quantity} -> {price}")
+    except DraftLineError as error:
+        logger.debug(f"Item not added: {error}")
         print(f"requested:  {asset_id} -> {quantity} -> {price}")
 
     # Redirect back to the form page
@@ -261,51 +217,21 @@ def import_item_add(request):
 @login_required
 def import_item_delete(request, asset_id):
 
-    # Convert asset_id to string to match the session keys
-    asset_id = str(asset_id)
-
-    # Check if the item exists in the session
-    items = request.session.get('import_items', {})
-    if asset_id in items:
-        del items[asset_id]  # Remove the item
-        request.session['import_items'] = items  # Update the session
+    # Remove the line of this asset from the user's draft
+    deleted, _ = DraftVoucher.lines_of(request.user, 'import').filter(asset_id=asset_id).delete()
+    if deleted:
         print(f"Item with asset_id {asset_id} removed successfully!")
     else:
-        print(f"Item with asset_id {asset_id} not found in the session!")
+        logger.debug(f"Item with asset_id {asset_id} not found in the draft!")
 
     # Redirect back to the import_create page
     return redirect('import_create')
 
 
 def fetch_import_record_data(trans_id):
-    # Fetch the import record based on trans_id
-    import_record = get_object_or_404(ImportRecord, trans_id=trans_id)
-    # Prepare the record details
-    record_info = {
-        'trans_id': import_record.trans_id,
-        'date': import_record.date.strftime("%d-%m-%Y") if import_record.date else "N/A",
-        'company': import_record.company.name if import_record.company else "N/A",
-        'phone': import_record.company.phone if import_record.company else "N/A",
-        'address': import_record.company.address if import_record.company else "N/A",
-        'assign_id': import_record.assign_number or "N/A",
-        'assign_date': import_record.assign_date.strftime("%d-%m-%Y") if import_record.assign_date else "N/A",
-        'notes': import_record.notes or "N/A",
-    }
-
-    # Fetch related items
-    items = ImportItem.objects.filter(record=import_record)
-    item_details = []
-    for item in items:
-        item_details.append({
-            'name': str(item.asset.name),
-            'brand': str(item.asset.brand+' '+item.asset.brand_en),
-            'quantity': item.quantity,
-            'unit': str(item.asset.get_unit_display()),  # Fetch unit display from asset
-            'price': item.price,
-            'total_price': item.price * item.quantity,
-        })
-
-    record_info['items'] = item_details
+    # Fetch the import record with its company, items and assets in two queries
+    import_record = get_object_or_404(prefetched_import_records(), trans_id=trans_id)
+    record_info = import_record_info(import_record)
     print(f'fetched record info for Import Record No {trans_id} successfully')
     return record_info
 
@@ -325,128 +251,90 @@ def import_details(request, trans_id):
 #############################################################################
 
 @login_required
-def get_assets(request, category_id):
-    assets = Asset.objects.filter(category_id=category_id).values('id', 'name')
-    return JsonResponse({'assets': list(assets)})
+def get_assets(request, category_id=ALL_CATEGORIES):
+    return picker_response(request, picker_entry(category_id), grouped=category_id == ALL_CATEGORIES)
 
 @login_required
-def get_ex_assets(request, category_id):
-    assets = Asset.objects.filter(category_id=category_id, stock__gt=0).values('id', 'name')
-    return JsonResponse({'assets': list(assets)})
+def get_ex_assets(request, category_id=ALL_CATEGORIES):
+    return picker_response(request, picker_entry(category_id), in_stock=True, grouped=category_id == ALL_CATEGORIES)
+
+def picker_response(request, entry, **payload_options):
+    # Pickers revalidate on every use, an unchanged list is answered with 304 and no body
+    payload = picker_payload(entry, **payload_options)
+    etag = quote_etag(payload_etag(payload))
+    not_modified = get_conditional_response(request, etag=etag, last_modified=entry['modified'])
+    if not_modified is not None:
+        return not_modified
+    response = JsonResponse(payload)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(entry['modified'])
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required
 def gen_pdf(request, model, trans_id):
     if model == 'import':
         record_info = fetch_import_record_data(trans_id)
-        pdf_data = import_record_pdf(trans_id, record_info)
+        render_pdf = import_record_pdf
     elif model == 'export':
         record_info = fetch_export_record_data(trans_id)
-        pdf_data = export_record_pdf(trans_id, record_info)
+        render_pdf = export_record_pdf
     else:
         return HttpResponse("Invalid model type", status=400)
 
+    # Reprints of an unchanged record are answered from the browser or the PDF cache
+    fingerprint = record_fingerprint(model, trans_id, record_info)
+    etag = quote_etag(fingerprint)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    pdf_data = get_or_render(model, trans_id, fingerprint, lambda: render_pdf(trans_id, record_info))
+
     # Return the PDF as an HTTP response
     response = HttpResponse(pdf_data, content_type='application/pdf')
     response['Content-Disposition'] = f'inline; filename="{model}_record_{trans_id}.pdf"'
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
 
     return response
 
 
-def content_type_search(search_term, relevant_types):
-    """
-    Function to dynamically build a query for searching across related models using GenericForeignKey.
-
-    Args:
-        search_term (str): The search term to be used for filtering related models.
-        relevant_types (list): List of relevant content type model names (like 'department', 'subaffiliate', 'employee').
-
-    Returns:
-        Q: A Django Q object containing the built search queries for `GenericForeignKey`.
-    """
-    # Create a Q object for searching across all related models
-    search_queries = Q()
-    
-    # Get all ContentTypes related to the relevant models
-    content_types = ContentType.objects.filter(model__in=relevant_types)
-    
-    # Loop over content types and dynamically build search queries
-    for content_type in content_types:
-        model_class = content_type.model_class()  # Get the model class from content type
-        print(f"Processing content type: {content_type.model}")
-
-        # Check if the model has the 'name' or 'subname' field for searching
-        if model_class and hasattr(model_class, 'name'):
-            related_ids = model_class.objects.filter(name__icontains=search_term).values_list('id', flat=True)
-        elif model_class and hasattr(model_class, 'subname'):  # For SubAffiliate
-            related_ids = model_class.objects.filter(subname__icontains=search_term).values_list('id', flat=True)
-        
-        # Dynamically build the query for each model type based on entity_selection and entity_type
-        search_queries |= Q(entity_type=content_type) & Q(entity_id__in=related_ids)
-
-    return search_queries
-
 #############################################################################
 # Export Records Views
 #############################################################################
 
 @login_required
 def export_records(request):
-    if 'export_items' in request.session:
-        del request.session['export_items']
     # Fetch export types (e.g., from a database model)
     export_types = ExportRecord._meta.get_field('export_type').choices
     export_types_dict = {choice[0]: choice[1] for choice in export_types}
 
     # Get the selected export type from query parameters
     selected_export_type = request.GET.get('export_type')
-    relevant_types = ['department', 'subaffiliate', 'employee']  # Add your model names here
 
-    
-    # Generate tables for each export type
+    # One filtered query over every export type, the tabs only narrow it down
+    records = ExportRecord.objects.filter(export_records_query(request.GET))
+
+    # Record counts of every tab in a single aggregate, reused per filter until a record is written
+    export_counts = cached_query_value(records, 'export_counts', lambda: records.aggregate(
+        all=Count('trans_id'),
+        **{value: Count('trans_id', filter=Q(export_type=value)) for value, _ in export_types},
+    ))
+
     export_tables = {}
-    combined_records = ExportRecord.objects.none()  # Empty queryset to start with
-
-    for export_type_value, export_type_label in export_types:
-        query = Q(export_type=export_type_value)
-
-        if request.GET.get('trans_id'):
-            query &= Q(trans_id__icontains=request.GET['trans_id'])
-
-        # Check if there is a search term
-        if request.GET.get('search'):
-            search_term = request.GET.get('search', '')
-            # Call the reusable function to build the search query
-            search_queries = content_type_search(search_term, relevant_types)
-            other_fields = Q(items__name__icontains=search_term)
-            query &= (search_queries | other_fields)
-
-        if request.GET.get('start_date') and request.GET.get('end_date'):
-            query &= Q(date__range=[request.GET['start_date'], request.GET['end_date']])
-        elif request.GET.get('start_date'):
-            query &= Q(date__gte=request.GET['start_date'])
-        elif request.GET.get('end_date'):
-            query &= Q(date__lte=request.GET['end_date'])
-
-        records = ExportRecord.objects.filter(query).distinct()
-
-        # Only add the table if the export type matches the selected type or if no type is selected
-        if selected_export_type is None:
-            combined_records = combined_records | records  # Add to the combined queryset
-        elif selected_export_type == export_type_value:
-            table = ExportRecordTable(records)
-            RequestConfig(request, paginate={'per_page': 10}).configure(table)
-            export_tables[export_type_label] = table
-
-    # If no specific type is selected, create a single table for all records
     if selected_export_type is None:
-        all_table = ExportRecordTable(combined_records)
-        RequestConfig(request, paginate={'per_page': 10}).configure(all_table)
+        # If no specific type is selected, create a single table for all records
+        all_table = paginate_table(request, ExportRecordTable(records), ('-date', '-trans_id'))
         export_tables['None'] = all_table
+    elif selected_export_type in export_types_dict:
+        table = paginate_table(request, ExportRecordTable(records.filter(export_type=selected_export_type)), ('-date', '-trans_id'))
+        export_tables[export_types_dict[selected_export_type]] = table
 
     return render(request, 'export.html', {
         'export_types': export_types_dict,
         'export_tables': export_tables,
+        'export_counts': export_counts,
         'export_type': selected_export_type,  # Pass the selected export type to the template
     })
 
@@ -476,64 +364,42 @@ def export_create(request, export_type=None):
         if 'submit_record' in request.POST:
             print(f"Submitting export record form for {export_type}...")
 
-            export_items = request.session.get('export_items', {})
-            print(f"Export items from session: {export_items}")
+            has_lines = DraftVoucher.lines_of(request.user, 'export').exists()
 
-            if not export_items:
-                print("No export items found in session.")
+            if not has_lines:
+                logger.debug("No export items found in the draft.")
                 export_record_form.add_error(None, "يرجى اضافة صنف واحد على الاقل قبل محاولة حفظ الاذن.")
             
-            if export_record_form.is_valid() and export_items:
-                export_record = export_record_form.save(commit=False)
-                export_record.export_type = export_type  # Associate the export type with the record
-                export_record.save()
-                print(f"ExportRecord created successfully with trans_id: {export_record.trans_id}")
-
-                # Save all items from the session to the ExportItem Table in DB
-                for item_id, item_data in export_items.items():
-                    print(f"Creating ExportItem with asset_id: {item_id}, price: {item_data['price']}, quantity: {item_data['quantity']}")
-                    asset = Asset.objects.get(id=item_data['asset_id'])
-                    asset.stock -= int(item_data['quantity'])
-                    asset.save()
-                    ExportItem.objects.create(
-                        record=export_record,
-                        asset_id=item_data['asset_id'],
-                        quantity=item_data['quantity'],
-                    )
-
-                # Clear session data after submission
-                if 'export_items' in request.session:
-                    del request.session['export_items']
-                print("Cleared export items from session data after record creation.")
-
-                # Redirect to success or summary page
-                success_msg = f'تم اضافة اذن تصدير رقم: {export_record.trans_id} بنجاح. ' \
-                              f'<a href="{reverse("gen_pdf", kwargs={"model": "export", "trans_id": export_record.trans_id})}" target="_blank">طباعة اذن التصدير</a>'
-                print(f"Success message: {success_msg}")
-                messages.success(request, mark_safe(success_msg))
-                return redirect('export_records')
+            if export_record_form.is_valid() and has_lines:
+                try:
+                    # Save the record and all draft lines in one transaction, the draft is dropped with it
+                    export_record = commit_export_record(export_record_form, export_type, DraftVoucher.for_user(request.user, 'export'))
+                except InsufficientStock as error:
+                    # Nothing was saved, show which assets are short
+                    logger.debug(f"Export record rejected: {error}")
+                    export_record_form.add_error(None, str(error))
+                else:
+                    logger.debug(f"ExportRecord created successfully with trans_id: {export_record.trans_id}")
+
+                    # Redirect to success or summary page
+                    success_msg = f'تم اضافة اذن تصدير رقم: {export_record.trans_id} بنجاح. ' \
+                                  f'<a href="{reverse("gen_pdf", kwargs={"model": "export", "trans_id": export_record.trans_id})}" target="_blank">طباعة اذن التصدير</a>'
+                    logger.debug(f"Success message: {success_msg}")
+                    messages.success(request, mark_safe(success_msg))
+                    return redirect('export_records')
             else:
                 print("Export record form is invalid.")
                 print(f"Form errors: {export_record_form.errors}")
 
-    # Prepare items with asset names for display
-    export_items = []
-    for item_id, item_data in request.session.get('export_items', {}).items():
-        asset = Asset.objects.get(id=item_data['asset_id'])
-        export_items.append({
-            'id': item_id,
-            'name': asset.name,
-            'quantity': item_data['quantity'],
-            'unit': asset.get_unit_display(),
-            'price': item_data['price'],
-            'total': float(item_data['price']) * int(item_data['quantity']),
-        })
+    # Prepare the draft lines with their asset names for display
+    export_items = [draft_line_info(line, 'export') for line in DraftVoucher.lines_of(request.user, 'export')]
 
     print(f"Rendering template with export_items: {export_items}")
     return render(request, 'xinvoice.html', {
         'export_record_form': export_record_form,
         'export_item_form': export_item_form,
         'export_items': export_items,
+        'draft_total': sum(item['total'] for item in export_items),
         'export_type': export_type,
         'export_types': export_types_dict,
     })
@@ -544,87 +410,63 @@ def export_item_add(request, export_type):
     asset_id = request.GET.get('asset')
     quantity = request.GET.get('quantity')
 
-    # Fetch asset details
-    if asset_id:
-        try:
-            asset = Asset.objects.get(id=asset_id)
-            price = asset.average_price()  # Use the average price from the Asset model
-        except Asset.DoesNotExist:
-            print(f"Asset with ID {asset_id} does not exist.")
-            return redirect('export_create', export_type=export_type)
-    else:
-        print("Asset ID is missing.")
-        return redirect('export_create', export_type=export_type)
-
-    if price is None:
-        print(f"Asset with ID {asset_id} does not have an average price.")
-        return redirect('export_create', export_type=export_type)
-
-    if quantity:
-        
-        # Retrieve existing items or initialize
-        items = request.session.get('export_items', {})
-        item_id = max([int(key) for key in items.keys()], default=0) + 1
-        # Add the new item with a unique ID
-        items[item_id] = {
-            'asset_id': asset_id,
-            'quantity': quantity,
-            'price': str(price),
-        }
-        
-        # Save back to session
-        request.session['export_items'] = items
-        print(f"Added item to session: {item_id} -> {asset_id} -> {quantity} -> {price}")
-    else:
-        print("Quantity is missing.")
-        print(f"Requested: {asset_id} -> {quantity} -> {price}")
+    try:
+        line, _ = add_draft_line(request.user, 'export', asset_id, quantity)
+        logger.debug(f"Added item to draft: {line.id} -> {asset_id} -> {quantity} -> {line.price}")
+    except DraftLineError as error:
+        logger.debug(f"Item not added: {error}")
+        logger.debug(f"Requested: {asset_id} -> {quantity}")
 
     # Redirect back to the form page
     return redirect('export_create', export_type=export_type)
 
 @login_required
 def export_item_delete(request, export_type, item_id):
-    # Check if the item exists in the session
-    items = request.session.get('export_items', {})
-    if item_id in items:
-        del items[item_id]  # Remove the item
-        request.session['export_items'] = items  # Update the session
+    # Remove the line from the user's draft
+    deleted, _ = DraftVoucher.lines_of(request.user, 'export').filter(id=item_id).delete()
+    if deleted:
         print(f"Item with ID {item_id} removed successfully!")
     else:
-        print(f"Item with ID {item_id} not found in the session!")
+        logger.debug(f"Item with ID {item_id} not found in the draft!")
 
     # Redirect back to the export_create page
     return redirect('export_create', export_type=export_type)
 
 
-def fetch_export_record_data(trans_id):
-    # Fetch the import record based on trans_id
-    export_record = get_object_or_404(ExportRecord, trans_id=trans_id)
-    # Prepare the record details
-    record_info = {
-        'trans_id': export_record.trans_id,
-        'date': export_record.date.strftime("%d-%m-%Y") if export_record.date else "N/A",
-        'entity': export_record.entity_selection.name if export_record.entity_selection else "N/A",
-        'notes': export_record.notes or "N/A",
-        'export_type': export_record.get_export_type_display(),
-        'xp_type': export_record.export_type
-    }
+@login_required
+@require_POST
+def draft_line_add(request, kind):
+    # Adds a line to the user's draft and answers with that line and the new totals, for the page to patch in place
+    if kind not in CART_KINDS:
+        return JsonResponse({'error': "Invalid draft type"}, status=404)
+    try:
+        line, replaced = add_draft_line(request.user, kind, request.POST.get('asset'), request.POST.get('quantity'), request.POST.get('price'))
+    except DraftLineError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    return JsonResponse({
+        'line': draft_line_info(line, kind),
+        'replaced': replaced,
+        'totals': draft_totals(request.user, kind),
+    })
+
+@login_required
+@require_POST
+def draft_line_delete(request, kind, line_id):
+    if kind not in CART_KINDS:
+        return JsonResponse({'error': "Invalid draft type"}, status=404)
+    deleted, _ = DraftVoucher.lines_of(request.user, kind).filter(id=line_id).delete()
+    if not deleted:
+        return JsonResponse({'error': "الصنف غير موجود بالاذن."}, status=404)
+    return JsonResponse({
+        'deleted': line_id,
+        'totals': draft_totals(request.user, kind),
+    })
 
-    # Fetch related items
-    items = ExportItem.objects.filter(record=export_record)
-    item_details = []
-    for item in items:
-        item_details.append({
-            'id': item.id,
-            'name': str(item.asset.name),
-            'brand': str(item.asset.brand+' '+item.asset.brand_en),
-            'quantity': item.quantity,
-            'unit': str(item.asset.get_unit_display()),  # Fetch unit display from asset
-            'price': item.asset.average_price(),
-            'total_price': item.asset.average_price() * item.quantity,
-        })
 
-    record_info['items'] = item_details
+def fetch_export_record_data(trans_id):
+    # Fetch the export record with its items and assets in two queries
+    export_record = get_object_or_404(prefetched_export_records(), trans_id=trans_id)
+    record_info = export_record_info(export_record)
     print(f'fetched record info for Export Record No {trans_id} successfully')
     return record_info
 
@@ -712,7 +554,7 @@ def return_records(request):
 
     # Filter by asset name
     if asset_name:
-        query &= Q(asset__name__icontains=asset_name)
+        query &= search_query('asset__search_text', asset_name)
 
     # Filter by date range
     if start_date and end_date:
@@ -723,9 +565,8 @@ def return_records(request):
         query &= Q(return_at__lte=end_date)
 
     # Fetch the filtered ExportItem records
-    returned_items = ExportItem.objects.filter(query).distinct().order_by('-return_at')
-    table = ExportReturnTable(returned_items)
-    RequestConfig(request, paginate={'per_page': 10}).configure(table)
+    returned_items = ExportItem.objects.filter(query)
+    table = paginate_table(request, ExportReturnTable(returned_items), ('-return_at', '-id'))
 
     return render(request, 'returns.html', {
         'table': table,
@@ -759,11 +600,11 @@ def return_create(request, return_type=None):
         if 'submit_record' in request.POST:
             print(f"Submitting return record form for {return_type}...")
 
-            return_items = request.session.get('return_items', {})
-            print(f"Return items from session: {return_items}")
+            return_items = list(DraftVoucher.lines_of(request.user, 'return'))
+            logger.debug(f"Return items in the draft: {len(return_items)}")
 
             if not return_items:
-                print("No return items found in session.")
+                logger.debug("No return items found in the draft.")
                 return_record_form.add_error(None, "يرجى اضافة صنف واحد على الاقل قبل محاولة حفظ الاذن.")
 
             if return_record_form.is_valid() and return_items:
@@ -777,42 +618,43 @@ def return_create(request, return_type=None):
                 model = ExportItem if return_type == 'export' else ImportItem
                 
                 # Save return items to the database
-                for item_id, item_data in return_items.items():
-                    model = ExportItem if return_type == 'export' else ImportItem
-                    print(f"Updating {model.__name__} with ID {item_id}, marking it as returned.")
-                    item = model.objects.get(id=item_id)
+                items = model.objects.in_bulk([line.item_id for line in return_items])
+                for line in return_items:
+                    logger.debug(f"Updating {model.__name__} with ID {line.item_id}, marking it as returned.")
+                    item = items[line.item_id]
                     item.return_at = timezone.now()
-                    item.return_purpose = item_data['purpose']
-                    item.return_condition = item_data['condition']
+                    item.return_purpose = line.purpose
+                    item.return_condition = line.condition
                     item.return_id = new_return_id  # Assign the same return_id to the returned items
                     item.save()
 
-                # Clear session data after submission
-                if 'return_items' in request.session:
-                    del request.session['return_items']
-                print("Cleared return items from session data after record creation.")
+                # Drop the draft now that its lines are returned
+                DraftVoucher.objects.filter(user=request.user, kind='return').delete()
+                logger.debug("Cleared the return draft after record creation.")
 
                 # Redirect with success message
                 success_msg = f'تم اضافة اذن ارجاع رقم: {return_record.trans_id} بنجاح.'
-                print(f"Success message: {success_msg}")
+                logger.debug(f"Success message: {success_msg}")
                 messages.success(request, mark_safe(success_msg))
                 return redirect('return_records')
 
     # Prepare return items for display
     return_items = []
     model = ExportItem if return_type == 'export' else ImportItem
-    for item_id, item_data in request.session.get('return_items', {}).items():
-        try:
-            item = model.objects.get(id=item_id)
-            return_items.append({
-                'id': item_id,
-                'name': item.asset.name,
-                'quantity': item.quantity,
-                'purpose': item_data['purpose'],
-                'condition': item_data['condition'],
-            })
-        except model.DoesNotExist:
-            print(f"{model.__name__} with ID {item_id} does not exist, skipping.")
+    lines = list(DraftVoucher.lines_of(request.user, 'return'))
+    items = model.objects.select_related('asset').in_bulk([line.item_id for line in lines])
+    for line in lines:
+        item = items.get(line.item_id)
+        if item is None:
+            logger.debug(f"{model.__name__} with ID {line.item_id} does not exist, skipping.")
+            continue
+        return_items.append({
+            'id': line.item_id,
+            'name': item.asset.name,
+            'quantity': item.quantity,
+            'purpose': line.purpose,
+            'condition': line.condition,
+        })
 
     print(f"Rendering template with return_items: {return_items}")
     return render(request, 'return_create.html', {
@@ -840,26 +682,23 @@ def return_item_add(request, return_type):
         print(f"ExportItem with ID {item_id} does not exist.")
         return redirect('return_create', return_type=return_type)
 
-    # Update session data with the new return item
-    items = request.session.get('return_items', {})
-    items[item_id] = {
+    # An item is returned once, adding it again replaces its line
+    draft = DraftVoucher.for_user(request.user, 'return')
+    DraftLine.objects.update_or_create(draft=draft, item_id=export_item.id, defaults={
         'purpose': purpose or "N/A",
         'condition': condition or "N/A",
-    }
-    request.session['return_items'] = items
-    print(f"Added return item to session: {item_id} -> {items[item_id]}")
+    })
+    logger.debug(f"Added return item to draft: {item_id} -> {purpose} -> {condition}")
 
     return redirect('return_create', return_type=return_type)
 
 @login_required
 def return_item_delete(request, return_type, item_id):
-    items = request.session.get('return_items', {})
-    if item_id in items:
-        del items[item_id]  # Remove the item from session
-        request.session['return_items'] = items
-        print(f"Removed return item with ID {item_id} from session.")
+    deleted, _ = DraftVoucher.lines_of(request.user, 'return').filter(item_id=item_id).delete()
+    if deleted:
+        logger.debug(f"Removed return item with ID {item_id} from the draft.")
     else:
-        print(f"Return item with ID {item_id} not found in session.")
+        logger.debug(f"Return item with ID {item_id} not found in the draft.")
 
     return redirect('return_create', return_type=return_type)
 
@@ -882,7 +721,8 @@ def report_view(request):
         'loan':'الاعارات',
         'cars': 'السيارات',
         'damaged': 'التوالف',
-        'consumed': 'المستهلكات'
+        'consumed': 'المستهلكات',
+        'analytics': 'تحليل المخزون',
     }
     # Handle form submissions
     if request.method == 'POST' and 'report_initial' in request.POST:
@@ -911,6 +751,17 @@ def report_view(request):
                 'year': year,
                 'report_types': report_types_dict,  # Pass available report types to the template for tabs
             })
+        elif selected_type == "analytics":
+            # Consumption, turnover, prices and stock-out forecasts of the year, computed on movement frames
+            analytics = stock_analytics(int(year))
+            return render(request, 'report.html', {
+                'form': ReportForm(initial={'year': year}),
+                'analytics_table': StockAnalyticsTable(analytics['assets']),
+                'analytics': analytics,
+                'selected_type': selected_type,
+                'year': year,
+                'report_types': report_types_dict,
+            })
     elif request.method == 'POST' and 'report_confirm' in request.POST:
         # Handle the final confirmation and saving committee members
         year = request.POST.get('year')
@@ -933,7 +784,7 @@ def report_view(request):
         if form.is_valid():
             form.save()
             messages.success(request, f"Report for {year} was bgenerated successfully.")
-            members = Employee.objects.filter(id__in=members_id)
+            members = form.cleaned_data['members']  # Without the president
             president = Employee.objects.get(id=president_id)
             final_report_data = {
                 "type": "inventory",
@@ -956,83 +807,17 @@ def report_view(request):
     })
 
 
-def report_inventory(end_date):
-    # Initialize an empty list to store asset data
-    assets_data = []
-
-    # Fetch all assets
-    assets = Asset.objects.all()
-
-    for asset in assets:
-        # Initialize the asset data dictionary
-        asset_data = {
-            'id': asset.id,
-            'category': asset.category.name,
-            'name': asset.name,
-            'brand': f"{asset.brand} {asset.brand_en}",  # Combine brand and brand_en
-            'unit': asset.unit,
-            'stock': asset.stock,
-            'average_price': asset.average_price(),  # Apply the average_price method
-            'net_quantity': 0,  # Will be calculated
-            'differences': [],  # To store differences over time
-        }
-
-        # Fetch related import records with date filtering
-        import_items = ImportItem.objects.filter(asset=asset, record__date__lte=end_date).select_related('record')
-        export_items = ExportItem.objects.filter(asset=asset, record__date__lte=end_date).select_related('record')
-
-        # Combine imports and exports into a timeline
-        timeline = []
-
-        for import_item in import_items:
-            timeline.append({
-                'type': 'import',
-                'date': import_item.record.date.strftime('%Y-%m-%d'),  # Convert date to string
-                'quantity': import_item.quantity,
-            })
-        for export_item in export_items:
-            timeline.append({
-                'type': 'export',
-                'date': export_item.record.date.strftime('%Y-%m-%d'),  # Convert date to string
-                'quantity': export_item.quantity,
-            })
-        # Sort the timeline by date
-        timeline.sort(key=lambda x: x['date'])
-
-        # Calculate differences over time
-        running_total = 0
-        for entry in timeline:
-            if entry['type'] == 'import':
-                running_total += entry['quantity']
-            elif entry['type'] == 'export':
-                running_total -= entry['quantity']
-            # Record the difference at each step
-            asset_data['differences'].append({
-                'date': entry['date'],
-                'type': entry['type'],
-                'quantity': entry['quantity'],
-                'running_total': running_total,
-            })
-
-        # Calculate total imports, exports, and net quantity
-        total_imports = sum(item.quantity for item in import_items)
-        total_exports = sum(item.quantity for item in export_items)
-        asset_data['net_quantity'] = total_imports - total_exports
-
-        # Add the asset data to the list
-        assets_data.append(asset_data)
-
-    sorted_assets_data = sorted(assets_data, key=lambda x: (x['category'], x['id']))
-
-    return sorted_assets_data
-
-
 @login_required
 def report_pdf(request):
     final_report_data = request.session.get('final_report_data')
 
     if final_report_data['type'] == 'inventory':
-        pdf_data = inventory_pdf(final_report_data)
+        # Rendering a large inventory takes a while, so it is left to the PDF worker.
+        # The items are rebuilt by the worker, only the report header is queued.
+        params = {key: value for key, value in final_report_data.items() if key != 'items'}
+        job = enqueue_pdf_job('inventory', params, request.user)
+        logger.debug(f'Inventory PDF queued as job {job.id}.')
+        return pdf_job_response(request, job)
 
     elif final_report_data['type'] == 'department':
         pdf_data = department_pdf(final_report_data)
@@ -1061,3 +846,45 @@ def report_pdf(request):
 
     return response
 
+
+@login_required
+def batch_vouchers(request, model):
+    # Queue every voucher matching the record listing filters as one PDF or a ZIP
+    batch_format = request.GET.get('format', 'pdf')
+    if model not in VOUCHER_RENDERERS or batch_format not in BATCH_FORMATS:
+        return HttpResponse("Invalid batch request", status=400)
+
+    filters = {key: request.GET.get(key, '') for key in BATCH_FILTERS}
+    job = enqueue_pdf_job('vouchers', {'model': model, 'format': batch_format, 'filters': filters}, request.user)
+    logger.debug(f'{model} vouchers batch queued as job {job.id}.')
+    return pdf_job_response(request, job)
+
+
+def pdf_job_response(request, job):
+    """Answer a queued job with its id for XHR callers, or the page that waits for it."""
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse(job_payload(job), status=202)
+    return render(request, 'pdf_job.html', {'job': job_payload(job)})
+
+
+def _user_pdf_job(request, job_id):
+    """Fetch a PDF job, staff may see every job while others only see their own."""
+    jobs = PdfJob.objects.all()
+    if not request.user.is_staff:
+        jobs = jobs.filter(created_by=request.user)
+    return get_object_or_404(jobs, id=job_id)
+
+
+@login_required
+def pdf_job_status(request, job_id):
+    job = _user_pdf_job(request, job_id)
+    return JsonResponse(job_payload(job))
+
+
+@login_required
+def pdf_job_download(request, job_id):
+    job = _user_pdf_job(request, job_id)
+    if job.status != 'Done':
+        return JsonResponse(job_payload(job), status=409)
+    # PDFs open in the browser, archives are downloaded
+    return FileResponse(job.file.open('rb'), filename=job.filename, as_attachment=not job.filename.endswith('.pdf'))
@@ -0,0 +1,309 @@
+#############################################################################
+# Activity Log Libraries
+#############################################################################
+import atexit
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from storage.search import normalize_search
+from .models import UserActivityLog
+
+#############################################################################
+logger = logging.getLogger('users')
+#############################################################################
+# Redis list holding the queued events when the buffer is shared through Redis
+REDIS_QUEUE_KEY = 'activity_log:queue'
+# Suffix of a spool file claimed by a replay
+REPLAYING_SUFFIX = '.replaying'
+
+#############################################################################
+# Events
+#############################################################################
+
+def get_client_ip(request):
+    """Extract client IP address from request."""
+    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(",")[0]
+    else:
+        ip = request.META.get("REMOTE_ADDR")
+    return ip
+
+
+def activity_event(action, user=None, request=None, model_name=None, object_id=None, number=None, changes=None):
+    """A log entry as a JSON-ready dict, stamped with the time of the action rather than of its write."""
+    if user is None and request is not None:
+        user = getattr(request, 'user', None)
+    return {
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        'action': action,
+        'model_name': model_name,
+        'object_id': object_id,
+        'number': number,
+        'changes': changes,
+        'ip_address': get_client_ip(request) if request is not None else None,
+        'user_agent': request.META.get("HTTP_USER_AGENT", "") if request is not None else None,
+        'timestamp': timezone.now().isoformat(),
+    }
+
+
+def write_events(events):
+    """
+    Insert events in one bulk_create.
+
+    Users deleted since their event was queued are left out of the entry, as
+    the foreign key would do on delete, instead of failing the whole batch.
+    """
+    user_ids = {event['user_id'] for event in events if event['user_id'] is not None}
+    existing = set(get_user_model().objects.filter(pk__in=user_ids).values_list('pk', flat=True)) if user_ids else set()
+    UserActivityLog.objects.bulk_create([
+        UserActivityLog(**dict(
+            event,
+            user_id=event['user_id'] if event['user_id'] in existing else None,
+            timestamp=parse_datetime(event['timestamp']),
+            search_text=normalize_search(event['number'], event['user_agent']),
+        ))
+        for event in events
+    ])
+
+#############################################################################
+# Buffers
+#############################################################################
+
+class MemoryBuffer:
+    """Events queued in this process."""
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def push(self, event):
+        with self.lock:
+            self.events.append(event)
+            return len(self.events)
+
+    def take(self, limit):
+        with self.lock:
+            batch = self.events[:limit]
+            del self.events[:limit]
+            return batch
+
+
+class RedisBuffer:
+    """
+    Events queued in a Redis list shared by every process.
+
+    Queued events survive a crash of the process that logged them. When Redis
+    cannot be reached they are kept in this process instead.
+    """
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+        self.redis = get_redis_connection('default')
+        self.fallback = MemoryBuffer()
+
+    def push(self, event):
+        try:
+            return self.redis.rpush(REDIS_QUEUE_KEY, json.dumps(event))
+        except Exception:
+            logger.warning("Activity log queue unavailable, keeping the event in process.", exc_info=True)
+            return self.fallback.push(event)
+
+    def take(self, limit):
+        batch = self.fallback.take(limit)
+        if len(batch) < limit:
+            try:
+                pipeline = self.redis.pipeline()
+                pipeline.lrange(REDIS_QUEUE_KEY, 0, limit - len(batch) - 1)
+                pipeline.ltrim(REDIS_QUEUE_KEY, limit - len(batch), -1)
+                queued, _ = pipeline.execute()
+            except Exception:
+                # The events kept in process are written now, the queue waits for Redis
+                logger.warning("Activity log queue unavailable, writing the events kept in process.", exc_info=True)
+                return batch
+            batch += [json.loads(event) for event in queued]
+        return batch
+
+
+BUFFERS = {
+    'memory': MemoryBuffer,
+    'redis': RedisBuffer,
+}
+
+#############################################################################
+# Writer
+#############################################################################
+
+class ActivityLogWriter:
+    """
+    Queue activity events and write them in batches off the request path.
+
+    A background thread flushes the buffer every `interval` seconds, or as soon
+    as `batch_size` events are waiting. A batch that cannot be written is
+    spooled to disk, see spool_events.
+    """
+
+    def __init__(self, buffer='memory', batch_size=100, interval=5.0, background=True):
+        self.buffer_class = BUFFERS[buffer]
+        self.buffer = self.buffer_class()
+        self.batch_size = batch_size
+        self.interval = interval
+        self.background = background
+        self.wake = threading.Event()
+        self.flush_lock = threading.Lock()
+        self.pid = None
+
+    def push(self, event):
+        if self.pid != os.getpid():
+            self._start()
+        if self.buffer.push(event) >= self.batch_size:
+            self.wake.set()
+
+    def _start(self):
+        # A forked worker starts with its own buffer and thread, the parent's are not its own
+        if self.pid is not None:
+            self.buffer = self.buffer_class()
+            self.wake = threading.Event()
+        self.pid = os.getpid()
+        if self.background:
+            threading.Thread(target=self._run, name='activity-log-writer', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.interval)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Activity log flush failed.")
+
+    def flush(self):
+        """Write every queued event and return how many were written."""
+        written = 0
+        with self.flush_lock:
+            if self.background:
+                close_old_connections()  # The writer thread keeps its own connection
+            while True:
+                batch = self.buffer.take(self.batch_size)
+                if not batch:
+                    break
+                try:
+                    write_events(batch)
+                    written += len(batch)
+                except Exception:
+                    logger.exception("Could not write %d activity log events, spooling them.", len(batch))
+                    spool_events(batch)
+        return written
+
+
+class ImmediateActivityLogWriter(ActivityLogWriter):
+    """A writer without a background thread, writing each event as it is pushed."""
+
+    def __init__(self):
+        super().__init__(batch_size=1, background=False)
+
+    def push(self, event):
+        super().push(event)
+        self.flush()
+
+
+_writer = None
+
+
+def get_writer():
+    """The process-wide writer configured by the ACTIVITY_LOG_* settings."""
+    global _writer
+    if _writer is None:
+        if not settings.ACTIVITY_LOG_BACKGROUND:
+            _writer = ImmediateActivityLogWriter()
+        else:
+            _writer = ActivityLogWriter(
+                buffer=settings.ACTIVITY_LOG_BUFFER,
+                batch_size=settings.ACTIVITY_LOG_BATCH_SIZE,
+                interval=settings.ACTIVITY_LOG_FLUSH_INTERVAL,
+            )
+    return _writer
+
+
+def log_activity(action, user=None, request=None, model_name=None, object_id=None, number=None, changes=None):
+    """Queue an activity log entry, it is written with the next batch."""
+    get_writer().push(activity_event(action, user, request, model_name, object_id, number, changes))
+
+#############################################################################
+# Durable Fallback
+#############################################################################
+
+def spool_events(events):
+    """Append events that could not be written to a spool file, replayed by flush_activity_log."""
+    os.makedirs(settings.ACTIVITY_LOG_SPOOL_DIR, exist_ok=True)
+    path = os.path.join(settings.ACTIVITY_LOG_SPOOL_DIR, f"activity-{os.getpid()}-{time.time_ns()}.jsonl")
+    with open(path, 'w', encoding='utf-8') as spool:
+        spool.writelines(json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+        spool.flush()
+        os.fsync(spool.fileno())
+    return path
+
+
+def replay_spool(batch_size=500):
+    """
+    Write the spooled events and delete their files, returning how many were written.
+
+    A file is claimed by renaming it first, so concurrent replays never write
+    the same events twice. Its batches are written in one transaction, so a
+    file that still cannot be written is put back with none of it kept.
+    """
+    spool_dir = settings.ACTIVITY_LOG_SPOOL_DIR
+    if not os.path.isdir(spool_dir):
+        return 0
+    written = 0
+    for name in sorted(os.listdir(spool_dir)):
+        if not name.endswith('.jsonl'):
+            continue
+        path = os.path.join(spool_dir, name)
+        claimed = path + REPLAYING_SUFFIX
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            continue  # Claimed by another replay
+        try:
+            with open(claimed, encoding='utf-8') as spool:
+                events = [json.loads(line) for line in spool if line.strip()]
+            with transaction.atomic():
+                for start in range(0, len(events), batch_size):
+                    write_events(events[start:start + batch_size])
+        except Exception:
+            os.rename(claimed, path)
+            raise
+        os.remove(claimed)
+        written += len(events)
+    return written
+
+
+def install_shutdown_flush():
+    """
+    Flush the queued events when the process exits.
+
+    Runs at interpreter exit, and on SIGTERM when no other handler is set, as
+    the default action would end the process without running exit handlers.
+    """
+    def flush_on_exit():
+        if _writer is not None and _writer.pid == os.getpid():
+            _writer.flush()
+
+    atexit.register(flush_on_exit)
+
+    if threading.current_thread() is threading.main_thread() and signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+        def terminate(signum, frame):
+            flush_on_exit()
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, terminate)
@@ -26,4 +26,11 @@ class UsersConfig(AppConfig):
 
     def ready(self):
         from django.contrib.auth.models import Permission
-        Permission.add_to_class('__str__', custom_permission_str)
\ No newline at end of file
+        Permission.add_to_class('__str__', custom_permission_str)
+        from . import signals  # Registers the login and logout log handlers
+        from django.conf import settings
+        if settings.ACTIVITY_LOG_BACKGROUND:
+            from .activity import install_shutdown_flush
+            install_shutdown_flush()
+        from .audit import connect_audit_signals
+        connect_audit_signals()
\ No newline at end of file
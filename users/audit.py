@@ -0,0 +1,176 @@
+#############################################################################
+# Model Audit Libraries
+#############################################################################
+import contextvars
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.expressions import Combinable
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import post_delete, post_init, post_save
+from .activity import activity_event, get_writer
+
+#############################################################################
+# Audited models and the fields left out of their diffs, on top of the
+# fields every model leaves out: derived columns and write timestamps
+AUDITED_MODELS = {
+    'storage.ImportRecord': (),
+    'storage.ExportRecord': ('entity_kind',),
+    'storage.Asset': ('price_history', 'price_count', 'price_sum', 'price_counts', 'price_median'),
+    'core.Company': (),
+    'core.Department': (),
+    'core.Affiliate': (),
+    'core.SubAffiliate': (),
+    'core.Employee': (),
+}
+UNAUDITED_FIELDS = {'search_text', 'entity_search', 'created_at', 'updated_at'}
+# Models whose str() follows a relation, with the relation and the field they are
+# labelled by instead when the related row is not loaded
+LABEL_FIELDS = {
+    'core.SubAffiliate': ('affiliate', 'subname'),
+}
+
+# Field values of an instance as loaded, kept on the instance under this name
+SNAPSHOT_ATTR = '_audit_snapshot'
+
+# Entries captured by the current request, see AuditMiddleware
+_request_audit = contextvars.ContextVar('request_audit', default=None)
+
+#############################################################################
+# Capture
+#############################################################################
+
+def _audited_fields(model):
+    excluded = UNAUDITED_FIELDS.union(AUDITED_MODELS[model._meta.label])
+    return [field.attname for field in model._meta.concrete_fields if not field.primary_key and field.name not in excluded]
+
+
+def _json_value(value):
+    """A field value as it is stored in the JSON diff."""
+    if value is None or isinstance(value, (str, int, float, bool, list, dict)):
+        return value
+    try:
+        return DjangoJSONEncoder().default(value)
+    except TypeError:
+        return str(value)
+
+
+def _snapshot(instance, values):
+    """The audited values among values, deferred fields are left out and files stand for their names."""
+    return {
+        attname: values[attname].name if isinstance(values[attname], FieldFile) else values[attname]
+        for attname in instance._audit_fields if attname in values and not isinstance(values[attname], Combinable)
+    }
+
+
+def take_snapshot(sender, instance, **kwargs):
+    """
+    Keep the values an instance was loaded with, so a save is diffed without reading the old row.
+
+    Only the instance's attributes are copied, by reference: assigning a field
+    replaces its value rather than changing it. The audited values are picked
+    out when the instance is saved, so instances that are only read cost a
+    single dict copy.
+    """
+    setattr(instance, SNAPSHOT_ATTR, instance.__dict__.copy())
+
+
+def capture_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return  # Fixtures are not user actions
+    before = _snapshot(instance, getattr(instance, SNAPSHOT_ATTR, {}))
+    after = _snapshot(instance, instance.__dict__)
+    if created:
+        changes = {attname: [None, _json_value(value)] for attname, value in after.items() if value not in (None, '')}
+    else:
+        changes = {
+            attname: [_json_value(before[attname]), _json_value(value)]
+            for attname, value in after.items() if attname in before and before[attname] != value
+        }
+        if not changes:
+            return  # Saved without changes
+    setattr(instance, SNAPSHOT_ATTR, after)
+    _capture(instance, 'CREATE' if created else 'UPDATE', changes)
+
+
+def capture_delete(sender, instance, **kwargs):
+    _capture(instance, 'DELETE', None)
+
+
+def _label(instance):
+    """The document number of an entry, str(instance) unless that would read a related row."""
+    label_field = LABEL_FIELDS.get(instance._meta.label)
+    if label_field is not None:
+        relation, field = label_field
+        if not instance._meta.get_field(relation).is_cached(instance):
+            return getattr(instance, field)
+    return str(instance)
+
+
+def _capture(instance, action, changes):
+    """Record the entry once the write is committed, nothing is kept for a rolled back write."""
+    context = _request_audit.get()
+    event = activity_event(
+        action,
+        request=context['request'] if context else None,
+        model_name=str(instance._meta.verbose_name),
+        object_id=instance.pk,
+        number=_label(instance)[:50],
+        changes=changes,
+    )
+    key = (instance._meta.label, instance.pk)
+    if context is not None:
+        transaction.on_commit(lambda: _merge(context['events'], key, event))
+    else:
+        transaction.on_commit(lambda: get_writer().push(event))
+
+
+def _merge(events, key, event):
+    """Fold the writes of one object in a request into one entry."""
+    previous = events.get(key)
+    if previous is None or event['action'] == 'DELETE':
+        events[key] = event
+        return
+    changes = dict(previous['changes'] or {})
+    for attname, (old, new) in (event['changes'] or {}).items():
+        changes[attname] = [changes[attname][0] if attname in changes else old, new]
+    if previous['action'] == 'UPDATE':
+        changes = {attname: change for attname, change in changes.items() if change[0] != change[1]}
+    events[key] = dict(event, action=previous['action'], changes=changes)
+
+#############################################################################
+# Request Scope
+#############################################################################
+
+def begin_request_audit(request):
+    """Collect the entries of the writes made while handling a request."""
+    return _request_audit.set({'request': request, 'events': {}})
+
+
+def end_request_audit(token):
+    """Queue the entries of the request for the activity log writer, written together in a batch."""
+    context = _request_audit.get()
+    _request_audit.reset(token)
+    writer = get_writer()
+    for event in context['events'].values():
+        if event['action'] != 'UPDATE' or event['changes']:
+            writer.push(event)
+
+
+def connect_audit_signals():
+    """Connect the capture handlers to every audited model."""
+    for label in AUDITED_MODELS:
+        model = apps.get_model(label)
+        model._audit_fields = _audited_fields(model)
+        post_init.connect(take_snapshot, sender=model, dispatch_uid=f'audit_snapshot_{label}')
+        post_save.connect(capture_save, sender=model, dispatch_uid=f'audit_save_{label}')
+        post_delete.connect(capture_delete, sender=model, dispatch_uid=f'audit_delete_{label}')
+
+
+def disconnect_audit_signals():
+    """Stop capturing writes, the counterpart of connect_audit_signals."""
+    for label in AUDITED_MODELS:
+        model = apps.get_model(label)
+        post_init.disconnect(sender=model, dispatch_uid=f'audit_snapshot_{label}')
+        post_save.disconnect(sender=model, dispatch_uid=f'audit_save_{label}')
+        post_delete.disconnect(sender=model, dispatch_uid=f'audit_delete_{label}')
@@ -6,6 +6,8 @@ from crispy_forms.helper import FormHelper
 from crispy_forms.layout import Layout, Row, Column, Field, HTML
 from django.db.models import Q
 from .models import UserActivityLog
+from .retention import activity_years
+from .search import search_activity
 
 User = get_user_model()  # Use custom user model
 
@@ -71,9 +73,8 @@ class UserActivityLogFilter(django_filters.FilterSet):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         
-        # Fetch distinct years dynamically
-        years = UserActivityLog.objects.dates('timestamp', 'year').distinct()
-        self.filters['year'].extra['choices'] = [(year.year, year.year) for year in years]
+        # Years of the log, from the cached year of its oldest entry
+        self.filters['year'].extra['choices'] = [(year, year) for year in activity_years()]
 
         self.filters['year'].field.widget.attrs.update({
             'onchange': 'this.form.submit();'
@@ -103,18 +104,9 @@ class UserActivityLogFilter(django_filters.FilterSet):
 
     def filter_keyword(self, queryset, name, value):
         """
-        Filter the queryset by matching the keyword in username, email, phone, and occupation.
+        Filter the log by an IP address or network, an action, a section, a user, or a document number.
         """
-        return queryset.filter(
-            Q(user__username__icontains=value) |
-            Q(user__email__icontains=value) |
-            Q(user__profile__phone__icontains=value) |
-            Q(user__profile__occupation__icontains=value) |
-            Q(action__icontains=value) |
-            Q(model_name__icontains=value) |
-            Q(number__icontains=value) |
-            Q(ip_address__icontains=value)
-        )
+        return search_activity(queryset, value)
 
 
 
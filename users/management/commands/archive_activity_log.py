@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from users.retention import archive_expired, rollup_pending
+
+
+class Command(BaseCommand):
+    help = "Rolls up the activity log per day, user and action, then archives the months older than the retention."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=settings.ACTIVITY_LOG_RETENTION_DAYS, help="Days of entries kept in the database.")
+        parser.add_argument('--rollup-only', action='store_true', help="Update the daily rollups without archiving.")
+
+    def handle(self, *args, **options):
+        # Days are counted before their entries can be archived
+        rows = rollup_pending()
+        self.stdout.write(f"Wrote {rows} daily rollup rows.")
+        if options['rollup_only']:
+            return
+
+        archived = archive_expired(options['retention_days'])
+        for path, count in archived:
+            self.stdout.write(f"Archived {count} entries to {path}.")
+        self.stdout.write(self.style.SUCCESS(f"Archived {sum(count for _, count in archived)} activity log entries."))
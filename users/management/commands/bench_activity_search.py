@@ -0,0 +1,86 @@
+import random
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.utils import timezone
+from storage.benchmark import analyze, rolled_back, timed
+from storage.search import normalize_search
+from users.models import UserActivityLog
+from users.search import search_activity
+
+# Browsers the synthetic entries come from
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148 Safari/604.1",
+]
+# Searches timed, with the index each one must be answered by
+SEARCHES = [
+    ("10.20.30.40", 'ip_addr'),
+    ("10.20.", 'ip_addr'),
+    ("10.20.30.0/24", 'ip_addr'),
+    ("تسجيل دخول", 'action'),
+    ("شركة", 'model_n'),
+    ("INV-2042", 'activity_search_trgm'),
+]
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the activity log keyword search on a year of synthetic entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=1000000, help="Synthetic entries over the last year.")
+        parser.add_argument('--seed', type=int, default=1, help="Seed of the synthetic entries.")
+        parser.add_argument('--limit-ms', type=float, default=50, help="Milliseconds a search page may take.")
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            self.populate(options['entries'], random.Random(options['seed']))
+            self.stdout.write(f"{'search':<16} {'rows':>8} {'ms':>8}  index")
+            slow = []
+            for term, index in SEARCHES:
+                queryset = search_activity(UserActivityLog.objects.all(), term).order_by('-timestamp', '-id')
+                plan = self.explain(queryset[:10])
+                rows, seconds = timed(len, queryset[:10])
+                self.stdout.write(f"{term:<16} {rows:>8} {seconds * 1000:>8.2f}  {'yes' if index in plan else 'NO'}")
+                if index not in plan or seconds * 1000 > options['limit_ms']:
+                    slow.append(term)
+
+        if slow:
+            raise CommandError(f"Searches not answered by their index in time: {', '.join(slow)}")
+        self.stdout.write(self.style.SUCCESS("Every search is answered by an index."))
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {sql}", params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def populate(self, count, rng):
+        """Entries from 200 addresses across a year, a few of them in 10.20.0.0/16."""
+        users = list(get_user_model().objects.values_list('pk', flat=True)[:20]) or [None]
+        addresses = [f"172.16.{rng.randint(0, 255)}.{rng.randint(1, 254)}" for _ in range(195)]
+        addresses += [f"10.20.{30 if i < 2 else 31}.{40 + i}" for i in range(5)]
+        sections = ["اذن استلام", "اذن صرف", "صنف", "شركة", "مصادقة"]
+        actions = [code for code, _ in UserActivityLog.ACTION_TYPES]
+        now = timezone.now()
+        batch = []
+        for index in range(count):
+            number = f"INV-{rng.randint(1, 99999)}"
+            user_agent = rng.choice(USER_AGENTS)
+            batch.append(UserActivityLog(
+                user_id=rng.choice(users),
+                action=rng.choice(actions),
+                model_name=rng.choice(sections),
+                number=number,
+                ip_address=rng.choice(addresses),
+                user_agent=user_agent,
+                search_text=normalize_search(number, user_agent),
+                timestamp=now - timedelta(seconds=rng.randint(0, 365 * 86400)),
+            ))
+            if len(batch) >= 10000:
+                UserActivityLog.objects.bulk_create(batch)
+                batch.clear()
+        UserActivityLog.objects.bulk_create(batch)
+        analyze(UserActivityLog)
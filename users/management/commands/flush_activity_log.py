@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from users.activity import get_writer, replay_spool
+
+
+class Command(BaseCommand):
+    help = "Writes the queued activity log entries and replays the entries spooled when they could not be written."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Spooled entries written per bulk insert.")
+
+    def handle(self, *args, **options):
+        # With the redis buffer this drains the queue shared by the web processes
+        queued = get_writer().flush()
+        spooled = replay_spool(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {queued} queued and {spooled} spooled activity log entries."))
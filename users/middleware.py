@@ -0,0 +1,43 @@
+# Imports of the required python modules and libraries
+######################################################
+from .audit import begin_request_audit, end_request_audit
+from .permissions import begin_request_access, end_request_access
+
+
+class AuditMiddleware:
+    """
+    Gather the audit entries of the model writes made by a request.
+
+    Entries are kept until the response is ready, one per written object, and
+    then queued together for the batched activity log writer, so auditing
+    adds no query to the request itself.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = begin_request_audit(request)
+        try:
+            return self.get_response(request)
+        finally:
+            end_request_audit(token)
+
+
+class PermissionCacheMiddleware:
+    """
+    Keep the group names and permissions of the signed in user in the session.
+
+    Group and permission checks of a request, from views and templates alike,
+    then read the session instead of querying the groups each time.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = begin_request_access(request)
+        try:
+            return self.get_response(request)
+        finally:
+            end_request_access(token)
@@ -3,7 +3,9 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings  # Use this to reference the custom user model
+from django.utils import timezone
 from django.contrib.postgres.fields import JSONField
+from storage.search import normalize_search, trigram_index
 
 class CustomUser(AbstractUser):
     phone = models.CharField(max_length=15, blank=True, null=True, verbose_name="رقم الهاتف")
@@ -34,8 +36,41 @@ class UserActivityLog(models.Model):
     number = models.CharField(max_length=50, null=True, blank=True, verbose_name="المستند")
     ip_address = models.GenericIPAddressField(blank=True, null=True, verbose_name="عنوان IP")
     user_agent = models.TextField(blank=True, null=True, verbose_name="agent")
-    timestamp = models.DateTimeField(auto_now_add=True, verbose_name="الوقت")
+    changes = models.JSONField(blank=True, null=True, verbose_name="التغييرات")  # {field: [old, new]} of audited writes
+    search_text = models.TextField(blank=True, default='', editable=False)  # Normalized number and user agent
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name="الوقت")  # Time of the action, entries are written in batches
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp', 'id']),  # Keyset pages of the log, retention by date range
+            models.Index(fields=['user', 'timestamp']),
+            models.Index(fields=['action', 'timestamp']),
+            models.Index(fields=['model_name', 'timestamp']),
+            models.Index(fields=['ip_address']),  # Network searches, inet <<= scans it by range
+            trigram_index('search_text', 'activity_search_trgm'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.search_text = normalize_search(self.number, self.user_agent)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user} {self.action} {self.model_name or 'General'} at {self.timestamp}"
 
+
+class UserActivityDaily(models.Model):
+    """Activity log entries counted per day, user and action, kept after the entries are archived."""
+    day = models.DateField(verbose_name="اليوم")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, verbose_name="اسم المستخدم", null=True, blank=True)
+    action = models.CharField(max_length=10, choices=UserActivityLog.ACTION_TYPES, verbose_name="العملية")
+    count = models.PositiveIntegerField(verbose_name="العدد")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day', 'action']),
+            models.Index(fields=['user', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.action} x{self.count} on {self.day}"
+
@@ -0,0 +1,92 @@
+#############################################################################
+# Permission Cache Libraries
+#############################################################################
+import contextvars
+import time
+from collections import namedtuple
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+#############################################################################
+# Session key holding the group names and permissions of the signed in user
+SESSION_KEY = '_user_access'
+# Token replaced whenever groups or permissions are reassigned, sessions
+# holding another token read the groups and permissions again
+VERSION_CACHE_KEY = 'user_access:version'
+
+UserAccess = namedtuple('UserAccess', ['groups', 'perms'])
+NO_ACCESS = UserAccess(frozenset(), frozenset())
+
+# Session of the current request, see PermissionCacheMiddleware
+_request_session = contextvars.ContextVar('request_session', default=None)
+
+#############################################################################
+# Cache
+#############################################################################
+
+def access_version():
+    """The current token, a new one is started if the cache lost it."""
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(VERSION_CACHE_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def invalidate_access():
+    """Make every session read its groups and permissions again."""
+    cache.set(VERSION_CACHE_KEY, time.time_ns(), None)
+
+
+def user_access(user):
+    """
+    The group names and permissions ("app_label.codename") of a user.
+
+    Read at most once per request, and kept in the session of the request
+    until a group or permission assignment changes anywhere.
+    """
+    access = getattr(user, '_access_cache', None)
+    if access is not None:
+        return access
+    if not user.is_authenticated or not user.is_active:
+        return NO_ACCESS
+
+    session = _request_session.get()
+    version = access_version()
+    stored = session.get(SESSION_KEY) if session is not None else None
+    if stored and stored['user'] == user.pk and stored['version'] == version:
+        access = UserAccess(frozenset(stored['groups']), frozenset(stored['perms']))
+    else:
+        access = UserAccess(
+            frozenset(user.groups.values_list('name', flat=True)),
+            frozenset(ModelBackend().get_all_permissions(user)),
+        )
+        if session is not None:
+            session[SESSION_KEY] = {
+                'user': user.pk,
+                'version': version,
+                'groups': sorted(access.groups),
+                'perms': sorted(access.perms),
+            }
+    user._access_cache = access
+    return access
+
+
+def begin_request_access(request):
+    return _request_session.set(getattr(request, 'session', None))
+
+
+def end_request_access(token):
+    _request_session.reset(token)
+
+#############################################################################
+# Authentication Backend
+#############################################################################
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend answering has_perm() and the template perms from the permission cache."""
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if obj is not None:
+            return set()
+        return set(user_access(user_obj).perms)
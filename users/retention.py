@@ -0,0 +1,144 @@
+#############################################################################
+# Activity Log Retention Libraries
+#############################################################################
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import UserActivityLog, UserActivityDaily
+
+#############################################################################
+# Year of the oldest entry in the log, it only changes when entries are archived
+FIRST_YEAR_CACHE_KEY = 'activity_log:first_year'
+# Rolled up days that are counted again, for entries written late from the spool
+ROLLUP_REWIND_DAYS = 7
+# Entries read per query while archiving
+ARCHIVE_CHUNK_SIZE = 5000
+
+#############################################################################
+# Dates
+#############################################################################
+
+def day_start(day):
+    """Start of a day in the current time zone, the bound of its entries."""
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def activity_years():
+    """Years of the entries in the log, for the year filter, without scanning the log."""
+    first_year = cache.get(FIRST_YEAR_CACHE_KEY)
+    if first_year is None:
+        first = UserActivityLog.objects.aggregate(first=Min('timestamp'))['first']
+        if first is None:
+            return []
+        first_year = timezone.localtime(first).year
+        cache.set(FIRST_YEAR_CACHE_KEY, first_year, None)
+    return list(range(first_year, timezone.localdate().year + 1))
+
+#############################################################################
+# Daily Rollups
+#############################################################################
+
+def rollup_days(start, end):
+    """Count the entries of the days from start to end again into the rollups, returning the rows written."""
+    rows = (
+        UserActivityLog.objects.filter(timestamp__gte=day_start(start), timestamp__lt=day_start(end + timedelta(days=1)))
+        .annotate(day=TruncDate('timestamp'))
+        .values('day', 'user_id', 'action')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        UserActivityDaily.objects.filter(day__gte=start, day__lte=end).delete()
+        return len(UserActivityDaily.objects.bulk_create(UserActivityDaily(**row) for row in rows))
+
+
+def rollup_pending():
+    """
+    Roll up every complete day not counted yet, returning the rows written.
+
+    The last ROLLUP_REWIND_DAYS rolled up days are counted again, so entries
+    written late are counted too. Archived days are never counted again.
+    """
+    first = UserActivityLog.objects.aggregate(first=Min('timestamp'))['first']
+    if first is None:
+        return 0
+    start = timezone.localtime(first).date()
+    last_day = UserActivityDaily.objects.aggregate(last=Max('day'))['last']
+    if last_day is not None:
+        start = max(start, last_day - timedelta(days=ROLLUP_REWIND_DAYS - 1))
+    end = timezone.localdate() - timedelta(days=1)
+    return rollup_days(start, end) if start <= end else 0
+
+
+def activity_summary(days=30):
+    """Entries per action over the last days, today included, read from the rollups and today's entries."""
+    today = timezone.localdate()
+    counts = dict(
+        UserActivityDaily.objects.filter(day__gt=today - timedelta(days=days), day__lt=today)
+        .values_list('action').annotate(total=Sum('count')).order_by()
+    )
+    for action, count in UserActivityLog.objects.filter(timestamp__gte=day_start(today)).values_list('action').annotate(total=Count('id')).order_by():
+        counts[action] = counts.get(action, 0) + count
+    return [(label, counts[action]) for action, label in UserActivityLog.ACTION_TYPES if counts.get(action)]
+
+#############################################################################
+# Archiving
+#############################################################################
+
+def archive_month(month):
+    """
+    Move the entries of a month to a gzipped JSON lines file, returning its path and the entries moved.
+
+    The file is written in full and synced before any entry is deleted. Only
+    the entries up to the last one read are deleted, later entries are kept.
+    """
+    entries = UserActivityLog.objects.filter(timestamp__gte=day_start(month), timestamp__lt=day_start(next_month(month)))
+    os.makedirs(settings.ACTIVITY_LOG_ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(settings.ACTIVITY_LOG_ARCHIVE_DIR, f"activity-{month:%Y-%m}-{time.time_ns()}.jsonl.gz")
+    partial = path + '.partial'
+
+    count, last_id = 0, 0
+    with gzip.open(partial, 'wt', encoding='utf-8') as archive:
+        for entry in entries.order_by('timestamp', 'id').values().iterator(chunk_size=ARCHIVE_CHUNK_SIZE):
+            archive.write(json.dumps(entry, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+            count += 1
+            last_id = max(last_id, entry['id'])
+    with open(partial, 'rb') as archive:
+        os.fsync(archive.fileno())
+    if not count:
+        os.remove(partial)
+        return None, 0
+    os.rename(partial, path)
+
+    entries.filter(id__lte=last_id).delete()
+    cache.delete(FIRST_YEAR_CACHE_KEY)
+    return path, count
+
+
+def archive_expired(retention_days):
+    """Archive every whole month older than the retention, returning the (path, entries) of each."""
+    cutoff = timezone.localdate() - timedelta(days=retention_days)
+    first = UserActivityLog.objects.aggregate(first=Min('timestamp'))['first']
+    if first is None:
+        return []
+    archived = []
+    month = timezone.localtime(first).date().replace(day=1)
+    while next_month(month) <= cutoff:
+        path, count = archive_month(month)
+        if count:
+            archived.append((path, count))
+        month = next_month(month)
+    return archived
@@ -0,0 +1,89 @@
+#############################################################################
+# Activity Log Search Libraries
+#############################################################################
+import ipaddress
+import re
+from django.contrib.auth import get_user_model
+from django.db.models import GenericIPAddressField, Lookup, Q
+from storage.search import normalize_search, search_query
+from .models import UserActivityLog
+
+#############################################################################
+# Leading octets of an IPv4 address, e.g. "10.1." or "192.168.4"
+IPV4_PREFIX = re.compile(r'^\d{1,3}(\.\d{1,3}){0,2}\.?$')
+# Actions by their code and their normalized Arabic label
+ACTIONS = {
+    **{code.casefold(): code for code, _ in UserActivityLog.ACTION_TYPES},
+    **{normalize_search(label): code for code, label in UserActivityLog.ACTION_TYPES},
+}
+
+#############################################################################
+# Network Lookups
+#############################################################################
+
+@GenericIPAddressField.register_lookup
+class NetworkWithin(Lookup):
+    """
+    ip_address__within="10.0.0.0/8", the address lies in the network (inet <<=).
+
+    PostgreSQL answers it with a range scan of a plain btree index on the column.
+    """
+    lookup_name = 'within'
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} <<= {rhs}::inet", (*lhs_params, *rhs_params)
+
+
+def network_term(term):
+    """
+    The network an IP search term stands for, or None for any other term.
+
+    Accepts an address, a CIDR block, or the leading octets of an IPv4 address.
+    Terms without a dot or a colon are never addresses, so "2025" stays a number.
+    """
+    if '.' not in term and ':' not in term:
+        return None
+    if IPV4_PREFIX.match(term):
+        octets = term.rstrip('.').split('.')
+        term = f"{'.'.join(octets + ['0'] * (4 - len(octets)))}/{8 * len(octets)}"
+    try:
+        return str(ipaddress.ip_network(term, strict=False))
+    except ValueError:
+        return None
+
+#############################################################################
+# Keyword Search
+#############################################################################
+
+def search_activity(queryset, term):
+    """
+    Filter log entries by a search term, every branch answered by an index.
+
+    An IP term matches the addresses in its network and an action name matches
+    that action. Any other term matches the section name exactly, the users it
+    names, or the document number and user agent through the trigram index.
+    """
+    term = term.strip()
+    network = network_term(term)
+    if network:
+        return queryset.filter(ip_address__within=network)
+    action = ACTIONS.get(normalize_search(term))
+    if action:
+        return queryset.filter(action=action)
+
+    query = Q(model_name=term) | search_query('search_text', term)
+    # Users are few, their ids are read first so the planner sees how many entries they bring
+    user_ids = list(get_user_model().objects.filter(
+        Q(username__icontains=term) |
+        Q(email__icontains=term) |
+        Q(phone__icontains=term) |
+        Q(occupation__icontains=term) |
+        Q(first_name__icontains=term) |
+        Q(last_name__icontains=term)
+    ).values_list('pk', flat=True))
+    if user_ids:
+        query |= Q(user_id__in=user_ids)
+    return queryset.filter(query)
@@ -1,41 +1,41 @@
 # Imports of the required python modules and libraries
 ######################################################
 from django.dispatch import receiver
-from django.utils.timezone import now
-from .models import UserActivityLog
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from .activity import log_activity
+from .permissions import invalidate_access
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 
+User = get_user_model()
+
 @receiver(user_logged_in)
 def log_login(sender, request, user, **kwargs):
     """Log user login actions."""
-    UserActivityLog.objects.create(
-        user=user,
-        action="LOGIN",
-        model_name="مصادقة",
-        object_id=None,
-        ip_address=get_client_ip(request),
-        user_agent=request.META.get("HTTP_USER_AGENT", ""),
-        timestamp=now(),
-    )
+    log_activity("LOGIN", user=user, request=request, model_name="مصادقة")
 
 @receiver(user_logged_out)
 def log_logout(sender, request, user, **kwargs):
     """Log user logout actions."""
-    UserActivityLog.objects.create(
-        user=user,
-        action="LOGOUT",
-        model_name="مصادقة",
-        object_id=None,
-        ip_address=get_client_ip(request),
-        user_agent=request.META.get("HTTP_USER_AGENT", ""),
-        timestamp=now(),
-    )
+    log_activity("LOGOUT", user=user, request=request, model_name="مصادقة")
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permissions_reassigned(sender, action, **kwargs):
+    """Drop the cached groups and permissions of every session."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_access()
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def groups_changed(sender, **kwargs):
+    invalidate_access()
 
-def get_client_ip(request):
-    """Extract client IP address from request."""
-    x_forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(",")[0]
-    else:
-        ip = request.META.get("REMOTE_ADDR")
-    return ip
\ No newline at end of file
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Active and superuser flags decide the permissions too, a login only stamps last_login
+    if update_fields is None or not set(update_fields) <= {'last_login'}:
+        invalidate_access()
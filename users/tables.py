@@ -2,7 +2,10 @@
 ######################################################
 import django_tables2 as tables
 from django.contrib.auth import get_user_model
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
 from .models import UserActivityLog
+from core.tables import RelatedTable
 
 User = get_user_model()  # Use custom user model
 
@@ -27,14 +30,23 @@ class UserTable(tables.Table):
         fields = ("username", "email", "full_name", "phone", "occupation", "is_staff", "is_active","last_login", "actions")
         attrs = {'class': 'table table-hover align-middle'}
 
-class UserActivityLogTable(tables.Table):
+class UserActivityLogTable(RelatedTable):
     user = tables.Column(verbose_name="اسم الدخول")
+    select_related = ('user',)
     timestamp = tables.DateColumn(
         format="H:i Y-m-d ",  # This is the format you want for the timestamp
         verbose_name="وقت العملية"
     )
+    changes = tables.Column(verbose_name="التغييرات", orderable=False)
+
+    def render_changes(self, value):
+        return format_html_join(mark_safe("<br>"), "{}: {} ← {}", (
+            (field, old if old is not None else "-", new if new is not None else "-")
+            for field, (old, new) in value.items()
+        ))
+
     class Meta:
         model = UserActivityLog
         template_name = "django_tables2/bootstrap5.html"
-        fields = ("timestamp", "user", "user.full_name", "action", "model_name", "object_id", "number")
+        fields = ("timestamp", "user", "user.full_name", "action", "model_name", "object_id", "number", "changes")
         attrs = {'class': 'table table-hover align-middle'}
@@ -1,3 +1,206 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from redis.exceptions import ConnectionError as RedisConnectionError
+from core.models import Affiliate, Company, SubAffiliate
+from . import audit
+from .activity import ActivityLogWriter, activity_event, get_writer, log_activity, replay_spool, spool_events, write_events
+from .models import UserActivityLog
 
-# Create your tests here.
+
+class ActivityLogWriterTests(TestCase):
+    """Events are queued without a query and written in batches, failed batches go through the spool."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(username='writer')
+        self.writer = ActivityLogWriter(batch_size=2, background=False)
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.spool_dir = spool_dir.name
+        settings_override = override_settings(ACTIVITY_LOG_SPOOL_DIR=self.spool_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def event(self, user=None):
+        request = RequestFactory().get('/', HTTP_USER_AGENT='tests')
+        request.user = user or self.user
+        return activity_event('VIEW', request=request, model_name='فحص')
+
+    def test_push_runs_no_query(self):
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                self.writer.push(self.event())
+        self.assertFalse(UserActivityLog.objects.exists())
+
+    def test_full_batch_wakes_the_writer(self):
+        self.writer.push(self.event())
+        self.assertFalse(self.writer.wake.is_set())
+        self.writer.push(self.event())
+        self.assertTrue(self.writer.wake.is_set())
+
+    def test_flush_writes_in_batches(self):
+        for _ in range(5):
+            self.writer.push(self.event())
+        # Per batch of two: the users still present, the insert
+        with self.assertNumQueries(6):
+            self.assertEqual(self.writer.flush(), 5)
+        self.assertEqual(UserActivityLog.objects.filter(user=self.user, action='VIEW').count(), 5)
+        self.assertEqual(self.writer.flush(), 0)
+
+    def test_events_of_deleted_users_are_kept(self):
+        gone = get_user_model().objects.create(username='gone')
+        self.writer.push(self.event(gone))
+        gone.delete()
+        self.assertEqual(self.writer.flush(), 1)
+        self.assertIsNone(UserActivityLog.objects.get().user)
+
+    def test_entries_are_written_as_logged_under_tests(self):
+        # Nothing is left queued for a background thread or an exit flush after the test database is gone
+        self.assertFalse(get_writer().background)
+        log_activity('VIEW', user=self.user, model_name='فحص')
+        self.assertTrue(UserActivityLog.objects.filter(user=self.user, model_name='فحص').exists())
+        self.assertEqual(get_writer().flush(), 0)
+
+    def test_failed_batch_is_spooled_and_replayed(self):
+        for _ in range(3):
+            self.writer.push(self.event())
+        with mock.patch('users.activity.write_events', side_effect=DatabaseError), self.assertLogs('users', 'ERROR'):
+            self.assertEqual(self.writer.flush(), 0)
+        self.assertEqual(len(os.listdir(self.spool_dir)), 2)
+        self.assertFalse(UserActivityLog.objects.exists())
+
+        self.assertEqual(replay_spool(), 3)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+        self.assertEqual(UserActivityLog.objects.filter(user=self.user).count(), 3)
+
+    def test_spool_file_is_put_back_when_replay_fails(self):
+        path = spool_events([self.event()])
+        with mock.patch('users.activity.write_events', side_effect=DatabaseError), self.assertRaises(DatabaseError):
+            replay_spool()
+        self.assertEqual(os.listdir(self.spool_dir), [os.path.basename(path)])
+        self.assertEqual(replay_spool(), 1)
+
+    def test_spool_file_failing_partway_is_replayed_once(self):
+        spool_events([self.event() for _ in range(3)])
+        batches = []
+
+        def second_batch_fails(events):
+            batches.append(events)
+            if len(batches) == 2:
+                raise DatabaseError
+            write_events(events)
+
+        with mock.patch('users.activity.write_events', side_effect=second_batch_fails), self.assertRaises(DatabaseError):
+            replay_spool(batch_size=2)
+        self.assertFalse(UserActivityLog.objects.exists())
+        self.assertEqual(replay_spool(batch_size=2), 3)
+        self.assertEqual(UserActivityLog.objects.count(), 3)
+
+
+class UnreachableRedis:
+    """A Redis client whose every command fails, as when the server is down."""
+
+    def rpush(self, *args):
+        raise RedisConnectionError("Connection refused")
+
+    def pipeline(self):
+        return self
+
+    def lrange(self, *args):
+        pass
+
+    def ltrim(self, *args):
+        pass
+
+    def execute(self):
+        raise RedisConnectionError("Connection refused")
+
+
+class RedisBufferTests(TestCase):
+
+    def test_events_kept_in_process_are_written_while_redis_is_down(self):
+        with mock.patch('django_redis.get_redis_connection', return_value=UnreachableRedis()):
+            writer = ActivityLogWriter(buffer='redis', background=False)
+        with self.assertLogs('users', 'WARNING'):
+            for _ in range(3):
+                writer.push(activity_event('VIEW', model_name='فحص'))
+            self.assertEqual(writer.flush(), 3)
+        self.assertEqual(UserActivityLog.objects.count(), 3)
+
+
+class AuditTests(TestCase):
+    """Writes to audited models are logged with their changes, adding no query to the request."""
+
+    def setUp(self):
+        self.writer = ActivityLogWriter(background=False)
+        patcher = mock.patch('users.audit.get_writer', return_value=self.writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.request = RequestFactory().post('/', HTTP_USER_AGENT='tests')
+        self.request.user = get_user_model().objects.create(username='auditor')
+
+    def write_companies(self):
+        """A request creating, editing and deleting companies, returning its queries."""
+        token = audit.begin_request_audit(self.request)
+        try:
+            with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+                kept = Company.objects.create(name='شركة فحص', phone='0910000000')
+                kept.phone = '0910000001'
+                kept.save()
+                kept.name = 'شركة فحص معدلة'
+                kept.save()
+                Company.objects.create(name='شركة فحص محذوفة').delete()
+        finally:
+            audit.end_request_audit(token)
+        return [query for query in queries.captured_queries if 'SAVEPOINT' not in query['sql']]
+
+    def test_auditing_adds_no_query(self):
+        audit.disconnect_audit_signals()
+        try:
+            plain = self.write_companies()
+        finally:
+            audit.connect_audit_signals()
+        self.writer.flush()
+        self.assertEqual(len(self.write_companies()), len(plain))
+
+    def test_writes_of_a_request_fold_into_one_entry_per_object(self):
+        self.write_companies()
+        self.assertEqual(self.writer.flush(), 2)
+        created = UserActivityLog.objects.get(action='CREATE')
+        self.assertEqual(created.user, self.request.user)
+        self.assertEqual(created.changes['name'], [None, 'شركة فحص معدلة'])
+        self.assertEqual(created.changes['phone'], [None, '0910000001'])
+        self.assertIsNone(UserActivityLog.objects.get(action='DELETE').changes)
+
+    def test_update_records_the_changed_fields(self):
+        company = Company.objects.create(name='شركة فحص', phone='0910000000')
+        company = Company.objects.get(pk=company.pk)
+        company.phone = '0910000001'
+        with self.captureOnCommitCallbacks(execute=True):
+            company.save()
+            company.save()  # Saved again without changes
+        self.writer.flush()
+        self.assertEqual(UserActivityLog.objects.get(action='UPDATE').changes, {'phone': ['0910000000', '0910000001']})
+
+    def test_sub_affiliate_is_labelled_without_reading_its_affiliate(self):
+        affiliate = Affiliate.objects.create(type=Affiliate._meta.get_field('type').choices[0][0], name='جهة', address='طرابلس')
+        subtype = SubAffiliate._meta.get_field('subtype').choices[0][0]
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(1):
+            SubAffiliate.objects.create(affiliate_id=affiliate.pk, subname='فرع', subtype=subtype)
+        with self.captureOnCommitCallbacks(execute=True):
+            SubAffiliate.objects.create(affiliate=affiliate, subname='فرع ثان', subtype=subtype)
+        self.writer.flush()
+        numbers = UserActivityLog.objects.filter(model_name=SubAffiliate._meta.verbose_name).values_list('number', flat=True)
+        self.assertEqual(sorted(numbers), sorted(['فرع', 'فرع ثان بجهة']))
+
+    def test_rolled_back_write_is_not_logged(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                Company.objects.create(name='شركة فحص')
+                transaction.set_rollback(True)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.writer.flush(), 0)
@@ -1,6 +1,5 @@
 # Fundemental imports
 ######################################################
-from django.utils import timezone
 from django.contrib import messages
 from django.contrib.auth import get_user_model, update_session_auth_hash
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -13,11 +12,13 @@ from django_filters.views import FilterView
 # Project imports
 #################
 
-from .signals import get_client_ip
+from .activity import log_activity
 from .tables import UserTable, UserActivityLogTable
 from .forms import CustomUserCreationForm, CustomUserChangeForm, ArabicPasswordChangeForm, ResetPasswordForm, UserProfileEditForm
 from .filters import UserFilter, UserActivityLogFilter
 from .models import UserActivityLog
+from .retention import activity_summary
+from core.pagination import paginate_table
 
 User = get_user_model() # Use custom user model
 
@@ -112,17 +113,9 @@ def edit_user(request, user_id):
 def delete_user(request, user_id):
     user = get_object_or_404(User, id=user_id)
     if request.method == "POST":
+        user_pk = user.pk  # Cleared by delete()
         user.delete()
-        UserActivityLog.objects.create(
-            user=request.user,
-            action="DELETE",
-            model_name='مستخدم',
-            object_id=user.pk,
-            number=user.username,  # Save the relevant number
-            timestamp=timezone.now(),
-            ip_address=get_client_ip(request),  # Assuming you have this function
-            user_agent=request.META.get("HTTP_USER_AGENT", ""),
-        )
+        log_activity("DELETE", user=request.user, request=request, model_name='مستخدم', object_id=user_pk, number=user.username)
         return redirect("manage_users")
     return redirect("manage_users")  # Redirect instead of rendering a separate page
 
@@ -137,13 +130,19 @@ class UserActivityLogView(LoginRequiredMixin, UserPassesTestMixin, SingleTableVi
     def test_func(self):
         return self.request.user.is_staff  # Only staff can access logs
     
-    def get_queryset(self):
-        # Order by timestamp descending by default
-        return super().get_queryset().order_by('-timestamp')
+    def get_table_data(self):
+        self.filter = self.filterset_class(self.request.GET, queryset=super().get_table_data(), request=self.request)
+        return self.filter.qs
+
+    def get_table(self, **kwargs):
+        # The log grows without bound, page it newest first by seeking instead of counting and offsetting
+        table = self.get_table_class()(data=self.get_table_data(), **self.get_table_kwargs(), **kwargs)
+        return paginate_table(self.request, table, ('-timestamp', '-id'))
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["filter"] = self.filterset_class  # Make sure 'filter' is added
+        context["filter"] = self.filter
+        context["summary"] = activity_summary()
         return context
 
 